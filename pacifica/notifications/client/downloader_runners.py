@@ -9,34 +9,136 @@
 # See LICENSE and WARRANTY for details.
 
 import abc
+import concurrent.futures
+import contextlib
 import functools
 import os
+import sys
+import threading
 import typing
 
 from pacifica.downloader import Downloader
 
+from .file_caches import FileCache
 from .models import File
 
-def _to_opener(basedir_name: str, file: File) -> typing.Callable[[typing.Dict[str, typing.Any]], typing.TextIO]:
-    func = lambda **kwargs: open(os.path.join(basedir_name, file.path), mode='r', encoding=file.encoding, **kwargs)
+def _open(path: str, file: File, mode: str = 'r', **kwargs: typing.Dict[str, typing.Any]) -> typing.IO:
+    if 'b' in mode:
+        return open(path, mode=mode, **kwargs)
+    else:
+        return open(path, mode=mode, encoding=kwargs.pop('encoding', file.encoding), **kwargs)
+
+def _to_opener(basedir_name: str, file: File) -> typing.Callable[[typing.Dict[str, typing.Any]], typing.IO]:
+    # NOTE Text mode by default, but binary mode if `mode` is, e.g., "rb".
+    func = functools.partial(_open, os.path.join(basedir_name, file.path), file)
 
     return func
 
+class _ThreadLocalStream(object):
+    # NOTE A proxy for `sys.stdout` or `sys.stderr` that writes to the stream of the current thread (if any), since `contextlib.redirect_stdout` and `contextlib.redirect_stderr` are process-global.
+
+    def __init__(self, stream: typing.IO) -> None:
+        super(_ThreadLocalStream, self).__init__()
+
+        self.stream = stream
+
+        self._local = threading.local()
+
+    def __getattr__(self, name: str) -> typing.Any:
+        return getattr(self.target(), name)
+
+    def target(self) -> typing.IO:
+        stream = getattr(self._local, 'stream', None)
+
+        return self.stream if stream is None else stream
+
+    def write(self, s: str) -> int:
+        return self.target().write(s)
+
+    def flush(self) -> None:
+        return self.target().flush()
+
+_thread_local_streams_lock = threading.Lock()
+_thread_local_streams_count = 0
+
+@contextlib.contextmanager
+def redirect_thread_output(stdout_file: typing.IO, stderr_file: typing.IO) -> typing.Generator[None, None, None]:
+    global _thread_local_streams_count
+
+    with _thread_local_streams_lock:
+        # NOTE Install the proxies (again, if another redirect replaced them).
+        if not isinstance(sys.stdout, _ThreadLocalStream):
+            sys.stdout = _ThreadLocalStream(sys.stdout)
+
+        if not isinstance(sys.stderr, _ThreadLocalStream):
+            sys.stderr = _ThreadLocalStream(sys.stderr)
+
+        stdout_proxy = sys.stdout
+        stderr_proxy = sys.stderr
+
+        _thread_local_streams_count += 1
+
+    orig_stdout_file = getattr(stdout_proxy._local, 'stream', None)
+    orig_stderr_file = getattr(stderr_proxy._local, 'stream', None)
+
+    stdout_proxy._local.stream = stdout_file
+    stderr_proxy._local.stream = stderr_file
+
+    try:
+        yield
+    finally:
+        stdout_proxy._local.stream = orig_stdout_file
+        stderr_proxy._local.stream = orig_stderr_file
+
+        with _thread_local_streams_lock:
+            _thread_local_streams_count -= 1
+
+            # NOTE Uninstall the proxies when no thread is redirected.
+            if 0 == _thread_local_streams_count:
+                if sys.stdout is stdout_proxy:
+                    sys.stdout = stdout_proxy.stream
+
+                if sys.stderr is stderr_proxy:
+                    sys.stderr = stderr_proxy.stream
+
 class DownloaderRunner(abc.ABC):
-    def __init__(self) -> None:
+    def __init__(self, max_workers: int = 2) -> None:
         super(DownloaderRunner, self).__init__()
 
+        self.max_workers = max_workers
+
+        self._executor = None # type: concurrent.futures.ThreadPoolExecutor
+        self._executor_lock = threading.Lock()
+
     @abc.abstractmethod
-    def download(self, basedir_name: str, files: typing.List[File] = []) -> typing.List[typing.Callable[[typing.Dict[str, typing.Any]], typing.TextIO]]: # pragma: no cover
+    def download(self, basedir_name: str, files: typing.List[File] = []) -> typing.List[typing.Callable[[typing.Dict[str, typing.Any]], typing.IO]]: # pragma: no cover
         raise NotImplementedError()
 
+    def download_logged(self, basedir_name: str, files: typing.List[File] = [], stdout_file_name: str = None, stderr_file_name: str = None) -> typing.List[typing.Callable[[typing.Dict[str, typing.Any]], typing.IO]]:
+        if (stdout_file_name is None) and (stderr_file_name is None):
+            return self.download(basedir_name, files=files)
+
+        # NOTE Only the output of the current thread is appended to the log files, i.e., concurrent downloads do not capture each other's output.
+        with open(os.devnull if stdout_file_name is None else stdout_file_name, mode='a') as stdout_file:
+            with open(os.devnull if stderr_file_name is None else stderr_file_name, mode='a') as stderr_file:
+                with redirect_thread_output(stdout_file, stderr_file):
+                    return self.download(basedir_name, files=files)
+
+    def download_async(self, basedir_name: str, files: typing.List[File] = [], stdout_file_name: str = None, stderr_file_name: str = None) -> concurrent.futures.Future:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+
+        # NOTE The output is captured by the worker thread itself.
+        return self._executor.submit(self.download_logged, basedir_name, files=files, stdout_file_name=stdout_file_name, stderr_file_name=stderr_file_name)
+
 class LocalDownloaderRunner(DownloaderRunner):
-    def __init__(self, basedir_name: str) -> None:
-        super(LocalDownloaderRunner, self).__init__()
+    def __init__(self, basedir_name: str, max_workers: int = 2) -> None:
+        super(LocalDownloaderRunner, self).__init__(max_workers=max_workers)
 
         self.basedir_name = basedir_name
 
-    def download(self, basedir_name: str, files: typing.List[File] = []) -> typing.List[typing.Callable[[typing.Dict[str, typing.Any]], typing.TextIO]]:
+    def download(self, basedir_name: str, files: typing.List[File] = []) -> typing.List[typing.Callable[[typing.Dict[str, typing.Any]], typing.IO]]:
         if self.basedir_name != basedir_name:
             for file in files:
                 if file.subdir is not None:
@@ -49,29 +151,46 @@ class LocalDownloaderRunner(DownloaderRunner):
         return openers
 
 class RemoteDownloaderRunner(DownloaderRunner):
-    def __init__(self, downloader: Downloader) -> None:
-        super(RemoteDownloaderRunner, self).__init__()
+    def __init__(self, downloader: Downloader, max_workers: int = 2, file_cache: FileCache = None) -> None:
+        super(RemoteDownloaderRunner, self).__init__(max_workers=max_workers)
 
         self.downloader = downloader
 
-    def download(self, basedir_name: str, files: typing.List[File] = []) -> typing.List[typing.Callable[[typing.Dict[str, typing.Any]], typing.TextIO]]:
-        self.downloader._download_from_url(
-            basedir_name,
-            self.downloader.cart_api.wait_for_cart(
-                self.downloader.cart_api.setup_cart(
-                    map(lambda file: {
-                        'id': file._id,
-                        'hashsum': file.hashsum,
-                        'hashtype': file.hashtype,
-                        'path': file.path,
-                    }, files)
-                )
-            ),
-            'data'
-        )
+        self.file_cache = file_cache
+
+    def download(self, basedir_name: str, files: typing.List[File] = []) -> typing.List[typing.Callable[[typing.Dict[str, typing.Any]], typing.IO]]:
+        if self.file_cache is None:
+            missed_files = files
+        else:
+            missed_files = [file for file in files if not self.file_cache.materialize(file, os.path.join(basedir_name, 'data'))]
+
+        # NOTE Skip the cart round-trip if every file is cached.
+        if len(missed_files) > 0:
+            # NOTE Concurrent carts are extracted into the same directory, and `tarfile` does not tolerate a parent directory that is created by another extraction, i.e., create the parent directories in advance.
+            for file in missed_files:
+                os.makedirs(os.path.dirname(os.path.join(basedir_name, 'data', file.path)), exist_ok=True)
+
+            self.downloader._download_from_url(
+                basedir_name,
+                self.downloader.cart_api.wait_for_cart(
+                    self.downloader.cart_api.setup_cart(
+                        map(lambda file: {
+                            'id': file._id,
+                            'hashsum': file.hashsum,
+                            'hashtype': file.hashtype,
+                            'path': file.path,
+                        }, missed_files)
+                    )
+                ),
+                'data'
+            )
+
+            if self.file_cache is not None:
+                for file in missed_files:
+                    self.file_cache.put(file, os.path.join(basedir_name, 'data', file.path))
 
         openers = list(map(functools.partial(_to_opener, os.path.join(basedir_name, 'data')), files))
 
         return openers
 
-__all__ = ('DownloaderRunner', 'LocalDownloaderRunner', 'RemoteDownloaderRunner')
+__all__ = ('DownloaderRunner', 'LocalDownloaderRunner', 'RemoteDownloaderRunner', 'redirect_thread_output')
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-notifications-client: pacifica/notifications/client/file_caches.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+
+import contextlib
+import hashlib
+import os
+import re
+import stat
+import tempfile
+import threading
+import typing
+
+try:
+    import fcntl
+except ImportError: # pragma: no cover
+    fcntl = None
+
+from .models import File
+
+RE_PATTERN_HASHSUM_ = re.compile(r'^[0-9a-f]+$')
+
+def to_hash_key(file: File) -> typing.Optional[typing.Tuple[str, str]]:
+    # NOTE The (normalized) hash type and hash sum of a file, if they are safe to use in a path.
+    if not isinstance(file.hashtype, str) or not isinstance(file.hashsum, str):
+        return None
+
+    hashtype = file.hashtype.lower()
+    hashsum = file.hashsum.lower()
+
+    if (hashtype not in hashlib.algorithms_available) or (RE_PATTERN_HASHSUM_.match(hashsum) is None):
+        return None
+
+    return (hashtype, hashsum)
+
+def hash_file(file_name: str, hashtype: str, chunk_size: int = 1048576) -> str:
+    hashval = hashlib.new(hashtype)
+
+    with open(file_name, mode='rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            hashval.update(chunk)
+
+    return hashval.hexdigest()
+
+def _materialize(orig_path: str, new_path: str) -> None:
+    dir_name = os.path.dirname(new_path)
+
+    if len(dir_name) > 0:
+        os.makedirs(dir_name, exist_ok=True)
+
+    try:
+        os.link(orig_path, new_path)
+    except OSError:
+        # NOTE Hard links are not supported across file systems.
+        os.symlink(orig_path, new_path)
+
+    return
+
+class FileCache(object):
+    def __init__(self, basedir_name: str, max_size: int = 1073741824, low_water_ratio: float = 0.9) -> None:
+        super(FileCache, self).__init__()
+
+        self.basedir_name = basedir_name
+        self.max_size = max_size
+        self.low_water_ratio = low_water_ratio
+
+        self._lock = threading.Lock()
+
+        # NOTE Hidden files are not cache entries.
+        self._lock_file_name = os.path.join(self.basedir_name, '.lock')
+        self._size_file_name = os.path.join(self.basedir_name, '.size')
+
+        os.makedirs(self.basedir_name, exist_ok=True)
+
+    @contextlib.contextmanager
+    def _locked(self) -> typing.Generator[None, None, None]:
+        # NOTE The cache directory is shared by the worker processes, i.e., the lock is a file lock (if supported).
+        with self._lock:
+            with open(self._lock_file_name, mode='a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _entries(self) -> typing.List[typing.Tuple[float, int, str]]:
+        entries = []
+
+        for walk_root, walk_dirs, file_names in os.walk(self.basedir_name):
+            for file_name in file_names:
+                if file_name.startswith('.'):
+                    continue
+
+                path = os.path.join(walk_root, file_name)
+
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+
+                entries.append((st.st_mtime, st.st_size, path))
+
+        return entries
+
+    def _read_size(self) -> int:
+        try:
+            with open(self._size_file_name, mode='r') as size_file:
+                return int(size_file.read())
+        except (OSError, ValueError):
+            # NOTE The size is unknown (e.g., the cache is new), i.e., it is computed once.
+            return sum(size for mtime, size, path in self._entries())
+
+    def _write_size(self, size: int) -> None:
+        with open(self._size_file_name, mode='w') as size_file:
+            size_file.write(str(size))
+
+        return
+
+    def _evict(self, target_size: int, keep_path: str = None) -> int:
+        # NOTE The directory is only walked if the cache is full, which also corrects the size (e.g., if entries were removed externally).
+        entries = self._entries()
+
+        total_size = sum(size for mtime, size, path in entries)
+
+        for mtime, size, path in sorted(entries):
+            if total_size <= target_size:
+                break
+
+            if path == keep_path:
+                continue
+
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+            total_size -= size
+
+        return total_size
+
+    def key(self, file: File) -> typing.Optional[str]:
+        hash_key = to_hash_key(file)
+
+        if hash_key is None:
+            return None
+
+        hashtype, hashsum = hash_key
+
+        return os.path.join(hashtype, hashsum[:2], hashsum)
+
+    def size(self) -> int:
+        with self._locked():
+            return self._read_size()
+
+    def get(self, file: File) -> typing.Optional[str]:
+        key = self.key(file)
+
+        if key is None:
+            return None
+
+        path = os.path.join(self.basedir_name, key)
+
+        try:
+            # NOTE Eviction is least-recently-used by modification time.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        return path
+
+    def put(self, file: File, orig_path: str) -> typing.Optional[str]:
+        key = self.key(file)
+
+        if key is None:
+            return None
+
+        orig_size = os.path.getsize(orig_path)
+
+        if orig_size > self.max_size:
+            # NOTE Never cache files that do not fit, i.e., that would be evicted immediately.
+            return None
+
+        if hash_file(orig_path, file.hashtype.lower()) != file.hashsum.lower():
+            # NOTE Never cache files whose contents do not match their hash sum.
+            return None
+
+        path = os.path.join(self.basedir_name, key)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # NOTE Populate the cache atomically, i.e., link a temporary file into place.
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+
+        try:
+            with os.fdopen(fd, mode='wb') as temp_file:
+                with open(orig_path, mode='rb') as orig_file:
+                    for chunk in iter(lambda: orig_file.read(1048576), b''):
+                        temp_file.write(chunk)
+
+            os.chmod(temp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+            with self._locked():
+                total_size = self._read_size()
+
+                if os.path.exists(path):
+                    # NOTE The file was cached concurrently (with the same contents).
+                    os.unlink(temp_path)
+
+                    os.utime(path)
+                else:
+                    os.replace(temp_path, path)
+
+                    total_size += orig_size
+
+                if total_size > self.max_size:
+                    # NOTE Evict to below the limit, so that the directory is not walked by every subsequent put.
+                    total_size = self._evict(int(self.max_size * self.low_water_ratio), keep_path=path)
+
+                self._write_size(total_size)
+        except:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+            raise
+
+        return path
+
+    def materialize(self, file: File, basedir_name: str) -> bool:
+        path = self.get(file)
+
+        if path is None:
+            return False
+
+        try:
+            _materialize(path, os.path.join(basedir_name, file.path))
+        except FileNotFoundError:
+            # NOTE The file was evicted concurrently.
+            return False
+
+        return True
+
+    def evict(self) -> None:
+        with self._locked():
+            self._write_size(self._evict(self.max_size))
+
+        return
+
+__all__ = ('FileCache', 'hash_file', 'to_hash_key')
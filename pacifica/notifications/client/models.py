@@ -9,48 +9,89 @@
 # See LICENSE and WARRANTY for details.
 
 import abc
-import json
 import os
 import typing
 
 from cloudevents.model import Event
-from jsonpath2.path import Path
 
 from .exceptions import InvalidEventTypeValueError, InvalidSourceValueError, TransactionDuplicateAttributeError
 from .globals import CLOUDEVENTS_DEFAULT_EVENT_TYPE_, CLOUDEVENTS_DEFAULT_SOURCE_
 
+class EventIndex(object):
+    def __init__(self, event: Event) -> None:
+        super(EventIndex, self).__init__()
+
+        self.event = event
+
+        self._records_by_destination_table = {} # type: typing.Dict[str, typing.List[typing.Dict[str, typing.Any]]]
+
+        if isinstance(event.data, dict):
+            records = event.data.values()
+        elif isinstance(event.data, list):
+            records = event.data
+        else:
+            records = []
+
+        # NOTE Single pass over `event.data`.
+        for record in records:
+            if isinstance(record, dict):
+                destination_table = record.get('destinationTable', None)
+
+                if isinstance(destination_table, str):
+                    self._records_by_destination_table.setdefault(destination_table, []).append(record)
+
+    @classmethod
+    def from_cloudevents_model(cls, event: Event) -> 'EventIndex':
+        if CLOUDEVENTS_DEFAULT_EVENT_TYPE_ != event.event_type:
+            raise InvalidEventTypeValueError(event)
+
+        if CLOUDEVENTS_DEFAULT_SOURCE_ != event.source:
+            raise InvalidSourceValueError(event)
+
+        return cls(event)
+
+    def records(self, destination_table: str) -> typing.List[typing.Dict[str, typing.Any]]:
+        return self._records_by_destination_table.get(destination_table, [])
+
 class PacificaModel(abc.ABC):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super(PacificaModel, self).__init__()
 
+    @classmethod
+    def from_cloudevents_model(cls, event: Event) -> typing.Union['PacificaModel', typing.List['PacificaModel']]:
+        return cls.from_event_index(EventIndex.from_cloudevents_model(event))
+
     @classmethod
     @abc.abstractmethod
-    def from_cloudevents_model(cls, event: Event) -> typing.Union['PacificaModel', typing.List['PacificaModel']]: # pragma: no cover
+    def from_event_index(cls, event_index: EventIndex) -> typing.Union['PacificaModel', typing.List['PacificaModel']]: # pragma: no cover
         raise NotImplementedError()
 
 class File(PacificaModel):
+    __slots__ = ('_id', 'ctime', 'encoding', 'hashsum', 'hashtype', 'mimetype', 'mtime', 'name', 'size', 'subdir', 'suspense_date')
+
     def __init__(self, **attrs: typing.Dict[str, typing.Any]) -> None:
         super(File, self).__init__()
 
-        for name in ['_id', 'ctime', 'encoding', 'hashsum', 'hashtype', 'mimetype', 'mtime', 'name', 'size', 'subdir', 'suspense_date']:
-            setattr(self, name, None)
-
-            if name in attrs:
-                setattr(self, name, attrs.get(name, None))
-
+        self._id = attrs.get('_id', None)
+        self.ctime = attrs.get('ctime', None)
+        self.encoding = attrs.get('encoding', None)
+        self.hashsum = attrs.get('hashsum', None)
+        self.hashtype = attrs.get('hashtype', None)
+        self.mimetype = attrs.get('mimetype', None)
+        self.mtime = attrs.get('mtime', None)
+        self.name = attrs.get('name', None)
+        self.size = attrs.get('size', None)
+        self.subdir = attrs.get('subdir', None)
+        self.suspense_date = attrs.get('suspense_date', None)
 
     @classmethod
-    def from_cloudevents_model(cls, event: Event) -> typing.List['File']:
-        if CLOUDEVENTS_DEFAULT_EVENT_TYPE_ != event.event_type:
-            raise InvalidEventTypeValueError(event)
-
-        if CLOUDEVENTS_DEFAULT_SOURCE_ != event.source:
-            raise InvalidSourceValueError(event)
-
+    def from_event_index(cls, event_index: EventIndex) -> typing.List['File']:
         insts = []
 
-        for match_data in Path.parse_str('$[*][?(@["destinationTable"] = "Files")]').match(event.data):
-            inst = cls(**match_data.current_value)
+        for record in event_index.records('Files'):
+            inst = cls(**record)
 
             insts.append(inst)
 
@@ -66,31 +107,32 @@ class File(PacificaModel):
             return os.path.join(self.subdir, self.name)
 
 class Transaction(PacificaModel):
+    __slots__ = ('_id', 'analytical_tool', 'description', 'instrument', 'proposal', 'submitter', 'suspense_date')
+
     def __init__(self, **attrs: typing.Dict[str, typing.Any]) -> None:
         super(Transaction, self).__init__()
 
-        for name in ['_id', 'analytical_tool', 'description', 'instrument', 'proposal', 'submitter', 'suspense_date']:
-            setattr(self, name, None)
-
-            if name in attrs:
-                setattr(self, name, attrs.get(name, None))
+        self._id = attrs.get('_id', None)
+        self.analytical_tool = attrs.get('analytical_tool', None)
+        self.description = attrs.get('description', None)
+        self.instrument = attrs.get('instrument', None)
+        self.proposal = attrs.get('proposal', None)
+        self.submitter = attrs.get('submitter', None)
+        self.suspense_date = attrs.get('suspense_date', None)
 
     @classmethod
-    def from_cloudevents_model(cls, event: Event) -> 'Transaction':
-        if CLOUDEVENTS_DEFAULT_EVENT_TYPE_ != event.event_type:
-            raise InvalidEventTypeValueError(event)
-
-        if CLOUDEVENTS_DEFAULT_SOURCE_ != event.source:
-            raise InvalidSourceValueError(event)
-
+    def from_event_index(cls, event_index: EventIndex) -> 'Transaction':
         attrs = {}
 
-        for name in ['_id', 'analytical_tool', 'description', 'instrument', 'proposal', 'submitter', 'suspense_date']:
-            for match_data in Path.parse_str('$[*][?(@["destinationTable"] = {0})]["value"]'.format(json.dumps('Transactions.{0}'.format(name)))).match(event.data):
+        for name in cls.__slots__:
+            for record in event_index.records('Transactions.{0}'.format(name)):
+                if 'value' not in record:
+                    continue
+
                 if name in attrs:
-                    raise TransactionDuplicateAttributeError(event, name)
+                    raise TransactionDuplicateAttributeError(event_index.event, name)
 
-                attrs[name] = match_data.current_value
+                attrs[name] = record['value']
 
             if name not in attrs:
                 attrs[name] = None
@@ -98,30 +140,92 @@ class Transaction(PacificaModel):
         return cls(**attrs)
 
 class TransactionKeyValue(PacificaModel):
+    __slots__ = ('key', 'value')
+
     def __init__(self, **attrs: typing.Dict[str, typing.Any]) -> None:
         super(TransactionKeyValue, self).__init__()
 
-        for name in ['key', 'value']:
-            setattr(self, name, None)
-
-            if name in attrs:
-                setattr(self, name, attrs.get(name, None))
+        self.key = attrs.get('key', None)
+        self.value = attrs.get('value', None)
 
     @classmethod
-    def from_cloudevents_model(cls, event: Event) -> typing.List['TransactionKeyValue']:
-        if CLOUDEVENTS_DEFAULT_EVENT_TYPE_ != event.event_type:
-            raise InvalidEventTypeValueError(event)
-
-        if CLOUDEVENTS_DEFAULT_SOURCE_ != event.source:
-            raise InvalidSourceValueError(event)
-
+    def from_event_index(cls, event_index: EventIndex) -> typing.List['TransactionKeyValue']:
         insts = []
 
-        for match_data in Path.parse_str('$[*][?(@["destinationTable"] = "TransactionKeyValue")]').match(event.data):
-            inst = cls(**match_data.current_value)
+        for record in event_index.records('TransactionKeyValue'):
+            inst = cls(**record)
 
             insts.append(inst)
 
         return insts
 
-__all__ = ('PacificaModel', 'File', 'Transaction', 'TransactionKeyValue')
+class FileTable(object):
+    def __init__(self, columns: typing.Dict[str, typing.List[typing.Any]] = {}) -> None:
+        super(FileTable, self).__init__()
+
+        self._length = 0
+
+        for column in columns.values():
+            self._length = len(column)
+
+            break
+
+        self._columns = {} # type: typing.Dict[str, typing.List[typing.Any]]
+
+        for name in File.__slots__:
+            column = columns.get(name, None)
+
+            if column is None:
+                self._columns[name] = [None] * self._length
+            elif len(column) == self._length:
+                self._columns[name] = list(column)
+            else:
+                raise ValueError('column \'{0}\' has length {1} (expected: {2})'.format(name.replace('\'', '\\\''), len(column), self._length))
+
+    def __getitem__(self, index: int) -> File:
+        return File(**{name: column[index] for name, column in self._columns.items()})
+
+    def __iter__(self) -> typing.Iterator[File]:
+        for index in range(self._length):
+            yield self[index]
+
+    def __len__(self) -> int:
+        return self._length
+
+    @classmethod
+    def from_event_index(cls, event_index: EventIndex) -> 'FileTable':
+        return cls.from_records(event_index.records('Files'))
+
+    @classmethod
+    def from_files(cls, files: typing.List[File]) -> 'FileTable':
+        return cls({name: [getattr(file, name) for file in files] for name in File.__slots__})
+
+    @classmethod
+    def from_records(cls, records: typing.List[typing.Dict[str, typing.Any]]) -> 'FileTable':
+        return cls({name: [record.get(name, None) for record in records] for name in File.__slots__})
+
+    def column(self, name: str) -> typing.List[typing.Any]:
+        return self._columns[name]
+
+    def filter(self, **criteria: typing.Dict[str, typing.Any]) -> 'FileTable':
+        indices = range(self._length)
+
+        for name, value in criteria.items():
+            column = self._columns[name]
+
+            # NOTE A list, set or tuple of values is tested for membership, otherwise the value is tested for equality.
+            if isinstance(value, (frozenset, list, set, tuple)):
+                values = frozenset(value)
+
+                indices = [index for index in indices if column[index] in values]
+            else:
+                indices = [index for index in indices if column[index] == value]
+
+        return self.take(indices)
+
+    def take(self, indices: typing.Iterable[int]) -> 'FileTable':
+        indices = list(indices)
+
+        return self.__class__({name: [column[index] for index in indices] for name, column in self._columns.items()})
+
+__all__ = ('EventIndex', 'PacificaModel', 'File', 'FileTable', 'Transaction', 'TransactionKeyValue')
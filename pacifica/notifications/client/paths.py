@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-notifications-client: pacifica/notifications/client/paths.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+
+import functools
+import os
+import typing
+
+from jsonpath2.path import Path
+
+PATH_CACHE_MAXSIZE_ = int(os.getenv('PATH_CACHE_MAXSIZE', '256'))
+
+@functools.lru_cache(maxsize=PATH_CACHE_MAXSIZE_)
+def parse_str(string: str) -> Path:
+    return Path.parse_str(string)
+
+def parse_file(file_name: str, encoding: str = 'utf-8') -> Path:
+    with open(file_name, mode='r', encoding=encoding) as file:
+        return parse_str(file.read())
+
+def to_path(path_or_string: typing.Union[Path, str]) -> Path:
+    if isinstance(path_or_string, Path):
+        return path_or_string
+    else:
+        return parse_str(path_or_string)
+
+def cache_info() -> typing.Dict[str, int]:
+    info = parse_str.cache_info()
+
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'maxsize': info.maxsize,
+        'currsize': info.currsize,
+    }
+
+def cache_clear() -> None:
+    parse_str.cache_clear()
+
+    return
+
+__all__ = ('cache_clear', 'cache_info', 'parse_file', 'parse_str', 'to_path')
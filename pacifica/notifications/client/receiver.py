@@ -8,38 +8,839 @@
 #
 # See LICENSE and WARRANTY for details.
 
+import base64
+import collections
 import datetime
+import hashlib
 import json
+import logging
+import os
+import re
+import socket
 import sys
+import threading
+import time
 import traceback
 import typing
+import urllib.parse
 import uuid
+import zlib
 
 import celery
+import celery.signals
 import cherrypy
+import kombu
+import kombu.pools
 import peewee
+import playhouse.migrate
+
+from cloudevents.model import verify_cloudevent
+
+try:
+    import orjson
+except ImportError: # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError: # pragma: no cover
+    ujson = None
+
+try:
+    import zstandard
+except ImportError: # pragma: no cover
+    zstandard = None
 
 from .router import RouteNotFoundRouterError, Router
 
-def create_peewee_model(db: peewee.Database) -> object:
+# NOTE Task statuses that never change, i.e., that may be cached.
+TERMINAL_TASK_STATUSES_ = ('200 OK', '422 Unprocessable Entity', '500 Internal Server Error')
+
+# NOTE The top-level fields that are validated before the rest of the event is read.
+ENVELOPE_FIELD_NAMES_ = ('eventType', 'source', 'eventID')
+
+# NOTE The accepted formats of dates and times, e.g., the "created_after" and "created_before" query parameters.
+DATETIME_FORMATS_ = ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d %H:%M', '%Y-%m-%d')
+
+# NOTE The tokens that determine the extent of a JSON value, i.e., strings (which may contain brackets) and brackets (a lone quote is an unterminated string).
+JSON_STRING_RE_ = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+JSON_STRING_OR_BRACKET_RE_ = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}"]', re.DOTALL)
+JSON_SCALAR_RE_ = re.compile(rb'[^ \t\r\n,\]}]+')
+JSON_WHITESPACE_RE_ = re.compile(rb'[ \t\r\n]*')
+
+# NOTE Media types for newline-delimited JSON, i.e., one event per line.
+NDJSON_CONTENT_TYPES_ = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines')
+
+def _json_loads(s: typing.Union[bytes, str]) -> typing.Any:
+    # NOTE Use the fastest JSON library that is installed.
+    if orjson is not None:
+        try:
+            return orjson.loads(s)
+        except ValueError:
+            # NOTE For example, integers that do not fit in 64 bits, and "NaN", which are accepted by `json`.
+            pass
+    elif ujson is not None:
+        try:
+            return ujson.loads(s)
+        except ValueError:
+            pass
+
+    return json.loads(s)
+
+def _json_dumps(obj: typing.Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # NOTE For example, integers that do not fit in 64 bits.
+            pass
+    elif ujson is not None:
+        try:
+            return bytes(ujson.dumps(obj, ensure_ascii=False), 'utf-8')
+        except (OverflowError, TypeError):
+            pass
+
+    return bytes(json.dumps(obj), 'utf-8')
+
+def _skip_json_whitespace(s: bytes, pos: int) -> int:
+    return JSON_WHITESPACE_RE_.match(s, pos).end()
+
+def _skip_json_value(s: bytes, pos: int) -> int:
+    # NOTE Find the end of the JSON value that starts at `pos`, without decoding it.
+    if s[pos:pos + 1] == b'"':
+        match = JSON_STRING_RE_.match(s, pos)
+
+        if match is None:
+            raise ValueError('unterminated string')
+
+        return match.end()
+    elif s[pos:pos + 1] in (b'{', b'['):
+        brackets = []
+
+        for match in JSON_STRING_OR_BRACKET_RE_.finditer(s, pos):
+            token = match.group()
+
+            if token in (b'{', b'['):
+                brackets.append(b'}' if token == b'{' else b']')
+            elif token in (b'}', b']'):
+                if (len(brackets) == 0) or (brackets.pop() != token):
+                    raise ValueError('mismatched bracket')
+
+                if len(brackets) == 0:
+                    return match.end()
+            elif token == b'"':
+                raise ValueError('unterminated string')
+
+        raise ValueError('unterminated value')
+    else:
+        match = JSON_SCALAR_RE_.match(s, pos)
+
+        if match is None:
+            raise ValueError('expected a value')
+
+        # NOTE Scalars are short, i.e., they are validated by decoding them.
+        json.loads(match.group())
+
+        return match.end()
+
+def _find_json_member(s: bytes, name: str) -> typing.Optional[typing.Tuple[int, int]]:
+    # NOTE The span of the value of the top-level member `name` (the last, if it is repeated) of the JSON object `s`, if any.
+    pos = _skip_json_whitespace(s, 0)
+
+    if s[pos:pos + 1] != b'{':
+        return None
+
+    span = None
+
+    pos = _skip_json_whitespace(s, pos + 1)
+
+    if s[pos:pos + 1] == b'}':
+        return None
+
+    while True:
+        match = JSON_STRING_RE_.match(s, pos)
+
+        if match is None:
+            raise ValueError('expected a member name')
+
+        key = json.loads(match.group())
+
+        pos = _skip_json_whitespace(s, match.end())
+
+        if s[pos:pos + 1] != b':':
+            raise ValueError('expected a colon')
+
+        start = _skip_json_whitespace(s, pos + 1)
+
+        end = _skip_json_value(s, start)
+
+        if key == name:
+            span = (start, end)
+
+        pos = _skip_json_whitespace(s, end)
+
+        if s[pos:pos + 1] == b',':
+            pos = _skip_json_whitespace(s, pos + 1)
+        elif s[pos:pos + 1] == b'}':
+            return span
+        else:
+            raise ValueError('expected a comma')
+
+class _EnvelopeScanner(object):
+    # NOTE A minimal incremental JSON scanner for the top-level string fields of an object, i.e., the CloudEvents envelope.
+
+    def __init__(self, max_size: int = 65536) -> None:
+        super(_EnvelopeScanner, self).__init__()
+
+        self.max_size = max_size
+
+        self.fields = {} # type: typing.Dict[str, str]
+        self.done = False
+
+        self._size = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string = bytearray()
+        self._expect = 'start'
+        self._key = None # type: typing.Optional[str]
+
+    def feed(self, chunk: bytes) -> None:
+        if self.done:
+            return
+
+        # NOTE Only the first `max_size` bytes are scanned (the remainder is validated when the event is decoded).
+        for byte in chunk[:max(self.max_size - self._size, 0)]:
+            self._feed_byte(byte)
+
+            if self.done:
+                return
+
+        self._size += len(chunk)
+
+        if self._size >= self.max_size:
+            self.done = True
+
+        return
+
+    def _feed_byte(self, byte: int) -> None:
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif 0x5c == byte: # '\\'
+                self._escape = True
+            elif 0x22 == byte: # '"'
+                self._in_string = False
+
+                if 1 == self._depth:
+                    self._end_string()
+
+                return
+
+            if 1 == self._depth:
+                self._string.append(byte)
+
+            return
+
+        if byte in b' \t\r\n':
+            return
+
+        if 'start' == self._expect:
+            if 0x7b != byte: # '{'
+                raise ValueError('event is not a JSON object')
+
+            self._depth = 1
+            self._expect = 'key'
+
+            return
+
+        if 0x22 == byte: # '"'
+            if (1 == self._depth) and (self._expect not in ('key', 'value')):
+                raise ValueError('event is malformed')
+
+            self._in_string = True
+            self._string = bytearray()
+
+            return
+
+        if self._depth > 1:
+            if byte in b'{[':
+                self._depth += 1
+            elif byte in b'}]':
+                self._depth -= 1
+
+            return
+
+        if 'colon' == self._expect:
+            if 0x3a != byte: # ':'
+                raise ValueError('event is malformed')
+
+            self._expect = 'value'
+        elif 'value' == self._expect:
+            if self._key in ENVELOPE_FIELD_NAMES_:
+                raise ValueError('field {0} must be a string'.format(self._key))
+
+            if byte in b'{[':
+                self._depth += 1
+
+                self._expect = 'comma'
+            else:
+                self._expect = 'scalar'
+        elif ('comma' == self._expect) or ('scalar' == self._expect) or ('key' == self._expect):
+            if (0x2c == byte) and ('key' != self._expect): # ','
+                self._expect = 'key'
+            elif 0x7d == byte: # '}'
+                self._end_object()
+            elif 'scalar' != self._expect:
+                raise ValueError('event is malformed')
+
+        return
+
+    def _end_string(self) -> None:
+        value = json.loads(b'"' + bytes(self._string) + b'"')
+
+        if 'key' == self._expect:
+            self._key = value
+
+            self._expect = 'colon'
+        else:
+            if self._key in ENVELOPE_FIELD_NAMES_:
+                if 0 == len(value):
+                    raise ValueError('field {0} must be a non-empty string'.format(self._key))
+
+                self.fields[self._key] = value
+
+            self._expect = 'comma'
+
+            if len(self.fields) == len(ENVELOPE_FIELD_NAMES_):
+                self.done = True
+
+        return
+
+    def _end_object(self) -> None:
+        self._depth = 0
+
+        self.done = True
+
+        for name in ENVELOPE_FIELD_NAMES_:
+            if name not in self.fields:
+                raise ValueError('missing required field {0}'.format(name))
+
+        return
+
+def _iter_decoded_chunks(chunks: typing.Iterable[bytes], decompressor: typing.Any = None, max_size: int = None) -> typing.Generator[bytes, None, None]:
+    for chunk in chunks:
+        if decompressor is None:
+            yield chunk
+        else:
+            while len(chunk) > 0:
+                # NOTE Bound the size of the output, i.e., do not inflate a "zip bomb" into memory.
+                yield decompressor.decompress(chunk, 0 if max_size is None else max_size + 1)
+
+                chunk = decompressor.unconsumed_tail
+
+    if decompressor is not None:
+        yield decompressor.flush()
+
+def _read_request_body(max_size: int, scanner: _EnvelopeScanner = None, chunk_size: int = 65536) -> bytes:
+    content_encoding = cherrypy.request.headers.get('Content-Encoding', 'identity').strip().lower()
+
+    if content_encoding in ('gzip', 'x-gzip'):
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif 'identity' == content_encoding:
+        decompressor = None
+    else:
+        raise cherrypy.HTTPError('415', 'Unsupported Media Type')
+
+    content_length = cherrypy.request.headers.get('Content-Length', None)
+
+    if (decompressor is None) and (content_length is not None) and (int(content_length) > max_size):
+        # NOTE Reject the request before reading its body.
+        raise cherrypy.HTTPError('413', 'Request Entity Too Large')
+
+    chunks = []
+
+    size = 0
+
+    try:
+        for chunk in _iter_decoded_chunks(iter(lambda: cherrypy.request.body.read(chunk_size), b''), decompressor=decompressor, max_size=max_size):
+            size += len(chunk)
+
+            if size > max_size:
+                raise cherrypy.HTTPError('413', 'Request Entity Too Large')
+
+            if scanner is not None:
+                scanner.feed(chunk)
+
+            chunks.append(chunk)
+    except zlib.error:
+        raise cherrypy.HTTPError('400', 'Bad Request')
+    except ValueError as reason:
+        # NOTE Raised by `scanner`, i.e., the remainder of the body is not read.
+        raise cherrypy.HTTPError('422', 'Unprocessable Entity: {0}'.format(reason))
+
+    return b''.join(chunks)
+
+def _to_json_response(body: bytes) -> bytes:
+    etag = '"{0}"'.format(hashlib.sha1(body).hexdigest())
+
+    cherrypy.response.headers['Content-Type'] = 'application/json; charset=utf-8'
+    cherrypy.response.headers['ETag'] = etag
+
+    if_none_match = [value.strip() for value in cherrypy.request.headers.get('If-None-Match', '').split(',')]
+
+    if (etag in if_none_match) or ('W/{0}'.format(etag) in if_none_match) or ('*' in if_none_match):
+        cherrypy.response.status = '304 Not Modified'
+        return b''
+
+    cherrypy.response.status = '200 OK'
+    return body
+
+def _is_memory_db(db: peewee.Database) -> bool:
+    # NOTE An in-memory database is lost when its connection is closed.
+    return isinstance(db, peewee.SqliteDatabase) and (':memory:' == db.database)
+
+def _connect_db(db: peewee.Database) -> None:
+    if not _is_memory_db(db):
+        db.connect(reuse_if_open=True)
+
+    return
+
+def _close_db(db: peewee.Database) -> None:
+    # NOTE For a pooled database, the connection is returned to the pool.
+    if not _is_memory_db(db) and not db.is_closed():
+        db.close()
+
+    return
+
+def _close_all_db(db: peewee.Database) -> None:
+    _close_db(db)
+
+    if hasattr(db, 'close_all'):
+        db.close_all()
+
+    return
+
+def _encode_payload(payload: bytes, encoding: str) -> bytes:
+    if 'zlib' == encoding:
+        return zlib.compress(payload)
+    elif 'zstd' == encoding:
+        return zstandard.ZstdCompressor().compress(payload)
+    elif 'identity' == encoding:
+        return payload
+    else:
+        raise ValueError('unsupported payload encoding: {0}'.format(encoding))
+
+def _decode_payload(payload: bytes, encoding: str) -> bytes:
+    if 'zlib' == encoding:
+        return zlib.decompress(payload)
+    elif 'zstd' == encoding:
+        return zstandard.ZstdDecompressor().decompress(payload)
+    elif 'identity' == encoding:
+        return bytes(payload)
+    else:
+        raise ValueError('unsupported payload encoding: {0}'.format(encoding))
+
+def _to_cursor(created: datetime.datetime, uuid_value: uuid.UUID) -> str:
+    return str(base64.urlsafe_b64encode(bytes(json.dumps([created.isoformat(), str(uuid_value)]), 'utf-8')), 'ascii')
+
+def _parse_datetime(value: str) -> datetime.datetime:
+    # NOTE ISO 8601 (with or without microseconds, and with either separator), as formatted by `datetime.datetime.isoformat` and `str`.
+    for datetime_format in DATETIME_FORMATS_:
+        try:
+            return datetime.datetime.strptime(value, datetime_format)
+        except ValueError:
+            pass
+
+    raise ValueError('invalid date and time: {0}'.format(value))
+
+def _from_cursor(cursor: str) -> typing.Tuple[datetime.datetime, uuid.UUID]:
+    try:
+        created, uuid_value = json.loads(base64.urlsafe_b64decode(bytes(cursor, 'ascii')))
+
+        return (_parse_datetime(created), uuid.UUID(uuid_value))
+    except (AttributeError, KeyError, TypeError, ValueError):
+        # NOTE Including `binascii.Error` and `UnicodeError`, and cursors that are valid JSON of the wrong shape.
+        raise ValueError('invalid cursor')
+
+def _load_event_data_list(body: bytes, content_type: str = None) -> typing.List[typing.Dict[str, typing.Any]]:
+    media_type = (content_type or '').split(';', 1)[0].strip().lower()
+
+    if media_type in NDJSON_CONTENT_TYPES_:
+        event_data_list = [_json_loads(line) for line in body.splitlines() if len(line.strip()) > 0]
+    else:
+        event_data_list = _json_loads(body)
+
+        if not isinstance(event_data_list, list):
+            raise ValueError('expected a JSON array')
+
+    return event_data_list
+
+def _verify_event_data_list(event_data_list: typing.List[typing.Any]) -> None:
+    for index, event_data in enumerate(event_data_list):
+        if not isinstance(event_data, dict):
+            raise ValueError('event {0} is not a JSON object'.format(index))
+
+        try:
+            verify_cloudevent(event_data)
+        except RuntimeError as reason:
+            raise ValueError('event {0} is invalid: {1}'.format(index, reason))
+
+    return
+
+class TaskStatusBuffer(object):
+    def __init__(self, model: typing.Type[peewee.Model], max_size: int = 100, max_delay: float = 1.0, on_flush: typing.Callable[[typing.List[str]], None] = None) -> None:
+        super(TaskStatusBuffer, self).__init__()
+
+        self.model = model
+        self.max_size = max_size
+        self.max_delay = max_delay
+
+        # NOTE If defined, then called with the identifiers of the tasks whose updates were committed.
+        self.on_flush = on_flush
+
+        self._fields_by_task_id = collections.OrderedDict() # type: typing.Dict[str, typing.Dict[str, typing.Any]]
+        self._lock = threading.RLock()
+        self._timer = None # type: threading.Timer
+
+    def __len__(self) -> int:
+        return len(self._fields_by_task_id)
+
+    def put(self, task_id: typing.Union[str, uuid.UUID], task_status: str, **kwargs) -> None:
+        with self._lock:
+            # NOTE Coalesce the updates for the same task, i.e., the last status wins.
+            fields = self._fields_by_task_id.setdefault(str(task_id), {})
+            fields.update(kwargs)
+            fields['task_status'] = task_status
+            fields['updated'] = datetime.datetime.now()
+
+            if len(self._fields_by_task_id) >= self.max_size:
+                self.flush()
+            else:
+                self._start_timer()
+
+        return
+
+    def _start_timer(self) -> None:
+        if self._timer is None:
+            self._timer = threading.Timer(self.max_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+        return
+
+    def _requeue(self, fields_by_task_id: typing.Dict[str, typing.Dict[str, typing.Any]]) -> None:
+        # NOTE The failed updates are retried before (and are overwritten by) the updates that were buffered since.
+        for task_id, fields in fields_by_task_id.items():
+            fields.update(self._fields_by_task_id.get(task_id, {}))
+
+        fields_by_task_id.update((task_id, fields) for task_id, fields in self._fields_by_task_id.items() if task_id not in fields_by_task_id)
+
+        self._fields_by_task_id = fields_by_task_id
+
+        self._start_timer()
+
+        return
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+
+                self._timer = None
+
+            fields_by_task_id = self._fields_by_task_id
+
+            self._fields_by_task_id = collections.OrderedDict()
+
+            if len(fields_by_task_id) == 0:
+                return
+
+            db = self.model._meta.database
+
+            # NOTE The timer thread has its own connection, which is released after the flush.
+            was_closed = db.is_closed()
+
+            _connect_db(db)
+
+            try:
+                # NOTE One transaction (i.e., one commit) for all buffered updates.
+                with db.atomic():
+                    for task_id, fields in fields_by_task_id.items():
+                        self.model.update(**fields).where(self.model.task_id == uuid.UUID(task_id)).execute()
+            except Exception:
+                # NOTE Do not lose the updates (e.g., if the database is unavailable), i.e., the flush is retried after `max_delay` seconds.
+                logging.getLogger(__name__).exception('failed to flush %d task status update(s)', len(fields_by_task_id))
+
+                self._requeue(fields_by_task_id)
+
+                return
+            finally:
+                if was_closed:
+                    _close_db(db)
+
+        if self.on_flush is not None:
+            self.on_flush(list(fields_by_task_id.keys()))
+
+        return
+
+class TaskCache(object):
+    def __init__(self, max_size: int = 10000, ttl: float = 60.0) -> None:
+        super(TaskCache, self).__init__()
+
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._values_by_key = collections.OrderedDict() # type: typing.Dict[typing.Tuple[str, str], typing.Tuple[float, bytes]]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._values_by_key)
+
+    def get(self, kind: str, task_id: str) -> typing.Optional[bytes]:
+        key = (kind, str(task_id))
+
+        with self._lock:
+            expires, value = self._values_by_key.get(key, (None, None))
+
+            if expires is None:
+                return None
+
+            if expires < time.monotonic():
+                del self._values_by_key[key]
+
+                return None
+
+            self._values_by_key.move_to_end(key)
+
+            return value
+
+    def put(self, kind: str, task_id: str, value: bytes) -> None:
+        key = (kind, str(task_id))
+
+        with self._lock:
+            self._values_by_key[key] = (time.monotonic() + self.ttl, value)
+            self._values_by_key.move_to_end(key)
+
+            while len(self._values_by_key) > self.max_size:
+                self._values_by_key.popitem(last=False)
+
+        return
+
+    def invalidate(self, task_id: str) -> None:
+        with self._lock:
+            for key in [key for key in self._values_by_key.keys() if key[1] == str(task_id)]:
+                del self._values_by_key[key]
+
+        return
+
+class _TaskWaiters(object):
+    def __init__(self, lock: threading.Lock) -> None:
+        super(_TaskWaiters, self).__init__()
+
+        self.condition = threading.Condition(lock)
+        self.count = 0 # type: int
+        self.version = 0 # type: int
+
+class TaskNotifier(object):
+    def __init__(self) -> None:
+        super(TaskNotifier, self).__init__()
+
+        self._version = 0 # type: int
+        # NOTE The version of the last notification for all tasks, e.g., after notifications may have been missed.
+        self._all_version = 0 # type: int
+        self._lock = threading.Lock()
+        # NOTE Only the tasks that are waited for are tracked.
+        self._waiters_by_task_id = {} # type: typing.Dict[str, _TaskWaiters]
+
+    def register(self, task_id: str) -> None:
+        with self._lock:
+            waiters = self._waiters_by_task_id.get(str(task_id), None)
+
+            if waiters is None:
+                waiters = self._waiters_by_task_id[str(task_id)] = _TaskWaiters(self._lock)
+
+            waiters.count += 1
+
+        return
+
+    def unregister(self, task_id: str) -> None:
+        with self._lock:
+            waiters = self._waiters_by_task_id[str(task_id)]
+
+            waiters.count -= 1
+
+            if waiters.count == 0:
+                del self._waiters_by_task_id[str(task_id)]
+
+        return
+
+    def _task_version(self, task_id: str) -> int:
+        waiters = self._waiters_by_task_id.get(str(task_id), None)
+
+        return self._all_version if waiters is None else max(waiters.version, self._all_version)
+
+    def version(self, task_id: str) -> int:
+        with self._lock:
+            return self._task_version(task_id)
+
+    def notify(self, task_id: str = None) -> None:
+        # NOTE Waiters re-read the status of their task, i.e., the notification does not carry the status.
+        with self._lock:
+            self._version += 1
+
+            if task_id is None:
+                self._all_version = self._version
+
+                for waiters in self._waiters_by_task_id.values():
+                    waiters.condition.notify_all()
+            else:
+                # NOTE Only the requests that are waiting for the task are woken up.
+                waiters = self._waiters_by_task_id.get(str(task_id), None)
+
+                if waiters is not None:
+                    waiters.version = self._version
+
+                    waiters.condition.notify_all()
+
+        return
+
+    def wait(self, task_id: str, version: int, timeout: float = None) -> bool:
+        # NOTE The task must be registered, i.e., notifications are only recorded for the tasks that are waited for.
+        with self._lock:
+            return self._waiters_by_task_id[str(task_id)].condition.wait_for(lambda: self._task_version(task_id) != version, timeout=timeout)
+
+class BrokerTaskNotifier(TaskNotifier):
+    # NOTE Notifications are published to a fanout exchange on the broker, i.e., the workers wake up the requests that are waiting in other processes (e.g., the web tier).
+
+    def __init__(self, broker_url: str, exchange_name: str = 'pacifica.notifications.task_status', reconnect_delay: float = 1.0) -> None:
+        super(BrokerTaskNotifier, self).__init__()
+
+        self.broker_url = broker_url
+        self.exchange_name = exchange_name
+        self.reconnect_delay = reconnect_delay
+
+        self._exchange = kombu.Exchange(exchange_name, type='fanout', durable=False, auto_delete=True)
+
+        self._consumer_lock = threading.Lock()
+        self._consumer_pid = None # type: typing.Optional[int]
+        self._consumer_ready = threading.Event()
+
+    def register(self, task_id: str) -> None:
+        # NOTE The consumer is started by the first waiting request (in each process), i.e., not by the workers, which only publish.
+        self._start_consumer()
+
+        super(BrokerTaskNotifier, self).register(task_id)
+
+        return
+
+    def notify(self, task_id: str = None) -> None:
+        try:
+            with kombu.pools.producers[kombu.Connection(self.broker_url)].acquire(block=True) as producer:
+                producer.publish({'task_id': None if task_id is None else str(task_id)}, exchange=self._exchange, declare=[self._exchange], serializer='json', retry=True)
+        except Exception:
+            # NOTE The waiting requests fall back to polling, i.e., the status update is not failed.
+            logging.getLogger(__name__).exception('failed to publish task status notification')
+
+        return
+
+    def _start_consumer(self) -> None:
+        with self._consumer_lock:
+            # NOTE The thread does not survive a fork, e.g., of the uwsgi workers.
+            if self._consumer_pid != os.getpid():
+                self._consumer_pid = os.getpid()
+                self._consumer_ready.clear()
+
+                thread = threading.Thread(target=self._consume, daemon=True)
+                thread.start()
+
+        return
+
+    def _on_message(self, body: typing.Dict[str, typing.Any], message: kombu.Message) -> None:
+        super(BrokerTaskNotifier, self).notify(body.get('task_id', None) if isinstance(body, dict) else None)
+
+        return
+
+    def _consume(self) -> None:
+        # NOTE Each process has its own (exclusive) queue, i.e., each process receives all notifications.
+        queue = kombu.Queue('{0}.{1}'.format(self.exchange_name, uuid.uuid4().hex), exchange=self._exchange, durable=False, exclusive=True, auto_delete=True)
+
+        while True:
+            try:
+                with kombu.Connection(self.broker_url) as connection:
+                    with connection.Consumer([queue], callbacks=[self._on_message], accept=['json'], no_ack=True):
+                        self._consumer_ready.set()
+
+                        # NOTE Notifications may have been missed while (re)connecting.
+                        super(BrokerTaskNotifier, self).notify()
+
+                        while True:
+                            try:
+                                connection.drain_events(timeout=self.reconnect_delay)
+                            except socket.timeout:
+                                pass
+            except Exception:
+                logging.getLogger(__name__).exception('failed to consume task status notifications')
+
+                time.sleep(self.reconnect_delay)
+
+def create_peewee_model(db: peewee.Database, payload_encoding: str = 'zlib') -> object:
+    if ('zstd' == payload_encoding) and (zstandard is None):
+        raise ValueError('payload encoding \'zstd\' requires the \'zstandard\' package')
+
+    # NOTE The (large) payloads are stored separately from the (hot) status table, and are only read by the "get" endpoint.
+    class ReceiveTaskPayloadModel(peewee.Model):
+        task_id = peewee.UUIDField(primary_key=True)
+
+        encoding = peewee.CharField()
+        event_data = peewee.BlobField()
+
+        class Meta(object):
+            database = db
+
+        def to_event_data_bytes(self) -> bytes:
+            return _decode_payload(self.event_data, self.encoding)
+
+        def to_event_data_str(self) -> str:
+            return str(self.to_event_data_bytes(), 'utf-8')
+
+    # NOTE The tasks for duplicate events, which resolve to the task for the original event.
+    class ReceiveTaskAliasModel(peewee.Model):
+        task_id = peewee.UUIDField(primary_key=True)
+
+        original_task_id = peewee.UUIDField()
+
+        class Meta(object):
+            database = db
+
+    # NOTE The (source, event ID) of the accepted events, i.e., each event is accepted once (unless its handler failed).
+    class ReceiveTaskEventKeyModel(peewee.Model):
+        source = peewee.CharField()
+        event_id = peewee.CharField()
+
+        task_id = peewee.UUIDField(unique=True)
+
+        class Meta(object):
+            database = db
+
+            primary_key = peewee.CompositeKey('source', 'event_id')
+
     class ReceiveTaskModel(peewee.Model):
-        uuid = peewee.UUIDField(default=uuid.uuid4, index=True, primary_key=True)
+        uuid = peewee.UUIDField(default=uuid.uuid4, primary_key=True)
 
+        # NOTE Only the columns that are queried are indexed.
         event_type = peewee.CharField(index=True, null=True)
-        event_type_version = peewee.CharField(index=True, null=True)
-        cloud_events_version = peewee.CharField(index=True, null=True)
-        source = peewee.CharField(index=True, null=True)
-        event_id = peewee.CharField(index=True, null=True)
-        event_time = peewee.CharField(index=True, null=True)
-        schema_url = peewee.CharField(index=True, null=True)
-        content_type = peewee.CharField(index=True, null=True)
-
-        event_data = peewee.TextField()
-        data = peewee.TextField()
-
-        task_id = peewee.UUIDField(index=True, unique=True)
-        task_application_name = peewee.CharField(index=True)
-        task_name = peewee.CharField(index=True)
+        event_type_version = peewee.CharField(null=True)
+        cloud_events_version = peewee.CharField(null=True)
+        source = peewee.CharField(null=True)
+        event_id = peewee.CharField(null=True)
+        event_time = peewee.CharField(null=True)
+        schema_url = peewee.CharField(null=True)
+        content_type = peewee.CharField(null=True)
+
+        task_id = peewee.UUIDField(unique=True)
+        task_application_name = peewee.CharField()
+        task_name = peewee.CharField()
         task_status = peewee.CharField(index=True)
 
         exc_type = peewee.CharField(null=True)
@@ -47,21 +848,179 @@ def create_peewee_model(db: peewee.Database) -> object:
         exc_traceback = peewee.TextField()
 
         created = peewee.DateTimeField(default=datetime.datetime.now, index=True)
-        updated = peewee.DateTimeField(default=datetime.datetime.now, index=True)
-        deleted = peewee.DateTimeField(index=True, null=True)
+        updated = peewee.DateTimeField(default=datetime.datetime.now)
+        deleted = peewee.DateTimeField(null=True)
+
+        alias_model = ReceiveTaskAliasModel
+        event_key_model = ReceiveTaskEventKeyModel
+        payload_model = ReceiveTaskPayloadModel
 
         class Meta(object):
             database = db
 
+            indexes = (
+                # NOTE For keyset pagination of the task listing.
+                (('created', 'uuid'), False),
+            )
+
+        @classmethod
+        def create_tables(cls, safe: bool = True) -> None:
+            db.create_tables([cls, ReceiveTaskAliasModel, ReceiveTaskEventKeyModel, ReceiveTaskPayloadModel], safe=safe)
+
+            return
+
+        @classmethod
+        def migrate(cls, batch_size: int = 1000) -> None:
+            # NOTE Upgrade a table that was created by an earlier version (where the payload is stored in the "event_data" and "data" columns, and most columns are indexed), or create the tables.
+            table_name = cls._meta.table_name
+
+            if not db.table_exists(table_name):
+                cls.create_tables(safe=True)
+
+                return
+
+            migrator = playhouse.migrate.SchemaMigrator.from_database(db)
+
+            with db.atomic():
+                # NOTE Whether the events were deduplicated, i.e., whether the keys of the existing events are to be indexed (once).
+                has_event_keys = ReceiveTaskEventKeyModel.table_exists()
+
+                db.create_tables([ReceiveTaskAliasModel, ReceiveTaskEventKeyModel, ReceiveTaskPayloadModel], safe=True)
+
+                column_names = [column.name for column in db.get_columns(table_name)]
+
+                if 'event_data' in column_names:
+                    # NOTE Copy the payloads in batches (ordered by the unique "task_id" column), i.e., the table is not read into memory.
+                    last_task_id = None
+
+                    while True:
+                        query = cls.select(cls.task_id, peewee.Column(cls._meta.table, 'event_data')).order_by(cls.task_id).limit(batch_size)
+
+                        if last_task_id is not None:
+                            query = query.where(cls.task_id > last_task_id)
+
+                        rows = list(query.tuples())
+
+                        if len(rows) == 0:
+                            break
+
+                        ReceiveTaskPayloadModel.insert_many([(task_id, payload_encoding, _encode_payload(bytes(event_data, 'utf-8'), payload_encoding)) for task_id, event_data in rows], fields=[ReceiveTaskPayloadModel.task_id, ReceiveTaskPayloadModel.encoding, ReceiveTaskPayloadModel.event_data]).on_conflict_ignore().execute()
+
+                        last_task_id = rows[-1][0]
+
+                    playhouse.migrate.migrate(migrator.drop_column(table_name, 'event_data'))
+
+                if 'data' in column_names:
+                    playhouse.migrate.migrate(migrator.drop_column(table_name, 'data'))
+
+                # NOTE Drop the indexes that are not defined by the model (except for the primary key).
+                index_keys = set((tuple(field.column_name for field in index._expressions), bool(index._unique)) for index in cls._meta.fields_to_index())
+
+                for index in db.get_indexes(table_name):
+                    if (index.columns == [cls._meta.primary_key.column_name]) or ((tuple(index.columns), bool(index.unique)) in index_keys):
+                        continue
+
+                    playhouse.migrate.migrate(migrator.drop_index(table_name, index.name))
+
+                if not has_event_keys:
+                    # NOTE Events were not deduplicated by earlier versions, i.e., the first of the duplicates is the original event (the rows themselves are kept).
+                    ReceiveTaskEventKeyModel.insert_from(cls.select(cls.source, cls.event_id, cls.task_id).where(cls.source.is_null(False) & cls.event_id.is_null(False)).order_by(cls.created, cls.uuid), [ReceiveTaskEventKeyModel.source, ReceiveTaskEventKeyModel.event_id, ReceiveTaskEventKeyModel.task_id]).on_conflict_ignore().execute()
+
+                cls._schema.create_indexes(safe=True)
+
+            return
+
+        @classmethod
+        def insert_with_payload(cls, event_data: typing.Union[typing.Dict[str, typing.Any], bytes], **kwargs) -> None:
+            # NOTE The payload is either the event or its (raw) JSON encoding, which is stored verbatim.
+            event_data_bytes = event_data if isinstance(event_data, bytes) else _json_dumps(event_data)
+
+            with db.atomic():
+                cls.insert(**kwargs).execute()
+
+                ReceiveTaskPayloadModel.insert(task_id=kwargs['task_id'], encoding=payload_encoding, event_data=_encode_payload(event_data_bytes, payload_encoding)).execute()
+
+                # NOTE Raises `peewee.IntegrityError` if the event was already accepted, i.e., the event is not written.
+                if isinstance(kwargs.get('source', None), str) and isinstance(kwargs.get('event_id', None), str):
+                    ReceiveTaskEventKeyModel.insert(source=kwargs['source'], event_id=kwargs['event_id'], task_id=kwargs['task_id']).execute()
+
+            return
+
+        @classmethod
+        def update_task_status(cls, task_id: str, task_status: str, **kwargs) -> int:
+            # NOTE Only update the given columns, i.e., do not rewrite the payload.
+            return cls.update(task_status=task_status, updated=datetime.datetime.now(), **kwargs).where(cls.task_id == task_id).execute()
+
         @classmethod
-        def create_celery_app(cls, router: Router, name: str, receive_task_name: str, *args, **kwargs) -> celery.Celery:
+        def create_celery_app(cls, router: Router, name: str, receive_task_name: str, *args, status_buffer_size: int = None, status_buffer_max_delay: float = 1.0, task_cache: TaskCache = None, task_notifier: TaskNotifier = None, **kwargs) -> celery.Celery:
             celery_app = celery.Celery(name, *args, **kwargs)
 
             celery_app.conf.worker_redirect_stdouts = False
 
+            route_queues = router.queues()
+
+            if len(route_queues) > 0:
+                # NOTE Workers consume from the default queue and the route queues (unless "-Q" is specified). Priorities require the queue to be declared with "x-max-priority".
+                celery_app.conf.task_queues = [kombu.Queue(celery_app.conf.task_default_queue)] + [kombu.Queue(queue, routing_key=queue, queue_arguments=None if max_priority is None else {'x-max-priority': max_priority}) for queue, max_priority in sorted(route_queues.items())]
+
+            def on_task_status_updated(task_ids: typing.List[str]) -> None:
+                # NOTE Invalidate the cached responses for the tasks, and wake up the requests that are waiting for them, once their statuses are committed (if the cache and notifier are shared with the web tier).
+                for task_id in task_ids:
+                    if task_cache is not None:
+                        task_cache.invalidate(task_id)
+
+                    if task_notifier is not None:
+                        task_notifier.notify(task_id)
+
+                return
+
+            if status_buffer_size is None:
+                def update_task_status(task_id: str, task_status: str, **kwargs) -> None:
+                    cls.update_task_status(task_id, task_status, **kwargs)
+
+                    on_task_status_updated([task_id])
+
+                    return
+            else:
+                status_buffer = TaskStatusBuffer(cls, max_size=status_buffer_size, max_delay=status_buffer_max_delay, on_flush=on_task_status_updated)
+
+                # NOTE Do not lose buffered updates when the worker process exits.
+                celery.signals.worker_process_shutdown.connect(lambda *args, **kwargs: status_buffer.flush(), weak=False)
+
+                update_task_status = status_buffer.put
+
             @celery_app.task(bind=True, ignore_result=True, name=receive_task_name)
-            def receive_task(self, event_data: typing.Dict[str, typing.Any]) -> None:
-                inst = cls(**{
+            def receive_task(self, event_data: typing.Union[typing.Dict[str, typing.Any], str], route_id: str = None) -> None:
+                # NOTE The event is either decoded or its raw JSON encoding (as received by the web tier), which is decoded once here and stored verbatim.
+                if isinstance(event_data, str):
+                    event_data_str = event_data
+
+                    payload = bytes(event_data, 'utf-8')
+
+                    try:
+                        event_data = _json_loads(payload)
+                    except ValueError:
+                        event_data = None
+
+                    if not isinstance(event_data, dict):
+                        # NOTE Record the malformed event (as a JSON string, so that it can be embedded in responses), so that its status can be queried.
+                        cls.insert_with_payload(_json_dumps(event_data_str), task_id=self.request.id, task_application_name=name, task_name=receive_task_name, task_status='422 Unprocessable Entity', exc_traceback='')
+
+                        return
+                else:
+                    payload = event_data
+
+                # NOTE Do not re-match the event if it was routed by the web tier (unless the routes differ).
+                route = router.get_route(route_id) if route_id is not None else None
+
+                try:
+                    if route is None:
+                        route = router.match_first_or_raise(event_data)
+                except RouteNotFoundRouterError:
+                    route = None
+
+                # NOTE The event is routed before the payload is written, so that the initial status is written with the payload (and unroutable events are written once).
+                fields = {
                     'event_type': event_data.get('eventType', None),
                     'event_type_version': event_data.get('eventTypeVersion', None),
                     'source': event_data.get('source', None),
@@ -70,142 +1029,521 @@ def create_peewee_model(db: peewee.Database) -> object:
                     'schema_url': event_data.get('schemaURL', None),
                     'content_type': event_data.get('contentType', None),
 
-                    'event_data': json.dumps(event_data),
-                    'data': json.dumps(event_data.get('data', None)),
-
                     'task_id': self.request.id,
                     'task_application_name': name,
                     'task_name': receive_task_name,
-                    'task_status': '202 Accepted',
+                    'task_status': '422 Unprocessable Entity' if route is None else '102 Processing',
 
                     'exc_type': None,
                     'exc_value': None,
                     'exc_traceback': '',
-                })
-                inst.save(force_insert=True)
+                }
 
-                try:
-                    route = router.match_first_or_raise(event_data)
-                except RouteNotFoundRouterError:
-                    inst.task_status = '422 Unprocessable Entity'
-                    inst.save()
-                else:
-                    inst.task_status = '102 Processing'
-                    inst.save()
+                # NOTE The insert is retried if the original event failed, and is resubmitted concurrently (the number of attempts is bounded).
+                for attempt in range(3):
+                    try:
+                        cls.insert_with_payload(payload, **fields)
+                    except peewee.IntegrityError:
+                        if cls.select().where(cls.task_id == self.request.id).exists() or ReceiveTaskAliasModel.select().where(ReceiveTaskAliasModel.task_id == self.request.id).exists():
+                            # NOTE The task was already accepted (e.g., the message was redelivered), i.e., it is not handled again.
+                            return
+
+                        if (attempt == 2) or not (isinstance(fields['source'], str) and isinstance(fields['event_id'], str)):
+                            raise
+
+                        try:
+                            original_task_id, original_task_status = ReceiveTaskEventKeyModel.select(ReceiveTaskEventKeyModel.task_id, cls.task_status).join(cls, on=(cls.task_id == ReceiveTaskEventKeyModel.task_id)).where((ReceiveTaskEventKeyModel.source == fields['source']) & (ReceiveTaskEventKeyModel.event_id == fields['event_id'])).tuples().get()
+                        except peewee.DoesNotExist:
+                            # NOTE The key was released in between, i.e., the original event failed.
+                            continue
 
+                        if '500 Internal Server Error' == original_task_status:
+                            # NOTE An event whose handler failed may be resubmitted, i.e., the key is released (the original task is kept, unchanged).
+                            ReceiveTaskEventKeyModel.delete().where(ReceiveTaskEventKeyModel.task_id == original_task_id).execute()
+
+                            continue
+
+                        # NOTE The event was already accepted, i.e., it is a duplicate, which is not handled again (and its task resolves to the original task).
+                        ReceiveTaskAliasModel.insert(task_id=self.request.id, original_task_id=original_task_id).on_conflict_ignore().execute()
+
+                        if task_notifier is not None:
+                            task_notifier.notify(self.request.id)
+
+                        return
+
+                    break
+
+                if route is not None:
                     try:
                         route(event_data)
                     except:
                         exc_type, exc_value, exc_traceback = sys.exc_info()
-                        inst.exc_type = exc_type.__name__
-                        inst.exc_value = str(exc_value)
-                        inst.exc_traceback = traceback.format_tb(exc_traceback)
 
-                        inst.task_status = '500 Internal Server Error'
-                        inst.save()
+                        update_task_status(self.request.id, '500 Internal Server Error', exc_type=exc_type.__name__, exc_value=str(exc_value), exc_traceback=traceback.format_tb(exc_traceback))
                     else:
-                        inst.task_status = '200 OK'
-                        inst.save()
+                        update_task_status(self.request.id, '200 OK')
 
                 return
 
+            # NOTE Each task uses its own connection (from the pool, if the database is pooled), i.e., connections are not shared with the parent process.
+            celery.signals.task_prerun.connect(lambda *args, **kwargs: _connect_db(db), sender=receive_task, weak=False)
+            celery.signals.task_postrun.connect(lambda *args, **kwargs: _close_db(db), sender=receive_task, weak=False)
+            celery.signals.worker_process_shutdown.connect(lambda *args, **kwargs: _close_all_db(db), weak=False)
+
             return celery_app
 
         @classmethod
-        def create_cherrypy_app(cls, receive_task: celery.Task) -> cherrypy.Application:
+        def create_cherrypy_app(cls, receive_task: celery.Task, batch_chunk_size: int = 1000, router: Router = None, page_size: int = 100, max_page_size: int = 1000, task_cache: TaskCache = None, task_notifier: TaskNotifier = None, wait_timeout: float = 30.0, wait_max_timeout: float = 300.0, wait_poll_interval: float = None, events_keepalive_interval: float = 15.0, max_body_size: int = 16777216, batch_max_body_size: int = 268435456, envelope_scan_size: int = 65536, wait_max_waiters: int = None) -> cherrypy.Application:
+            if wait_poll_interval is None:
+                # NOTE With notifications, polling is only a fallback (e.g., for a lost notification).
+                wait_poll_interval = 1.0 if task_notifier is None else 30.0
+
+            if task_notifier is None:
+                # NOTE Without notifications, waiting requests poll the database every `wait_poll_interval` seconds.
+                task_notifier = TaskNotifier()
+
+            # NOTE The maximum number of concurrent "/wait" and "/events" requests (if any).
+            waiter_semaphore = None if wait_max_waiters is None else threading.BoundedSemaphore(wait_max_waiters) # type: typing.Optional[threading.BoundedSemaphore]
+
+            def to_original_task_id(task_id: str) -> typing.Optional[str]:
+                # NOTE The task for a duplicate event resolves to the task for the original event.
+                try:
+                    return str(ReceiveTaskAliasModel.select(ReceiveTaskAliasModel.original_task_id).where(ReceiveTaskAliasModel.task_id == uuid.UUID(task_id)).get().original_task_id)
+                except peewee.DoesNotExist:
+                    return None
+
+            def to_task_status(task_id: str) -> typing.Optional[str]:
+                body = None if task_cache is None else task_cache.get('status', task_id)
+
+                if body is not None:
+                    return json.loads(body)
+
+                try:
+                    inst = cls.select(cls.task_status).where(cls.task_id == uuid.UUID(task_id)).get()
+                except peewee.DoesNotExist:
+                    original_task_id = to_original_task_id(task_id)
+
+                    return None if original_task_id is None else to_task_status(original_task_id)
+
+                if (task_cache is not None) and (inst.task_status in TERMINAL_TASK_STATUSES_):
+                    task_cache.put('status', task_id, bytes(json.dumps(inst.task_status), 'utf-8'))
+
+                return inst.task_status
+
+            def to_wait_args(task_id: str, timeout: str = None) -> typing.Tuple[str, float]:
+                try:
+                    task_id = str(uuid.UUID(task_id))
+
+                    timeout = wait_timeout if timeout is None else min(max(float(timeout), 0.0), wait_max_timeout)
+                except ValueError:
+                    raise cherrypy.HTTPError('422', 'Unprocessable Entity')
+
+                return (task_id, timeout)
+
+            def generate_task_statuses(task_id: str, timeout: float, poll_interval: float = None) -> typing.Generator[typing.Optional[str], None, None]:
+                poll_interval = wait_poll_interval if poll_interval is None else poll_interval
+
+                deadline = time.monotonic() + timeout
+
+                task_notifier.register(task_id)
+
+                try:
+                    while True:
+                        # NOTE Read the version before the status, so that a notification in between is not missed.
+                        version = task_notifier.version(task_id)
+
+                        task_status = to_task_status(task_id)
+
+                        yield task_status
+
+                        if task_status in TERMINAL_TASK_STATUSES_:
+                            return
+
+                        remaining = deadline - time.monotonic()
+
+                        if remaining <= 0:
+                            return
+
+                        # NOTE Do not hold a database connection (e.g., from the pool) while waiting.
+                        _close_db(db)
+
+                        try:
+                            task_notifier.wait(task_id, version, timeout=min(remaining, poll_interval))
+                        finally:
+                            _connect_db(db)
+                finally:
+                    task_notifier.unregister(task_id)
+
+            def acquire_waiter() -> None:
+                # NOTE Each waiting request holds a CherryPy thread, i.e., reject the request rather than exhaust the thread pool.
+                if (waiter_semaphore is not None) and not waiter_semaphore.acquire(blocking=False):
+                    raise cherrypy.HTTPError('503', 'Service Unavailable')
+
+                return
+
+            def release_waiter() -> None:
+                if waiter_semaphore is not None:
+                    waiter_semaphore.release()
+
+                return
+
+            def to_existing_task_ids(keys: typing.List[typing.Tuple[str, str]]) -> typing.Dict[typing.Tuple[str, str], str]:
+                task_ids_by_key = {}
+
+                unique_keys = list(set(keys))
+
+                # NOTE Look up the events in batches, using the primary key of the event keys (events whose handler failed may be resubmitted, i.e., are not duplicates).
+                for offset in range(0, len(unique_keys), 500):
+                    for source, event_id, task_id in ReceiveTaskEventKeyModel.select(ReceiveTaskEventKeyModel.source, ReceiveTaskEventKeyModel.event_id, ReceiveTaskEventKeyModel.task_id).join(cls, on=(cls.task_id == ReceiveTaskEventKeyModel.task_id)).where(peewee.Tuple(ReceiveTaskEventKeyModel.source, ReceiveTaskEventKeyModel.event_id).in_(unique_keys[offset:offset + 500]) & (cls.task_status != '500 Internal Server Error')).tuples():
+                        task_ids_by_key[(source, event_id)] = str(task_id)
+
+                return task_ids_by_key
+
+            def to_key(event_data: typing.Dict[str, typing.Any]) -> typing.Optional[typing.Tuple[str, str]]:
+                source = event_data.get('source', None)
+                event_id = event_data.get('eventID', None)
+
+                if isinstance(source, str) and isinstance(event_id, str):
+                    return (source, event_id)
+
+                return None
+
+            def to_signature(event_data: typing.Dict[str, typing.Any], event_data_str: str = None) -> celery.Signature:
+                # NOTE Prefer the raw JSON encoding of the event (if any), which is not re-encoded.
+                arg = event_data if event_data_str is None else event_data_str
+
+                if router is None:
+                    return receive_task.s(arg)
+
+                # NOTE Deliberately raise `RouteNotFoundRouterError` if the event is unroutable.
+                route = router.match_first_or_raise(event_data)
+
+                options = {}
+
+                if route.queue is not None:
+                    options['queue'] = route.queue
+
+                if route.priority is not None:
+                    options['priority'] = route.priority
+
+                return receive_task.signature((arg, ), {'route_id': route.route_id}, **options)
+
             class Get(object):
                 exposed = True
 
                 def GET(self, task_id: str) -> bytes:
                     try:
-                        inst = cls.get(task_id=uuid.UUID(task_id))
-                    except peewee.DoesNotExist:
-                        raise cherrypy.HTTPError('404', 'Not Found')
+                        task_id = str(uuid.UUID(task_id))
                     except ValueError:
                         raise cherrypy.HTTPError('422', 'Unprocessable Entity')
 
-                    cherrypy.response.headers['Content-Type'] = 'application/json; charset=utf-8'
-                    cherrypy.response.status = '200 OK'
-                    return bytes(json.dumps({
-                        'eventType': inst.event_type,
-                        'eventTypeVersion': inst.event_type_version,
-                        'source': inst.source,
-                        'eventID': inst.event_id,
-                        'eventTime': inst.event_time,
-                        'schemaURL': inst.schema_url,
-                        'contentType': inst.content_type,
-                        'eventData': inst.event_data,
-                        'data': inst.data,
-                        'taskID': str(inst.task_id),
-                        'taskStatus': inst.task_status,
-                        'taskApplicationName': inst.task_application_name,
-                        'taskName': inst.task_name,
-                        'exceptionType': inst.exc_type,
-                        'exceptionValue': inst.exc_value,
-                        'exceptionTraceback': inst.exc_traceback,
-                        'created': str(inst.created) if inst.created is not None else None,
-                        'updated': str(inst.updated) if inst.updated is not None else None,
-                        'deleted': str(inst.deleted) if inst.deleted is not None else None,
-                    }), 'utf-8')
+                    body = None if task_cache is None else task_cache.get('get', task_id)
+
+                    if body is None:
+                        try:
+                            inst = cls.get(task_id=uuid.UUID(task_id))
+                        except peewee.DoesNotExist:
+                            original_task_id = to_original_task_id(task_id)
+
+                            if original_task_id is None:
+                                raise cherrypy.HTTPError('404', 'Not Found')
+
+                            inst = cls.get(task_id=uuid.UUID(original_task_id))
+
+                        try:
+                            event_data_bytes = ReceiveTaskPayloadModel.get(task_id=inst.task_id).to_event_data_bytes()
+                        except peewee.DoesNotExist:
+                            event_data_bytes = None
+
+                        if event_data_bytes is None:
+                            data_bytes = None
+                        else:
+                            # NOTE The "data" member is sliced from the stored event, i.e., the event is not decoded.
+                            try:
+                                span = _find_json_member(event_data_bytes, 'data')
+                            except ValueError:
+                                span = None
+
+                            data_bytes = None if span is None else event_data_bytes[span[0]:span[1]]
+
+                        # NOTE The stored event is embedded verbatim, i.e., it is not decoded and re-encoded.
+                        body = b''.join([
+                            b'{"eventData":',
+                            b'null' if event_data_bytes is None else event_data_bytes,
+                            b',"data":',
+                            b'null' if data_bytes is None else data_bytes,
+                            b',',
+                            _json_dumps({
+                                'eventType': inst.event_type,
+                                'eventTypeVersion': inst.event_type_version,
+                                'source': inst.source,
+                                'eventID': inst.event_id,
+                                'eventTime': inst.event_time,
+                                'schemaURL': inst.schema_url,
+                                'contentType': inst.content_type,
+                                'taskID': str(inst.task_id),
+                                'taskStatus': inst.task_status,
+                                'taskApplicationName': inst.task_application_name,
+                                'taskName': inst.task_name,
+                                'exceptionType': inst.exc_type,
+                                'exceptionValue': inst.exc_value,
+                                'exceptionTraceback': inst.exc_traceback,
+                                'created': str(inst.created) if inst.created is not None else None,
+                                'updated': str(inst.updated) if inst.updated is not None else None,
+                                'deleted': str(inst.deleted) if inst.deleted is not None else None,
+                            })[1:],
+                        ])
+
+                        if (task_cache is not None) and (inst.task_status in TERMINAL_TASK_STATUSES_):
+                            task_cache.put('get', task_id, body)
+
+                    return _to_json_response(body)
 
             class Receive(object):
                 exposed = True
 
                 def POST(self) -> bytes:
-                    event_data = json.loads(cherrypy.request.body.read(int(cherrypy.request.headers['Content-Length'])))
+                    scanner = _EnvelopeScanner(max_size=envelope_scan_size)
+
+                    body = _read_request_body(max_body_size, scanner=scanner)
+
+                    try:
+                        body_str = str(body, 'utf-8')
+
+                        # NOTE The body is only decoded if the event is routed by the web tier.
+                        event_data = None if router is None else _json_loads(body)
+                    except ValueError as reason:
+                        # NOTE Including `UnicodeDecodeError`, i.e., the scanner only validates the envelope.
+                        raise cherrypy.HTTPError('400', 'Bad Request: {0}'.format(reason))
+
+                    # NOTE The envelope is found by the scanner (or by decoding the body), if it is at the start of the event.
+                    key = to_key(scanner.fields if event_data is None else event_data)
+
+                    if (key is None) and (event_data is None):
+                        # NOTE Otherwise, the body is decoded, so that the event is still deduplicated (a malformed event is recorded by the worker).
+                        try:
+                            decoded_event_data = _json_loads(body)
+                        except ValueError:
+                            decoded_event_data = None
+
+                        if isinstance(decoded_event_data, dict):
+                            key = to_key(decoded_event_data)
+
+                    if key is not None:
+                        task_id = to_existing_task_ids([key]).get(key, None)
+
+                        if task_id is not None:
+                            # NOTE The event is a duplicate, i.e., it is not enqueued again.
+                            cherrypy.response.headers['Content-Type'] = 'application/json; charset=utf-8'
+                            cherrypy.response.status = '200 OK'
+                            return bytes(json.dumps(task_id), 'utf-8')
+
+                    try:
+                        signature = to_signature(event_data, event_data_str=body_str)
+                    except RouteNotFoundRouterError:
+                        raise cherrypy.HTTPError('422', 'Unprocessable Entity')
 
-                    async_result = receive_task.delay(event_data)
+                    # NOTE Retries that arrive before the worker has written the event are deduplicated by the worker.
+                    async_result = signature.apply_async()
 
                     cherrypy.response.headers['Content-Type'] = 'application/json; charset=utf-8'
                     cherrypy.response.status = '200 OK'
                     return bytes(json.dumps(str(async_result.id)), 'utf-8')
 
+            class Batch(object):
+                exposed = True
+
+                def POST(self) -> bytes:
+                    body = _read_request_body(batch_max_body_size)
+
+                    try:
+                        event_data_list = _load_event_data_list(body, content_type=cherrypy.request.headers.get('Content-Type', None))
+                    except ValueError as reason:
+                        raise cherrypy.HTTPError('400', 'Bad Request: {0}'.format(reason))
+
+                    # NOTE Validate all events before enqueueing any of them, so that a batch is either accepted or rejected as a whole.
+                    try:
+                        _verify_event_data_list(event_data_list)
+                    except ValueError as reason:
+                        raise cherrypy.HTTPError('422', 'Unprocessable Entity: {0}'.format(reason))
+
+                    # NOTE Unroutable events are not enqueued, and their task identifiers are `null`.
+                    task_ids = [None] * len(event_data_list)
+
+                    unroutable_indices = set()
+
+                    keys = [to_key(event_data) for event_data in event_data_list]
+
+                    existing_task_ids_by_key = to_existing_task_ids([key for key in keys if key is not None])
+
+                    # NOTE The first of the events with the same key within the batch.
+                    first_indices_by_key = {}
+
+                    duplicate_indices = []
+
+                    signatures = []
+
+                    for index, (key, event_data) in enumerate(zip(keys, event_data_list)):
+                        if key is not None:
+                            if key in existing_task_ids_by_key:
+                                task_ids[index] = existing_task_ids_by_key[key]
+
+                                continue
+
+                            if key in first_indices_by_key:
+                                duplicate_indices.append((index, first_indices_by_key[key]))
+
+                                continue
+
+                            first_indices_by_key[key] = index
+
+                        try:
+                            signature = to_signature(event_data)
+                        except RouteNotFoundRouterError:
+                            unroutable_indices.add(index)
+
+                            continue
+
+                        signatures.append((index, signature))
+
+                    # NOTE Publish each chunk as a `celery.group`, i.e., many messages over one broker connection.
+                    for offset in range(0, len(signatures), batch_chunk_size):
+                        chunk = signatures[offset:offset + batch_chunk_size]
+
+                        group_result = celery.group([signature for index, signature in chunk], app=receive_task.app).apply_async()
+
+                        for (index, signature), async_result in zip(chunk, group_result.results):
+                            task_ids[index] = str(async_result.id)
+
+                    for index, first_index in duplicate_indices:
+                        task_ids[index] = task_ids[first_index]
+
+                        if first_index in unroutable_indices:
+                            unroutable_indices.add(index)
+
+                    cherrypy.response.headers['Content-Type'] = 'application/json; charset=utf-8'
+
+                    if len(unroutable_indices) == 0:
+                        cherrypy.response.status = '200 OK'
+                    elif len(unroutable_indices) == len(task_ids):
+                        cherrypy.response.status = '422 Unprocessable Entity'
+                    else:
+                        # NOTE A partially accepted batch, i.e., the items have different statuses.
+                        cherrypy.response.status = '207 Multi-Status'
+
+                    # NOTE The status of each event is reported separately, whether or not the batch is partially accepted.
+                    return bytes(json.dumps([{
+                        'taskID': task_id,
+                        'status': '422 Unprocessable Entity' if index in unroutable_indices else '202 Accepted',
+                    } for index, task_id in enumerate(task_ids)]), 'utf-8')
+
             class Status(object):
                 exposed = True
 
                 def GET(self, task_id: str) -> bytes:
                     try:
-                        inst = cls.get(task_id=uuid.UUID(task_id))
-                    except peewee.DoesNotExist:
-                        raise cherrypy.HTTPError('404', 'Not Found')
+                        task_id = str(uuid.UUID(task_id))
                     except ValueError:
                         raise cherrypy.HTTPError('422', 'Unprocessable Entity')
 
-                    cherrypy.response.headers['Content-Type'] = 'application/json; charset=utf-8'
+                    task_status = to_task_status(task_id)
+
+                    if task_status is None:
+                        raise cherrypy.HTTPError('404', 'Not Found')
+
+                    return _to_json_response(bytes(json.dumps(task_status), 'utf-8'))
+
+            class Wait(object):
+                exposed = True
+
+                def GET(self, task_id: str, timeout: str = None) -> bytes:
+                    task_id, timeout = to_wait_args(task_id, timeout=timeout)
+
+                    task_status = None
+
+                    acquire_waiter()
+
+                    try:
+                        for task_status in generate_task_statuses(task_id, timeout):
+                            pass
+                    finally:
+                        release_waiter()
+
+                    if task_status is None:
+                        raise cherrypy.HTTPError('404', 'Not Found')
+
+                    body = _to_json_response(bytes(json.dumps(task_status), 'utf-8'))
+
+                    if task_status not in TERMINAL_TASK_STATUSES_:
+                        # NOTE The task is not finished (yet), i.e., the client should wait again.
+                        cherrypy.response.status = '202 Accepted'
+
+                    return body
+
+            class Events(object):
+                exposed = True
+
+                def GET(self, task_id: str, timeout: str = None) -> typing.Generator[bytes, None, None]:
+                    task_id, timeout = to_wait_args(task_id, timeout=timeout)
+
+                    acquire_waiter()
+
+                    cherrypy.response.headers['Content-Type'] = 'text/event-stream; charset=utf-8'
+                    cherrypy.response.headers['Cache-Control'] = 'no-cache'
                     cherrypy.response.status = '200 OK'
-                    return bytes(json.dumps(inst.task_status), 'utf-8')
+                    cherrypy.response.stream = True
+
+                    def generate_events() -> typing.Generator[bytes, None, None]:
+                        last_task_status = None
+
+                        last_sent = time.monotonic()
+
+                        try:
+                            # NOTE Wake up at least every `events_keepalive_interval` seconds, i.e., in time to send a keepalive.
+                            for task_status in generate_task_statuses(task_id, timeout, poll_interval=min(wait_poll_interval, events_keepalive_interval)):
+                                if (task_status is not None) and (task_status != last_task_status):
+                                    yield bytes('event: status\ndata: {0}\n\n'.format(json.dumps(task_status)), 'utf-8')
+
+                                    last_task_status = task_status
+
+                                    last_sent = time.monotonic()
+                                elif time.monotonic() - last_sent >= events_keepalive_interval:
+                                    # NOTE A comment, so that proxies do not close the idle connection.
+                                    yield b': keepalive\n\n'
+
+                                    last_sent = time.monotonic()
+                        finally:
+                            release_waiter()
+
+                    return generate_events()
 
             class Root(object):
                 exposed = True
 
+                batch = Batch()
+                events = Events()
                 get = Get()
                 receive = Receive()
                 status = Status()
+                wait = Wait()
 
-                def GET(self) -> bytes:
-                    cherrypy.response.headers['Content-Type'] = 'application/json; charset=utf-8'
-                    cherrypy.response.status = '200 OK'
-                    return bytes(json.dumps(list(map(lambda inst: {
-                        # 'eventType': inst.event_type,
-                        # 'eventTypeVersion': inst.event_type_version,
-                        # 'source': inst.source,
-                        # 'eventID': inst.event_id,
-                        # 'eventTime': inst.event_time,
-                        # 'schemaURL': inst.schema_url,
-                        # 'contentType': inst.content_type,
-                        # 'eventData': inst.event_data,
-                        # 'data': inst.data,
-                        'taskID': str(inst.task_id),
-                        # 'taskStatus': inst.task_status,
-                        # 'taskApplicationName': inst.task_application_name,
-                        # 'taskName': inst.task_name,
-                        # 'exceptionType': inst.exc_type,
-                        # 'exceptionValue': inst.exc_value,
-                        # 'exceptionTraceback': inst.exc_traceback,
-                        'created': str(inst.created) if inst.created is not None else None,
-                        'updated': str(inst.updated) if inst.updated is not None else None,
-                        'deleted': str(inst.deleted) if inst.deleted is not None else None,
-                    }, cls.select(*[
+                def GET(self, cursor: str = None, limit: str = None, task_status: typing.Union[str, typing.List[str]] = None, event_type: typing.Union[str, typing.List[str]] = None, created_after: str = None, created_before: str = None) -> typing.Generator[bytes, None, None]:
+                    try:
+                        limit = page_size if limit is None else min(int(limit), max_page_size)
+
+                        if limit < 1:
+                            raise ValueError('limit must be positive')
+
+                        cursor_created, cursor_uuid = (None, None) if cursor is None else _from_cursor(cursor)
+
+                        created_after = None if created_after is None else _parse_datetime(created_after)
+                        created_before = None if created_before is None else _parse_datetime(created_before)
+                    except (TypeError, ValueError):
+                        # NOTE Including repeated query parameters, i.e., lists.
+                        raise cherrypy.HTTPError('422', 'Unprocessable Entity')
+
+                    query = cls.select(*[
+                        cls.uuid,
                         # cls.event_type,
                         # cls.event_type_version,
                         # cls.source,
@@ -213,8 +1551,6 @@ def create_peewee_model(db: peewee.Database) -> object:
                         # cls.event_time,
                         # cls.schema_url,
                         # cls.content_type,
-                        # cls.event_data,
-                        # cls.data,
                         cls.task_id,
                         # cls.task_application_name,
                         # cls.task_name,
@@ -225,9 +1561,75 @@ def create_peewee_model(db: peewee.Database) -> object:
                         cls.created,
                         cls.updated,
                         cls.deleted,
-                    ]).order_by(*[
+                    ])
+
+                    # NOTE Query parameters are lists if they are repeated.
+                    if task_status is not None:
+                        query = query.where(cls.task_status.in_([task_status] if isinstance(task_status, str) else task_status))
+
+                    if event_type is not None:
+                        query = query.where(cls.event_type.in_([event_type] if isinstance(event_type, str) else event_type))
+
+                    if created_after is not None:
+                        query = query.where(cls.created >= created_after)
+
+                    if created_before is not None:
+                        query = query.where(cls.created < created_before)
+
+                    # NOTE Keyset pagination, i.e., the page is found by the index on "(created, uuid)" (not by skipping rows).
+                    if cursor_created is not None:
+                        query = query.where((cls.created < cursor_created) | ((cls.created == cursor_created) & (cls.uuid < cursor_uuid)))
+
+                    # NOTE Select one more row than the page size, to determine whether there is a next page.
+                    insts = list(query.order_by(*[
                         cls.created.desc(),
-                    ])))), 'utf-8')
+                        cls.uuid.desc(),
+                    ]).limit(limit + 1))
+
+                    if len(insts) > limit:
+                        insts = insts[:limit]
+
+                        params = dict((name, value) for name, value in [('limit', str(limit)), ('task_status', task_status), ('event_type', event_type), ('created_after', None if created_after is None else created_after.isoformat()), ('created_before', None if created_before is None else created_before.isoformat())] if value is not None)
+                        params['cursor'] = _to_cursor(insts[-1].created, insts[-1].uuid)
+
+                        cherrypy.response.headers['Link'] = '<{0}?{1}>; rel="next"'.format(cherrypy.url('/'), urllib.parse.urlencode(params, doseq=True))
+
+                    cherrypy.response.headers['Content-Type'] = 'application/json; charset=utf-8'
+                    cherrypy.response.status = '200 OK'
+                    cherrypy.response.stream = True
+
+                    def generate_json() -> typing.Generator[bytes, None, None]:
+                        yield b'['
+
+                        for index, inst in enumerate(insts):
+                            if index > 0:
+                                yield b','
+
+                            yield bytes(json.dumps({
+                                # 'eventType': inst.event_type,
+                                # 'eventTypeVersion': inst.event_type_version,
+                                # 'source': inst.source,
+                                # 'eventID': inst.event_id,
+                                # 'eventTime': inst.event_time,
+                                # 'schemaURL': inst.schema_url,
+                                # 'contentType': inst.content_type,
+                                # 'eventData': inst.event_data,
+                                # 'data': inst.data,
+                                'taskID': str(inst.task_id),
+                                # 'taskStatus': inst.task_status,
+                                # 'taskApplicationName': inst.task_application_name,
+                                # 'taskName': inst.task_name,
+                                # 'exceptionType': inst.exc_type,
+                                # 'exceptionValue': inst.exc_value,
+                                # 'exceptionTraceback': inst.exc_traceback,
+                                'created': str(inst.created) if inst.created is not None else None,
+                                'updated': str(inst.updated) if inst.updated is not None else None,
+                                'deleted': str(inst.deleted) if inst.deleted is not None else None,
+                            }), 'utf-8')
+
+                        yield b']'
+
+                    return generate_json()
 
             def error_page_default(**kwargs: typing.Dict[str, typing.Any]) -> bytes:
                 cherrypy.response.headers['Content-Type'] = 'application/json; charset=utf-8'
@@ -236,6 +1638,9 @@ def create_peewee_model(db: peewee.Database) -> object:
             application = cherrypy.Application(Root(), '/', config={
                 '/': {
                     'error_page.default': error_page_default,
+                    # NOTE Each request uses its own connection (from the pool, if the database is pooled), which is released after the response is sent.
+                    'hooks.on_start_resource': lambda: _connect_db(db),
+                    'hooks.on_end_request': lambda: _close_db(db),
                     'request.dispatch': cherrypy.dispatch.MethodDispatcher(),
                 },
             })
@@ -244,4 +1649,4 @@ def create_peewee_model(db: peewee.Database) -> object:
 
     return ReceiveTaskModel
 
-__all__ = ('create_peewee_model')
+__all__ = ('BrokerTaskNotifier', 'TaskCache', 'TaskNotifier', 'TaskStatusBuffer', 'create_peewee_model')
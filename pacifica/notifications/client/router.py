@@ -14,15 +14,55 @@ from cloudevents.model import Event
 from jsonpath2.path import Path
 
 from .event_handlers import EventHandler
+from .paths import to_path
+
+def _to_route_keys(event_data: typing.Dict[str, typing.Any]) -> typing.List[typing.Tuple[typing.Optional[str], typing.Optional[str]]]:
+    event_type = None
+    source = None
+
+    if isinstance(event_data, dict):
+        event_type = event_data.get('eventType', None)
+        source = event_data.get('source', None)
+
+    route_keys = []
+
+    for route_key in [(event_type, source), (event_type, None), (None, source), (None, None)]:
+        if route_key not in route_keys:
+            route_keys.append(route_key)
+
+    return route_keys
+
+def _to_transaction_key_value_keys(event_data: typing.Dict[str, typing.Any]) -> typing.FrozenSet[str]:
+    keys = set()
+
+    if isinstance(event_data, dict) and isinstance(event_data.get('data', None), list):
+        for record in event_data['data']:
+            if isinstance(record, dict) and ('TransactionKeyValue' == record.get('destinationTable', None)) and ('key' in record):
+                keys.add(record['key'])
+
+    return frozenset(keys)
 
 class Route(object):
-    def __init__(self, path: Path, event_handler: EventHandler) -> None:
+    def __init__(self, path: typing.Union[Path, str], event_handler: EventHandler, event_type: str = None, source: str = None, transaction_key_value_keys: typing.Iterable[str] = [], route_id: str = None, queue: str = None, priority: int = None) -> None:
         super(Route, self).__init__()
 
-        self.path = path
+        # NOTE Assigned by `Router.add_route`, if not specified.
+        self.route_id = route_id
+
+        self.path = to_path(path)
 
         self.event_handler = event_handler
 
+        # NOTE Cheap discriminating keys that are checked by `Router` before the (expensive) JSONPath is evaluated.
+        self.event_type = event_type
+        self.source = source
+        self.transaction_key_value_keys = frozenset(transaction_key_value_keys)
+
+        # NOTE The Celery queue and priority of the messages for this route (if the event is routed by the web tier).
+        # NOTE The number of concurrent calls is limited by the workers that consume `queue`, e.g., "celery worker -Q <queue> --concurrency <N>".
+        self.queue = queue
+        self.priority = priority
+
     def __call__(self, event_data: typing.Dict[str, typing.Any]) -> None:
         event = Event(event_data)
 
@@ -36,12 +76,20 @@ class Route(object):
 
         return False
 
+    @property
+    def route_key(self) -> typing.Tuple[typing.Optional[str], typing.Optional[str]]:
+        return (self.event_type, self.source)
+
 class Router(object):
     def __init__(self) -> None:
         super(Router, self).__init__()
 
         self._routes = [] # type: typing.List[Route]
 
+        self._route_indices_by_route_key = {} # type: typing.Dict[typing.Tuple[typing.Optional[str], typing.Optional[str]], typing.List[int]]
+
+        self._routes_by_route_id = {} # type: typing.Dict[str, Route]
+
     def __call__(self, event_data: typing.Dict[str, typing.Any]) -> None:
         route = self.match_first_or_raise(event_data)
 
@@ -52,12 +100,64 @@ class Router(object):
     def add_route(self, *args, **kwargs) -> None:
         route = Route(*args, **kwargs)
 
+        if route.route_id is None:
+            # NOTE The default route identifier is the position of the route, i.e., it is stable if routes are added in the same order.
+            route.route_id = str(len(self._routes))
+
+        if route.route_id in self._routes_by_route_id:
+            raise DuplicateRouteIdRouterError(self, route.route_id)
+
+        self._routes_by_route_id[route.route_id] = route
+
+        self._route_indices_by_route_key.setdefault(route.route_key, []).append(len(self._routes))
+
         self._routes.append(route)
 
         return
 
-    def match(self, event_data: typing.Dict[str, typing.Any]) -> typing.Generator[Route, None, None]:
+    def queues(self) -> typing.Dict[str, typing.Optional[int]]:
+        max_priority_by_queue = {} # type: typing.Dict[str, typing.Optional[int]]
+
         for route in self._routes:
+            if route.queue is None:
+                continue
+
+            max_priority = max_priority_by_queue.get(route.queue, None)
+
+            if route.priority is not None:
+                max_priority = route.priority if max_priority is None else max(max_priority, route.priority)
+
+            max_priority_by_queue[route.queue] = max_priority
+
+        return max_priority_by_queue
+
+    def get_route(self, route_id: str) -> typing.Optional[Route]:
+        return self._routes_by_route_id.get(route_id, None)
+
+    def candidates(self, event_data: typing.Dict[str, typing.Any]) -> typing.Generator[Route, None, None]:
+        route_indices = []
+
+        for route_key in _to_route_keys(event_data):
+            route_indices.extend(self._route_indices_by_route_key.get(route_key, []))
+
+        # NOTE Computed lazily, i.e., only if a candidate route requires transaction key-values.
+        transaction_key_value_keys = None
+
+        # NOTE Preserve the order in which routes were added.
+        for route_index in sorted(route_indices):
+            route = self._routes[route_index]
+
+            if len(route.transaction_key_value_keys) > 0:
+                if transaction_key_value_keys is None:
+                    transaction_key_value_keys = _to_transaction_key_value_keys(event_data)
+
+                if not route.transaction_key_value_keys.issubset(transaction_key_value_keys):
+                    continue
+
+            yield route
+
+    def match(self, event_data: typing.Dict[str, typing.Any]) -> typing.Generator[Route, None, None]:
+        for route in self.candidates(event_data):
             if route.match(event_data):
                 yield route
 
@@ -73,6 +173,15 @@ class RouterError(BaseException):
 
         self.router = router
 
+class DuplicateRouteIdRouterError(RouterError):
+    def __init__(self, router: Router, route_id: str) -> None:
+        super(DuplicateRouteIdRouterError, self).__init__(router)
+
+        self.route_id = route_id
+
+    def __str__(self) -> str: # pragma: no cover
+        return 'route \'{0}\' is already defined'.format(self.route_id.replace('\'', '\\\''))
+
 class RouteNotFoundRouterError(RouterError):
     def __init__(self, router: Router, event_data: typing.Dict[str, typing.Any]) -> None:
         super(RouteNotFoundRouterError, self).__init__(router)
@@ -82,4 +191,4 @@ class RouteNotFoundRouterError(RouterError):
     def __str__(self) -> str: # pragma: no cover
         return 'route not found'
 
-__all__ = ('Route', 'Router', 'RouterError', 'RouteNotFoundRouterError')
+__all__ = ('DuplicateRouteIdRouterError', 'Route', 'Router', 'RouterError', 'RouteNotFoundRouterError')
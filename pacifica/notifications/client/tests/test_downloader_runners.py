@@ -8,11 +8,16 @@
 #
 # See LICENSE and WARRANTY for details.
 
+import hashlib
 import os
+import sys
 import tempfile
+import threading
 import unittest
+import unittest.mock
 
-from ..downloader_runners import LocalDownloaderRunner
+from ..downloader_runners import LocalDownloaderRunner, RemoteDownloaderRunner
+from ..file_caches import FileCache
 from ..models import File
 
 class LocalDownloaderRunnerTestCase(unittest.TestCase):
@@ -36,6 +41,77 @@ class LocalDownloaderRunnerTestCase(unittest.TestCase):
                 self.assertEqual(1, len(openers))
                 with openers[0]() as f:
                     self.assertEqual(f_data, f.read())
+                with openers[0](mode='rb') as f:
+                    self.assertEqual(bytes(f_data, 'utf-8'), f.read())
+
+        return
+
+    def test_local_downloader_runner_async(self):
+        with tempfile.TemporaryDirectory() as basedir_name:
+            os.makedirs(os.path.join(basedir_name, 'filepath'))
+
+            f_data = 'Hello, world!'
+
+            for file_name in ['filename_one.ext', 'filename_two.ext']:
+                with open(os.path.join(basedir_name, 'filepath', file_name), mode='w') as f:
+                    f.write(f_data)
+
+            downloader_runner = LocalDownloaderRunner(basedir_name)
+
+            with tempfile.TemporaryDirectory() as downloader_tempdir_name:
+                futures = [
+                    downloader_runner.download_async(downloader_tempdir_name, files=[File(name='filename_one.ext', subdir='filepath')]),
+                    downloader_runner.download_async(downloader_tempdir_name, files=[File(name='filename_two.ext', subdir='filepath')]),
+                ]
+
+                for future in futures:
+                    openers = future.result()
+
+                    self.assertEqual(1, len(openers))
+                    with openers[0]() as f:
+                        self.assertEqual(f_data, f.read())
+
+        return
+
+    def test_local_downloader_runner_logged(self):
+        barrier = threading.Barrier(2, timeout=10)
+
+        class _PrintingDownloaderRunner(LocalDownloaderRunner):
+            def download(self, basedir_name, files=[]):
+                print(files[0].name)
+
+                # NOTE Both downloads are running, i.e., their output is captured concurrently.
+                barrier.wait()
+
+                print(files[0].name, file=sys.stderr)
+
+                return super(_PrintingDownloaderRunner, self).download(basedir_name, files=files)
+
+        with tempfile.TemporaryDirectory() as basedir_name:
+            os.makedirs(os.path.join(basedir_name, 'filepath'))
+
+            for file_name in ['filename_one.ext', 'filename_two.ext']:
+                with open(os.path.join(basedir_name, 'filepath', file_name), mode='w') as f:
+                    f.write('Hello, world!')
+
+            downloader_runner = _PrintingDownloaderRunner(basedir_name)
+
+            orig_stdout = sys.stdout
+
+            with tempfile.TemporaryDirectory() as downloader_tempdir_name:
+                log_file_names = [os.path.join(downloader_tempdir_name, '{0}.log'.format(name)) for name in ['one-stdout', 'one-stderr', 'two-stdout', 'two-stderr']]
+
+                future = downloader_runner.download_async(downloader_tempdir_name, files=[File(name='filename_two.ext', subdir='filepath')], stdout_file_name=log_file_names[2], stderr_file_name=log_file_names[3])
+
+                downloader_runner.download_logged(downloader_tempdir_name, files=[File(name='filename_one.ext', subdir='filepath')], stdout_file_name=log_file_names[0], stderr_file_name=log_file_names[1])
+
+                future.result()
+
+                for log_file_name, f_data in zip(log_file_names, ['filename_one.ext\n', 'filename_one.ext\n', 'filename_two.ext\n', 'filename_two.ext\n']):
+                    with open(log_file_name, mode='r') as f:
+                        self.assertEqual(f_data, f.read())
+
+            self.assertIs(orig_stdout, sys.stdout)
 
         return
 
@@ -44,5 +120,82 @@ class RemoteDownloaderRunnerTestCase(unittest.TestCase):
         # TODO Auto-generated method stub.
         pass
 
+    def test_remote_downloader_runner_makedirs(self):
+        files = [File(_id=1, name='filename_one.ext', subdir='filepath/one'), File(_id=2, name='filename_two.ext')]
+
+        isdirs = []
+
+        def download_from_url(basedir_name, cart_url, subdir_name):
+            # NOTE `tarfile` creates the missing parent directories without `exist_ok`, i.e., they must already exist.
+            for file in cart_url:
+                isdirs.append(os.path.isdir(os.path.dirname(os.path.join(basedir_name, subdir_name, file['path']))))
+
+            return
+
+        downloader = unittest.mock.Mock()
+        downloader.cart_api.setup_cart.side_effect = list
+        downloader.cart_api.wait_for_cart.side_effect = lambda cart: cart
+        downloader._download_from_url.side_effect = download_from_url
+
+        downloader_runner = RemoteDownloaderRunner(downloader)
+
+        with tempfile.TemporaryDirectory() as downloader_tempdir_name:
+            downloader_runner.download(downloader_tempdir_name, files=files)
+
+        self.assertEqual([True, True], isdirs)
+
+        return
+
+    def test_remote_downloader_runner_file_cache(self):
+        f_data_by_name = {
+            'filename_one.ext': 'Hello, world!',
+            'filename_two.ext': 'Goodbye, world!',
+        }
+
+        files = [File(_id=index, name=name, subdir='filepath', hashtype='sha1', hashsum=hashlib.sha1(bytes(f_data, 'utf-8')).hexdigest()) for index, (name, f_data) in enumerate(sorted(f_data_by_name.items()))]
+
+        def download_from_url(basedir_name, cart_url, subdir_name):
+            # NOTE The "cart URL" is the list of files in the cart.
+            for file in cart_url:
+                os.makedirs(os.path.join(basedir_name, subdir_name, os.path.dirname(file['path'])), exist_ok=True)
+
+                with open(os.path.join(basedir_name, subdir_name, file['path']), mode='w') as f:
+                    f.write(f_data_by_name[os.path.basename(file['path'])])
+
+            return
+
+        downloader = unittest.mock.Mock()
+        downloader.cart_api.setup_cart.side_effect = list
+        downloader.cart_api.wait_for_cart.side_effect = lambda cart: cart
+        downloader._download_from_url.side_effect = download_from_url
+
+        with tempfile.TemporaryDirectory() as cache_tempdir_name:
+            downloader_runner = RemoteDownloaderRunner(downloader, file_cache=FileCache(cache_tempdir_name))
+
+            with tempfile.TemporaryDirectory() as downloader_tempdir_name:
+                downloader_runner.download(downloader_tempdir_name, files=files[:1])
+
+            self.assertEqual(1, downloader.cart_api.setup_cart.call_count)
+
+            # NOTE Only the missed file is requested.
+            with tempfile.TemporaryDirectory() as downloader_tempdir_name:
+                downloader_runner.download(downloader_tempdir_name, files=files)
+
+            self.assertEqual(2, downloader.cart_api.setup_cart.call_count)
+            self.assertEqual([files[1].path], [file['path'] for file in downloader._download_from_url.call_args[0][1]])
+
+            # NOTE The cart is skipped if every file is cached.
+            with tempfile.TemporaryDirectory() as downloader_tempdir_name:
+                openers = downloader_runner.download(downloader_tempdir_name, files=files)
+
+                for file, opener in zip(files, openers):
+                    with opener() as f:
+                        self.assertEqual(f_data_by_name[file.name], f.read())
+
+            self.assertEqual(2, downloader.cart_api.setup_cart.call_count)
+            self.assertEqual(2, downloader._download_from_url.call_count)
+
+        return
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-notifications-client: pacifica/notifications/client/tests/test_file_caches.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+
+import hashlib
+import os
+import tempfile
+import unittest
+
+from ..file_caches import FileCache
+from ..models import File
+
+class FileCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self._f_data = 'Hello, world!'
+
+        self._file = File(name='filename.ext', subdir='filepath', hashtype='sha1', hashsum=hashlib.sha1(bytes(self._f_data, 'utf-8')).hexdigest())
+
+        return
+
+    def test_file_cache_put_get_materialize(self):
+        with tempfile.TemporaryDirectory() as cache_tempdir_name:
+            file_cache = FileCache(cache_tempdir_name)
+
+            self.assertEqual(None, file_cache.get(self._file))
+
+            with tempfile.TemporaryDirectory() as basedir_name:
+                self.assertFalse(file_cache.materialize(self._file, basedir_name))
+
+                os.makedirs(os.path.join(basedir_name, 'filepath'))
+
+                with open(os.path.join(basedir_name, self._file.path), mode='w') as f:
+                    f.write(self._f_data)
+
+                path = file_cache.put(self._file, os.path.join(basedir_name, self._file.path))
+
+                self.assertEqual(path, file_cache.get(self._file))
+
+            with tempfile.TemporaryDirectory() as basedir_name:
+                self.assertTrue(file_cache.materialize(self._file, basedir_name))
+
+                with open(os.path.join(basedir_name, self._file.path), mode='r') as f:
+                    self.assertEqual(self._f_data, f.read())
+
+        return
+
+    def test_file_cache_put_hashsum_mismatch(self):
+        with tempfile.TemporaryDirectory() as cache_tempdir_name:
+            file_cache = FileCache(cache_tempdir_name)
+
+            with tempfile.TemporaryDirectory() as basedir_name:
+                with open(os.path.join(basedir_name, 'filename.ext'), mode='w') as f:
+                    f.write(self._f_data.upper())
+
+                self.assertEqual(None, file_cache.put(self._file, os.path.join(basedir_name, 'filename.ext')))
+
+            self.assertEqual(None, file_cache.get(self._file))
+
+        return
+
+    def test_file_cache_key_invalid(self):
+        with tempfile.TemporaryDirectory() as cache_tempdir_name:
+            file_cache = FileCache(cache_tempdir_name)
+
+            self.assertEqual(None, file_cache.key(File(name='filename.ext')))
+            self.assertEqual(None, file_cache.key(File(name='filename.ext', hashtype='INVALID', hashsum='0')))
+            self.assertEqual(None, file_cache.key(File(name='filename.ext', hashtype='sha1', hashsum='../..')))
+
+        return
+
+    def test_file_cache_evict(self):
+        with tempfile.TemporaryDirectory() as cache_tempdir_name:
+            file_cache = FileCache(cache_tempdir_name, max_size=len(self._f_data))
+
+            other_f_data = self._f_data.upper()
+            other_file = File(name='other.ext', hashtype='sha1', hashsum=hashlib.sha1(bytes(other_f_data, 'utf-8')).hexdigest())
+
+            with tempfile.TemporaryDirectory() as basedir_name:
+                for file, f_data in [(self._file, self._f_data), (other_file, other_f_data)]:
+                    with open(os.path.join(basedir_name, file.name), mode='w') as f:
+                        f.write(f_data)
+
+                file_cache.put(self._file, os.path.join(basedir_name, self._file.name))
+
+                os.utime(file_cache.get(self._file), (0, 0))
+
+                file_cache.put(other_file, os.path.join(basedir_name, other_file.name))
+
+            self.assertEqual(None, file_cache.get(self._file))
+            self.assertNotEqual(None, file_cache.get(other_file))
+
+        return
+
+    def test_file_cache_size(self):
+        with tempfile.TemporaryDirectory() as cache_tempdir_name:
+            file_cache = FileCache(cache_tempdir_name, max_size=len(self._f_data))
+
+            with tempfile.TemporaryDirectory() as basedir_name:
+                with open(os.path.join(basedir_name, self._file.name), mode='w') as f:
+                    f.write(self._f_data)
+
+                # NOTE A file that is cached twice is counted once.
+                for _ in range(2):
+                    self.assertNotEqual(None, file_cache.put(self._file, os.path.join(basedir_name, self._file.name)))
+
+                self.assertEqual(len(self._f_data), file_cache.size())
+
+                # NOTE The size is shared with other instances (e.g., in other processes).
+                self.assertEqual(len(self._f_data), FileCache(cache_tempdir_name).size())
+
+                large_f_data = self._f_data * 2
+                large_file = File(name='large.ext', hashtype='sha1', hashsum=hashlib.sha1(bytes(large_f_data, 'utf-8')).hexdigest())
+
+                with open(os.path.join(basedir_name, large_file.name), mode='w') as f:
+                    f.write(large_f_data)
+
+                self.assertEqual(None, file_cache.put(large_file, os.path.join(basedir_name, large_file.name)))
+
+            self.assertEqual(None, file_cache.get(large_file))
+            self.assertNotEqual(None, file_cache.get(self._file))
+            self.assertEqual(len(self._f_data), file_cache.size())
+
+        return
+
+if __name__ == '__main__':
+    unittest.main()
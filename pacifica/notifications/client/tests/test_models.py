@@ -16,7 +16,7 @@ from cloudevents.model import Event
 
 from ..exceptions import InvalidEventTypeValueError, InvalidSourceValueError, TransactionDuplicateAttributeError
 from ..globals import CLOUDEVENTS_DEFAULT_EVENT_TYPE_, CLOUDEVENTS_DEFAULT_SOURCE_
-from ..models import File, Transaction, TransactionKeyValue
+from ..models import EventIndex, File, FileTable, Transaction, TransactionKeyValue
 
 class PacificaModelTestCase(unittest.TestCase):
     def setUp(self):
@@ -79,6 +79,45 @@ class PacificaModelTestCase(unittest.TestCase):
 
         return
 
+    def test_event_index_ok(self):
+        event_index = EventIndex.from_cloudevents_model(self._event_ok)
+
+        self.assertEqual([self._file_data], event_index.records('Files'))
+        self.assertEqual([self._transaction_id_data], event_index.records('Transactions._id'))
+        self.assertEqual([self._transaction_key_value_data], event_index.records('TransactionKeyValue'))
+        self.assertEqual([], event_index.records('INVALID'))
+
+        return
+
+    def test_event_index_error_invalid_event_type(self):
+        with self.assertRaises(InvalidEventTypeValueError):
+            event_index = EventIndex.from_cloudevents_model(self._event_error_invalid_event_type)
+
+        return
+
+    def test_event_index_error_invalid_source(self):
+        with self.assertRaises(InvalidSourceValueError):
+            event_index = EventIndex.from_cloudevents_model(self._event_error_invalid_source)
+
+        return
+
+    def test_models_from_event_index_ok(self):
+        event_index = EventIndex.from_cloudevents_model(self._event_ok)
+
+        inst_list = File.from_event_index(event_index)
+
+        self.assertEqual(1, len(inst_list))
+
+        inst = Transaction.from_event_index(event_index)
+
+        self.assertEqual(self._transaction_id_data.get('value', None), inst._id)
+
+        inst_list = TransactionKeyValue.from_event_index(event_index)
+
+        self.assertEqual(1, len(inst_list))
+
+        return
+
     def test_file_from_cloudevents_model_ok(self):
         inst_list = File.from_cloudevents_model(self._event_ok)
 
@@ -101,6 +140,49 @@ class PacificaModelTestCase(unittest.TestCase):
 
         return
 
+    def test_file_slots(self):
+        inst = File(**self._file_data)
+
+        with self.assertRaises(AttributeError):
+            inst.destinationTable = self._file_data.get('destinationTable', None)
+
+        return
+
+    def test_file_table_from_event_index(self):
+        file_table = FileTable.from_event_index(EventIndex.from_cloudevents_model(self._event_ok))
+
+        self.assertEqual(1, len(file_table))
+
+        for name in ['_id', 'name', 'subdir']:
+            self.assertEqual([self._file_data.get(name, None)], file_table.column(name))
+            self.assertEqual(self._file_data.get(name, None), getattr(file_table[0], name, None))
+
+        return
+
+    def test_file_table_filter(self):
+        file_table = FileTable.from_files([
+            File(name='one.csv', subdir='inputs/', mimetype='text/csv'),
+            File(name='two.csv', subdir='inputs/', mimetype='text/csv'),
+            File(name='three.csv', subdir='outputs/', mimetype='text/csv'),
+            File(name='model.py', subdir='models/', mimetype='text/x-python'),
+        ])
+
+        self.assertEqual(4, len(file_table))
+
+        self.assertEqual(['one.csv', 'two.csv', 'three.csv'], file_table.filter(mimetype='text/csv').column('name'))
+        self.assertEqual(['one.csv', 'two.csv'], file_table.filter(mimetype='text/csv', subdir='inputs/').column('name'))
+        self.assertEqual(['two.csv', 'three.csv'], file_table.filter(name=['two.csv', 'three.csv']).column('name'))
+        self.assertEqual(['models/model.py'], [inst.path for inst in file_table.filter(subdir='models/')])
+        self.assertEqual(0, len(file_table.filter(name='INVALID')))
+
+        return
+
+    def test_file_table_error_column_length(self):
+        with self.assertRaises(ValueError):
+            file_table = FileTable({'name': ['one.csv', 'two.csv'], 'subdir': ['inputs/']})
+
+        return
+
     def test_file_path_error(self):
         inst = File()
 
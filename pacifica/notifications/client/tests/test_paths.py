@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-notifications-client: pacifica/notifications/client/tests/test_paths.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+
+import os
+import tempfile
+import unittest
+
+from jsonpath2.path import Path
+
+from ..paths import cache_clear, cache_info, parse_file, parse_str, to_path
+
+class PathsTestCase(unittest.TestCase):
+    def setUp(self):
+        cache_clear()
+
+        return
+
+    def test_parse_str_cached(self):
+        path = parse_str('$["data"]')
+
+        self.assertIs(path, parse_str('$["data"]'))
+
+        info = cache_info()
+
+        self.assertEqual(1, info['hits'])
+        self.assertEqual(1, info['misses'])
+        self.assertEqual(1, info['currsize'])
+
+        cache_clear()
+
+        self.assertEqual(0, cache_info()['currsize'])
+
+        return
+
+    def test_parse_file_cached(self):
+        with tempfile.TemporaryDirectory() as tempdir_name:
+            file_name = os.path.join(tempdir_name, 'path.txt')
+
+            with open(file_name, mode='w') as f:
+                f.write('$["data"]')
+
+            self.assertIs(parse_file(file_name), parse_str('$["data"]'))
+
+        return
+
+    def test_to_path(self):
+        path = Path.parse_str('$')
+
+        self.assertIs(path, to_path(path))
+
+        self.assertEqual(1, len(list(to_path('$').match(None))))
+
+        return
+
+if __name__ == '__main__':
+    unittest.main()
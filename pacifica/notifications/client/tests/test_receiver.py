@@ -0,0 +1,952 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-notifications-client: pacifica/notifications/client/tests/test_receiver.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+
+import base64
+import datetime
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+import urllib.parse
+import uuid
+import wsgiref.util
+import zlib
+
+import peewee
+import playhouse.pool
+
+from ..event_handlers import NoopEventHandler
+from ..globals import CLOUDEVENTS_DEFAULT_EVENT_TYPE_, CLOUDEVENTS_DEFAULT_SOURCE_
+from ..receiver import BrokerTaskNotifier, TaskCache, TaskNotifier, TaskStatusBuffer, create_peewee_model
+from ..router import Router
+
+def _to_event_data(event_id: str) -> dict:
+    return {
+        'eventType': CLOUDEVENTS_DEFAULT_EVENT_TYPE_,
+        'cloudEventsVersion': '0.1',
+        'source': CLOUDEVENTS_DEFAULT_SOURCE_,
+        'eventID': event_id,
+        'data': [],
+    }
+
+class ReceiverTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+
+        # NOTE Not ":memory:", since each thread has its own connection.
+        self.db = peewee.SqliteDatabase(os.path.join(self.tempdir.name, 'db.sqlite3'))
+
+        self.ReceiveTaskModel = create_peewee_model(self.db)
+        self.ReceiveTaskModel.create_tables(safe=True)
+
+        self.router = Router()
+        self.router.add_route('$', NoopEventHandler(), event_type=CLOUDEVENTS_DEFAULT_EVENT_TYPE_, source=CLOUDEVENTS_DEFAULT_SOURCE_)
+
+        # NOTE Celery tasks are shared between applications by name, so each test has its own name.
+        receive_task_name = 'pacifica.notifications.client.tests.tasks.receive_{0}'.format(uuid.uuid4().hex)
+
+        self.celery_app = self.ReceiveTaskModel.create_celery_app(self.router, 'pacifica.notifications.client.tests.app', receive_task_name, broker='memory://')
+        self.celery_app.conf.task_always_eager = True
+
+        self.receive_task = self.celery_app.tasks[receive_task_name]
+
+        self.application = self.ReceiveTaskModel.create_cherrypy_app(self.receive_task, batch_chunk_size=2)
+
+        return
+
+    def tearDown(self):
+        self.db.close()
+
+        self.tempdir.cleanup()
+
+        return
+
+    def _request(self, method: str, path: str, body: bytes = b'', headers: dict = {}, query_string: str = '') -> tuple:
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query_string,
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body),
+        }
+
+        for name, value in headers.items():
+            environ['HTTP_{0}'.format(name.upper().replace('-', '_'))] = value
+
+        if 'HTTP_CONTENT_TYPE' in environ:
+            environ['CONTENT_TYPE'] = environ.pop('HTTP_CONTENT_TYPE')
+
+        wsgiref.util.setup_testing_defaults(environ)
+
+        response = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            response['status'] = status
+            response['headers'] = dict(response_headers)
+
+            return lambda data: None
+
+        response_body = b''.join(self.application(environ, start_response))
+
+        return (int(response['status'].split(' ', 1)[0]), response['headers'], response_body)
+
+    def test_receive(self):
+        status, headers, body = self._request('POST', '/receive', body=bytes(json.dumps(_to_event_data('1')), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+        self.assertEqual(200, status)
+
+        task_id = json.loads(body)
+
+        status, headers, body = self._request('GET', '/status/{0}'.format(task_id))
+
+        self.assertEqual(200, status)
+        self.assertEqual('200 OK', json.loads(body))
+
+        return
+
+    def test_get(self):
+        event_data = _to_event_data('1')
+
+        status, headers, body = self._request('POST', '/receive', body=bytes(json.dumps(event_data), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+        task_id = json.loads(body)
+
+        status, headers, body = self._request('GET', '/get/{0}'.format(task_id))
+
+        self.assertEqual(200, status)
+
+        inst_data = json.loads(body)
+
+        # NOTE The stored event is embedded verbatim.
+        self.assertEqual(event_data, inst_data['eventData'])
+        self.assertEqual(event_data['data'], inst_data['data'])
+        self.assertEqual('200 OK', inst_data['taskStatus'])
+
+        payload_inst = self.ReceiveTaskModel.payload_model.get(task_id=uuid.UUID(task_id))
+
+        self.assertEqual('zlib', payload_inst.encoding)
+        self.assertEqual(event_data, json.loads(zlib.decompress(payload_inst.event_data)))
+
+        return
+
+    def test_receive_raw(self):
+        body = b'{"eventType": "%s", "cloudEventsVersion": "0.1", "source": "%s", "eventID": "1", "data": [ ]}' % (bytes(CLOUDEVENTS_DEFAULT_EVENT_TYPE_, 'utf-8'), bytes(CLOUDEVENTS_DEFAULT_SOURCE_, 'utf-8'))
+
+        status, headers, response_body = self._request('POST', '/receive', body=body, headers={'Content-Type': 'application/json'})
+
+        task_id = json.loads(response_body)
+
+        self.assertEqual('200 OK', self.ReceiveTaskModel.get(task_id=uuid.UUID(task_id)).task_status)
+
+        # NOTE The request body is stored byte-for-byte.
+        self.assertEqual(body, self.ReceiveTaskModel.payload_model.get(task_id=uuid.UUID(task_id)).to_event_data_bytes())
+
+        status, headers, response_body = self._request('POST', '/receive', body=b'{"eventType": ', headers={'Content-Type': 'application/json'})
+
+        task_id = json.loads(response_body)
+
+        self.assertEqual('422 Unprocessable Entity', self.ReceiveTaskModel.get(task_id=uuid.UUID(task_id)).task_status)
+
+        # NOTE The malformed event is embedded as a string.
+        status, headers, response_body = self._request('GET', '/get/{0}'.format(task_id))
+
+        self.assertEqual(200, status)
+        self.assertEqual('{"eventType": ', json.loads(response_body)['eventData'])
+        self.assertEqual(None, json.loads(response_body)['data'])
+
+        return
+
+    def test_get_raw(self):
+        # NOTE The "data" member is sliced from the stored event verbatim, including values that are not decoded by every JSON library.
+        data_bytes = b'{"a": [1, "]}\\"", NaN], "b": 123456789012345678901234567890}'
+
+        body = b'{"eventType": "%s", "cloudEventsVersion": "0.1", "source": "%s", "eventID": "1", "data": %s, "extensions": {}}' % (bytes(CLOUDEVENTS_DEFAULT_EVENT_TYPE_, 'utf-8'), bytes(CLOUDEVENTS_DEFAULT_SOURCE_, 'utf-8'), data_bytes)
+
+        status, headers, response_body = self._request('POST', '/receive', body=body, headers={'Content-Type': 'application/json'})
+
+        self.assertEqual(200, status)
+
+        task_id = json.loads(response_body)
+
+        status, headers, response_body = self._request('GET', '/get/{0}'.format(task_id))
+
+        self.assertEqual(200, status)
+        self.assertIn(b'"data":' + data_bytes + b',', response_body)
+        self.assertEqual(json.loads(body), json.loads(response_body)['eventData'])
+        self.assertEqual(123456789012345678901234567890, json.loads(response_body)['data']['b'])
+
+        return
+
+    def test_receive_body(self):
+        self.application = self.ReceiveTaskModel.create_cherrypy_app(self.receive_task, max_body_size=1024)
+
+        body = bytes(json.dumps(_to_event_data('1')), 'utf-8')
+
+        status, headers, response_body = self._request('POST', '/receive', body=gzip.compress(body), headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+
+        self.assertEqual(200, status)
+        self.assertEqual(body, self.ReceiveTaskModel.payload_model.get(task_id=uuid.UUID(json.loads(response_body))).to_event_data_bytes())
+
+        event_data = _to_event_data('2')
+        event_data['data'] = 'x' * 2048
+
+        status, headers, response_body = self._request('POST', '/receive', body=bytes(json.dumps(event_data), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+        self.assertEqual(413, status)
+
+        # NOTE The limit is on the size of the decompressed body.
+        status, headers, response_body = self._request('POST', '/receive', body=gzip.compress(bytes(json.dumps(event_data), 'utf-8')), headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+
+        self.assertEqual(413, status)
+
+        status, headers, response_body = self._request('POST', '/receive', body=b'not gzip', headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+
+        self.assertEqual(400, status)
+
+        status, headers, response_body = self._request('POST', '/receive', body=body, headers={'Content-Type': 'application/json', 'Content-Encoding': 'br'})
+
+        self.assertEqual(415, status)
+
+        for invalid_body in [b'[]', b'{"eventType": "", "source": "s", "eventID": "1"}', b'{"eventType": "t", "source": null, "eventID": "1"}', b'{"eventType": "t", "eventID": "1"}']:
+            status, headers, response_body = self._request('POST', '/receive', body=invalid_body, headers={'Content-Type': 'application/json'})
+
+            self.assertEqual(422, status)
+
+        self.assertEqual(1, self.ReceiveTaskModel.select().count())
+
+        return
+
+    def test_batch_json(self):
+        event_data_list = [_to_event_data(str(index)) for index in range(5)]
+
+        status, headers, body = self._request('POST', '/batch', body=bytes(json.dumps(event_data_list), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+        self.assertEqual(200, status)
+
+        task_ids = [task_status['taskID'] for task_status in json.loads(body)]
+
+        self.assertEqual(5, len(task_ids))
+        self.assertEqual(5, self.ReceiveTaskModel.select().count())
+
+        for event_data, task_id in zip(event_data_list, task_ids):
+            self.assertEqual(event_data['eventID'], self.ReceiveTaskModel.get(task_id=uuid.UUID(task_id)).event_id)
+
+        return
+
+    def test_batch_ndjson(self):
+        event_data_list = [_to_event_data(str(index)) for index in range(3)]
+
+        status, headers, body = self._request('POST', '/batch', body=bytes('\n'.join(json.dumps(event_data) for event_data in event_data_list) + '\n', 'utf-8'), headers={'Content-Type': 'application/x-ndjson'})
+
+        self.assertEqual(200, status)
+        self.assertEqual(['202 Accepted'] * 3, [task_status['status'] for task_status in json.loads(body)])
+
+        return
+
+    def test_batch_invalid(self):
+        event_data_list = [_to_event_data('1'), {'eventType': CLOUDEVENTS_DEFAULT_EVENT_TYPE_}]
+
+        status, headers, body = self._request('POST', '/batch', body=bytes(json.dumps(event_data_list), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+        self.assertEqual(422, status)
+        self.assertEqual(0, self.ReceiveTaskModel.select().count())
+
+        status, headers, body = self._request('POST', '/batch', body=b'{}', headers={'Content-Type': 'application/json'})
+
+        self.assertEqual(400, status)
+
+        return
+
+    def test_event_id_dedup(self):
+        status, headers, body = self._request('POST', '/receive', body=bytes(json.dumps(_to_event_data('1')), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+        self.assertEqual(200, status)
+
+        task_id = json.loads(body)
+
+        self.assertEqual(task_id, str(self.ReceiveTaskModel.event_key_model.get(source=CLOUDEVENTS_DEFAULT_SOURCE_, event_id='1').task_id))
+
+        # NOTE A retry returns the original task.
+        status, headers, body = self._request('POST', '/receive', body=bytes(json.dumps(_to_event_data('1')), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+        self.assertEqual(200, status)
+        self.assertEqual(task_id, json.loads(body))
+        self.assertEqual(1, self.ReceiveTaskModel.select().count())
+
+        # NOTE Duplicates within the batch are enqueued once.
+        event_data_list = [_to_event_data('1'), _to_event_data('4'), _to_event_data('4'), _to_event_data('5')]
+
+        status, headers, body = self._request('POST', '/batch', body=bytes(json.dumps(event_data_list), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+        self.assertEqual(200, status)
+
+        task_ids = [task_status['taskID'] for task_status in json.loads(body)]
+
+        self.assertEqual(task_id, task_ids[0])
+        self.assertEqual(task_ids[1], task_ids[2])
+        self.assertEqual(3, len(set(task_ids)))
+        self.assertEqual(3, self.ReceiveTaskModel.select().count())
+
+        return
+
+    def test_event_id_dedup_worker(self):
+        event_data = _to_event_data('1')
+
+        self.receive_task.apply(args=(event_data, ))
+
+        # NOTE The worker skips the event, since another worker has already received it.
+        with unittest.mock.patch.object(NoopEventHandler, 'handle') as handle:
+            async_result = self.receive_task.apply(args=(event_data, ))
+
+            handle.assert_not_called()
+
+        self.assertEqual(1, self.ReceiveTaskModel.select().count())
+
+        # NOTE The task for the duplicate resolves to the task for the original event.
+        original_task_id = str(self.ReceiveTaskModel.get().task_id)
+
+        status, headers, body = self._request('GET', '/status/{0}'.format(async_result.id))
+
+        self.assertEqual(200, status)
+        self.assertEqual('200 OK', json.loads(body))
+
+        status, headers, body = self._request('GET', '/get/{0}'.format(async_result.id))
+
+        self.assertEqual(200, status)
+        self.assertEqual(original_task_id, json.loads(body)['taskID'])
+
+        status, headers, body = self._request('GET', '/wait/{0}'.format(async_result.id), query_string='timeout=0')
+
+        self.assertEqual(200, status)
+
+        # NOTE A redelivered task is not recorded as an alias of itself.
+        self.receive_task.apply(args=(event_data, ), task_id=original_task_id)
+
+        self.assertEqual(1, self.ReceiveTaskModel.alias_model.select().count())
+
+        return
+
+    def test_event_id_resubmit(self):
+        body = bytes(json.dumps(_to_event_data('1')), 'utf-8')
+
+        with unittest.mock.patch.object(NoopEventHandler, 'handle', side_effect=RuntimeError('failed')):
+            status, headers, response_body = self._request('POST', '/receive', body=body, headers={'Content-Type': 'application/json'})
+
+        failed_task_id = json.loads(response_body)
+
+        self.assertEqual('500 Internal Server Error', self.ReceiveTaskModel.get(task_id=uuid.UUID(failed_task_id)).task_status)
+
+        # NOTE An event whose handler failed is handled again if it is resubmitted.
+        with unittest.mock.patch.object(NoopEventHandler, 'handle') as handle:
+            status, headers, response_body = self._request('POST', '/receive', body=body, headers={'Content-Type': 'application/json'})
+
+            handle.assert_called_once()
+
+        task_id = json.loads(response_body)
+
+        self.assertNotEqual(failed_task_id, task_id)
+        self.assertEqual('200 OK', self.ReceiveTaskModel.get(task_id=uuid.UUID(task_id)).task_status)
+
+        # NOTE The failed task is kept, unchanged.
+        self.assertEqual('500 Internal Server Error', self.ReceiveTaskModel.get(task_id=uuid.UUID(failed_task_id)).task_status)
+        self.assertEqual('1', self.ReceiveTaskModel.get(task_id=uuid.UUID(failed_task_id)).event_id)
+
+        # NOTE The event is a duplicate once it is handled.
+        status, headers, response_body = self._request('POST', '/receive', body=body, headers={'Content-Type': 'application/json'})
+
+        self.assertEqual(task_id, json.loads(response_body))
+
+        # NOTE Likewise in the worker, e.g., if the event is enqueued by another process.
+        with unittest.mock.patch.object(NoopEventHandler, 'handle', side_effect=RuntimeError('failed')):
+            failed_task_id = self.receive_task.apply(args=(_to_event_data('2'), )).id
+
+        with unittest.mock.patch.object(NoopEventHandler, 'handle') as handle:
+            self.receive_task.apply(args=(_to_event_data('2'), ))
+
+            handle.assert_called_once()
+
+        self.assertEqual(4, self.ReceiveTaskModel.select().count())
+        self.assertEqual(0, self.ReceiveTaskModel.alias_model.select().count())
+
+        return
+
+    def test_event_id_redelivery(self):
+        # NOTE An event without an event ID, whose handler failed.
+        event_data = _to_event_data('1')
+        del event_data['eventID']
+
+        with unittest.mock.patch.object(NoopEventHandler, 'handle', side_effect=RuntimeError('failed')):
+            self.receive_task.apply(args=(event_data, ))
+
+        task_id = self.receive_task.apply(args=(event_data, )).id
+
+        # NOTE The message is redelivered, i.e., the task is neither handled again nor an alias of the unrelated task.
+        with unittest.mock.patch.object(NoopEventHandler, 'handle') as handle:
+            self.receive_task.apply(args=(event_data, ), task_id=task_id)
+
+            handle.assert_not_called()
+
+        self.assertEqual(2, self.ReceiveTaskModel.select().count())
+        self.assertEqual(0, self.ReceiveTaskModel.alias_model.select().count())
+        self.assertEqual(0, self.ReceiveTaskModel.event_key_model.select().count())
+
+        return
+
+    def test_event_id_dedup_unscanned(self):
+        # NOTE The envelope is not found by the scanner, since it follows the (large) data.
+        self.application = self.ReceiveTaskModel.create_cherrypy_app(self.receive_task, envelope_scan_size=16)
+
+        event_data = _to_event_data('1')
+
+        body = bytes(json.dumps(dict([('data', ['x'] * 100)] + [(name, value) for name, value in event_data.items() if name != 'data'])), 'utf-8')
+
+        status, headers, response_body = self._request('POST', '/receive', body=body, headers={'Content-Type': 'application/json'})
+
+        task_id = json.loads(response_body)
+
+        with unittest.mock.patch.object(self.receive_task, 'apply_async') as apply_async:
+            status, headers, response_body = self._request('POST', '/receive', body=body, headers={'Content-Type': 'application/json'})
+
+            apply_async.assert_not_called()
+
+        self.assertEqual(200, status)
+        self.assertEqual(task_id, json.loads(response_body))
+
+        return
+
+    def test_edge_routing(self):
+        self.application = self.ReceiveTaskModel.create_cherrypy_app(self.receive_task, batch_chunk_size=2, router=self.router)
+
+        with unittest.mock.patch.object(self.router, 'match_first_or_raise', wraps=self.router.match_first_or_raise) as match_first_or_raise:
+            status, headers, body = self._request('POST', '/receive', body=bytes(json.dumps(_to_event_data('1')), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+            self.assertEqual(200, status)
+
+            # NOTE The worker does not re-match the event.
+            self.assertEqual(1, match_first_or_raise.call_count)
+
+        self.assertEqual('200 OK', self.ReceiveTaskModel.get(task_id=uuid.UUID(json.loads(body))).task_status)
+
+        event_data = _to_event_data('2')
+        event_data['source'] = 'INVALID'
+
+        status, headers, body = self._request('POST', '/receive', body=bytes(json.dumps(event_data), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+        self.assertEqual(422, status)
+        self.assertEqual(1, self.ReceiveTaskModel.select().count())
+
+        status, headers, body = self._request('POST', '/batch', body=bytes(json.dumps([event_data, _to_event_data('3')]), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+        # NOTE The batch is partially accepted.
+        self.assertEqual(207, status)
+
+        task_statuses = json.loads(body)
+
+        self.assertEqual({'taskID': None, 'status': '422 Unprocessable Entity'}, task_statuses[0])
+        self.assertEqual('202 Accepted', task_statuses[1]['status'])
+        self.assertEqual('3', self.ReceiveTaskModel.get(task_id=uuid.UUID(task_statuses[1]['taskID'])).event_id)
+
+        # NOTE The batch is rejected as a whole, but the response has the same shape.
+        status, headers, body = self._request('POST', '/batch', body=bytes(json.dumps([event_data]), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+        self.assertEqual(422, status)
+        self.assertEqual([{'taskID': None, 'status': '422 Unprocessable Entity'}], json.loads(body))
+
+        # NOTE The envelope is valid, but the remainder of the body is not.
+        for invalid_body in [b'{"eventType": "t", "source": "s", "eventID": "4", "data": ', b'{"eventType": "t", "source": "s", "eventID": "4", "data": "\xff"}']:
+            status, headers, body = self._request('POST', '/receive', body=invalid_body, headers={'Content-Type': 'application/json'})
+
+            self.assertEqual(400, status)
+
+        self.assertEqual(2, self.ReceiveTaskModel.select().count())
+
+        return
+
+    def test_route_queues(self):
+        router = Router()
+        router.add_route('$', NoopEventHandler(), event_type=CLOUDEVENTS_DEFAULT_EVENT_TYPE_, queue='heavy', priority=5)
+
+        receive_task_name = 'pacifica.notifications.client.tests.tasks.receive_{0}'.format(uuid.uuid4().hex)
+
+        celery_app = self.ReceiveTaskModel.create_celery_app(router, 'pacifica.notifications.client.tests.app', receive_task_name, broker='memory://')
+        celery_app.conf.task_always_eager = True
+
+        self.assertEqual([celery_app.conf.task_default_queue, 'heavy'], [queue.name for queue in celery_app.conf.task_queues])
+        self.assertEqual({'x-max-priority': 5}, celery_app.conf.task_queues[1].queue_arguments)
+
+        receive_task = celery_app.tasks[receive_task_name]
+
+        self.application = self.ReceiveTaskModel.create_cherrypy_app(receive_task, router=router)
+
+        with unittest.mock.patch.object(receive_task, 'apply_async', wraps=receive_task.apply_async) as apply_async:
+            status, headers, body = self._request('POST', '/receive', body=bytes(json.dumps(_to_event_data('1')), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+            self.assertEqual(200, status)
+
+            self.assertEqual('heavy', apply_async.call_args[1]['queue'])
+            self.assertEqual(5, apply_async.call_args[1]['priority'])
+
+        return
+
+    def test_update_task_status(self):
+        status, headers, body = self._request('POST', '/receive', body=bytes(json.dumps(_to_event_data('1')), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+        inst = self.ReceiveTaskModel.get(task_id=uuid.UUID(json.loads(body)))
+
+        self.assertEqual('200 OK', inst.task_status)
+        self.assertLessEqual(inst.created, inst.updated)
+
+        self.assertEqual(1, self.ReceiveTaskModel.update_task_status(str(inst.task_id), '500 Internal Server Error', exc_type='ValueError'))
+
+        inst = self.ReceiveTaskModel.get(task_id=inst.task_id)
+
+        self.assertEqual('500 Internal Server Error', inst.task_status)
+        self.assertEqual('ValueError', inst.exc_type)
+        self.assertEqual(json.dumps(_to_event_data('1')), self.ReceiveTaskModel.payload_model.get(task_id=inst.task_id).to_event_data_str())
+
+        return
+
+    def test_task_status_buffer(self):
+        status, headers, body = self._request('POST', '/batch', body=bytes(json.dumps([_to_event_data('1'), _to_event_data('2')]), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+        task_ids = [task_status['taskID'] for task_status in json.loads(body)]
+
+        flushed_task_ids = []
+
+        status_buffer = TaskStatusBuffer(self.ReceiveTaskModel, max_size=2, max_delay=60.0, on_flush=flushed_task_ids.extend)
+
+        status_buffer.put(task_ids[0], '102 Processing')
+        status_buffer.put(task_ids[0], '500 Internal Server Error')
+
+        self.assertEqual(1, len(status_buffer))
+        self.assertEqual('200 OK', self.ReceiveTaskModel.get(task_id=uuid.UUID(task_ids[0])).task_status)
+        self.assertEqual([], flushed_task_ids)
+
+        status_buffer.put(task_ids[1], '500 Internal Server Error')
+
+        self.assertEqual(0, len(status_buffer))
+        self.assertEqual(['500 Internal Server Error', '500 Internal Server Error'], [self.ReceiveTaskModel.get(task_id=uuid.UUID(task_id)).task_status for task_id in task_ids])
+
+        # NOTE The tasks are reported once their updates are committed.
+        self.assertEqual(task_ids, flushed_task_ids)
+
+        status_buffer.flush()
+
+        return
+
+    def test_task_status_buffer_flush_failure(self):
+        status, headers, body = self._request('POST', '/batch', body=bytes(json.dumps([_to_event_data('1'), _to_event_data('2')]), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+        task_ids = [task_status['taskID'] for task_status in json.loads(body)]
+
+        status_buffer = TaskStatusBuffer(self.ReceiveTaskModel, max_size=10, max_delay=60.0)
+
+        status_buffer.put(task_ids[0], '500 Internal Server Error', exc_type='ValueError')
+        status_buffer.put(task_ids[1], '500 Internal Server Error')
+
+        with unittest.mock.patch.object(self.ReceiveTaskModel, 'update', side_effect=peewee.OperationalError('database is locked')):
+            with self.assertLogs('pacifica.notifications.client.receiver', level='ERROR'):
+                status_buffer.flush()
+
+        # NOTE The updates are kept, and are retried by the timer.
+        self.assertEqual(2, len(status_buffer))
+        self.assertIsNotNone(status_buffer._timer)
+        self.assertEqual(['200 OK', '200 OK'], [self.ReceiveTaskModel.get(task_id=uuid.UUID(task_id)).task_status for task_id in task_ids])
+
+        # NOTE A newer update is not overwritten by the retried update.
+        status_buffer.put(task_ids[0], '102 Processing')
+
+        status_buffer.flush()
+
+        self.assertEqual(0, len(status_buffer))
+        self.assertIsNone(status_buffer._timer)
+
+        inst = self.ReceiveTaskModel.get(task_id=uuid.UUID(task_ids[0]))
+
+        self.assertEqual('102 Processing', inst.task_status)
+        self.assertEqual('ValueError', inst.exc_type)
+        self.assertEqual('500 Internal Server Error', self.ReceiveTaskModel.get(task_id=uuid.UUID(task_ids[1])).task_status)
+
+        return
+
+    def test_root_pagination(self):
+        event_data_list = [_to_event_data(str(index)) for index in range(5)]
+
+        status, headers, body = self._request('POST', '/batch', body=bytes(json.dumps(event_data_list), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+        task_ids = [task_status['taskID'] for task_status in json.loads(body)]
+
+        self.ReceiveTaskModel.update_task_status(task_ids[0], '500 Internal Server Error')
+
+        listed_task_ids = []
+
+        path = '/?limit=2'
+
+        while path is not None:
+            status, headers, body = self._request('GET', path.split('?', 1)[0], query_string=path.split('?', 1)[1])
+
+            self.assertEqual(200, status)
+
+            page = json.loads(body)
+
+            self.assertLessEqual(len(page), 2)
+
+            listed_task_ids.extend(inst_data['taskID'] for inst_data in page)
+
+            path = headers['Link'][1:headers['Link'].index('>')].replace('http://127.0.0.1', '') if 'Link' in headers else None
+
+        self.assertEqual(sorted(task_ids), sorted(listed_task_ids))
+        self.assertEqual(5, len(set(listed_task_ids)))
+
+        status, headers, body = self._request('GET', '/', query_string='task_status=500+Internal+Server+Error')
+
+        self.assertEqual([task_ids[0]], [inst_data['taskID'] for inst_data in json.loads(body)])
+
+        status, headers, body = self._request('GET', '/', query_string='created_after=2000-01-01T00:00:00&created_before=2000-01-02T00:00:00')
+
+        self.assertEqual([], json.loads(body))
+
+        status, headers, body = self._request('GET', '/', query_string='created_after=2000-01-01 00:00:00.000001&created_before=2000-01-02')
+
+        self.assertEqual(200, status)
+        self.assertEqual([], json.loads(body))
+
+        # NOTE Invalid cursors, including cursors that are valid JSON of the wrong shape.
+        for cursor in ['INVALID', str(base64.urlsafe_b64encode(b'{}'), 'ascii'), str(base64.urlsafe_b64encode(b'[1, 2]'), 'ascii'), str(base64.urlsafe_b64encode(b'["2000-01-01T00:00:00", null]'), 'ascii'), str(base64.urlsafe_b64encode(b'{"a": 1, "b": 2}'), 'ascii')]:
+            status, headers, body = self._request('GET', '/', query_string=urllib.parse.urlencode({'cursor': cursor}))
+
+            self.assertEqual(422, status)
+
+        for query_string in ['created_after=yesterday', 'created_after=2000-01-01&created_after=2000-01-02']:
+            status, headers, body = self._request('GET', '/', query_string=query_string)
+
+            self.assertEqual(422, status)
+
+        return
+
+    def test_migrate(self):
+        db = peewee.SqliteDatabase(os.path.join(self.tempdir.name, 'old.sqlite3'))
+
+        # NOTE The table as it was created by earlier versions.
+        class ReceiveTaskModel(peewee.Model):
+            uuid = peewee.UUIDField(default=uuid.uuid4, index=True, primary_key=True)
+
+            event_type = peewee.CharField(index=True, null=True)
+            event_type_version = peewee.CharField(index=True, null=True)
+            cloud_events_version = peewee.CharField(index=True, null=True)
+            source = peewee.CharField(index=True, null=True)
+            event_id = peewee.CharField(index=True, null=True)
+            event_time = peewee.CharField(index=True, null=True)
+            schema_url = peewee.CharField(index=True, null=True)
+            content_type = peewee.CharField(index=True, null=True)
+
+            event_data = peewee.TextField()
+            data = peewee.TextField()
+
+            task_id = peewee.UUIDField(index=True, unique=True)
+            task_application_name = peewee.CharField(index=True)
+            task_name = peewee.CharField(index=True)
+            task_status = peewee.CharField(index=True)
+
+            exc_type = peewee.CharField(null=True)
+            exc_value = peewee.CharField(null=True)
+            exc_traceback = peewee.TextField()
+
+            created = peewee.DateTimeField(default=datetime.datetime.now, index=True)
+            updated = peewee.DateTimeField(default=datetime.datetime.now, index=True)
+            deleted = peewee.DateTimeField(index=True, null=True)
+
+            class Meta(object):
+                database = db
+
+        ReceiveTaskModel.create_table()
+
+        task_ids = [uuid.uuid4() for index in range(3)]
+
+        # NOTE The first two events are duplicates.
+        for index, (task_id, event_id) in enumerate(zip(task_ids, ['1', '1', '2'])):
+            event_data = _to_event_data(event_id)
+
+            ReceiveTaskModel.create(event_type=event_data['eventType'], source=event_data['source'], event_id=event_id, event_data=json.dumps(event_data), data=json.dumps(event_data['data']), task_id=task_id, task_application_name='app', task_name='task', task_status='200 OK', exc_traceback='', created=datetime.datetime(2000, 1, 1) + datetime.timedelta(seconds=index))
+
+        MigratedReceiveTaskModel = create_peewee_model(db)
+        MigratedReceiveTaskModel.migrate(batch_size=2)
+
+        self.assertEqual(set(field.column_name for field in MigratedReceiveTaskModel._meta.sorted_fields), set(column.name for column in db.get_columns('receivetaskmodel')))
+        self.assertNotIn('receivetaskmodel_task_name', [index.name for index in db.get_indexes('receivetaskmodel')])
+        self.assertTrue(MigratedReceiveTaskModel.alias_model.table_exists())
+
+        for task_id, event_id in zip(task_ids, ['1', '1', '2']):
+            self.assertEqual(_to_event_data(event_id), json.loads(MigratedReceiveTaskModel.payload_model.get(task_id=task_id).to_event_data_bytes()))
+
+        # NOTE The first of the duplicates is the original event, and the rows are not changed.
+        self.assertEqual(['1', '1', '2'], [MigratedReceiveTaskModel.get(task_id=task_id).event_id for task_id in task_ids])
+        self.assertEqual([(CLOUDEVENTS_DEFAULT_SOURCE_, '1', task_ids[0]), (CLOUDEVENTS_DEFAULT_SOURCE_, '2', task_ids[2])], list(MigratedReceiveTaskModel.event_key_model.select(MigratedReceiveTaskModel.event_key_model.source, MigratedReceiveTaskModel.event_key_model.event_id, MigratedReceiveTaskModel.event_key_model.task_id).order_by(MigratedReceiveTaskModel.event_key_model.event_id).tuples()))
+
+        # NOTE The migration is idempotent.
+        MigratedReceiveTaskModel.migrate()
+
+        self.assertEqual(3, MigratedReceiveTaskModel.payload_model.select().count())
+
+        db.close()
+
+        return
+
+    def test_pooled_db(self):
+        db = playhouse.pool.PooledSqliteDatabase(os.path.join(self.tempdir.name, 'pooled.sqlite3'), max_connections=2)
+
+        ReceiveTaskModel = create_peewee_model(db)
+        ReceiveTaskModel.create_tables(safe=True)
+
+        db.close()
+
+        receive_task_name = 'pacifica.notifications.client.tests.tasks.receive_{0}'.format(uuid.uuid4().hex)
+
+        celery_app = ReceiveTaskModel.create_celery_app(self.router, 'pacifica.notifications.client.tests.app', receive_task_name, broker='memory://')
+        celery_app.conf.task_always_eager = True
+
+        self.application = ReceiveTaskModel.create_cherrypy_app(celery_app.tasks[receive_task_name])
+
+        for index in range(3):
+            status, headers, body = self._request('POST', '/receive', body=bytes(json.dumps(_to_event_data(str(index))), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+            self.assertEqual(200, status)
+
+            # NOTE The connection is returned to the pool after each request.
+            self.assertTrue(db.is_closed())
+
+        self.assertEqual(3, ReceiveTaskModel.select().count())
+
+        db.close_all()
+
+        return
+
+    def test_task_cache(self):
+        task_cache = TaskCache(max_size=2, ttl=60.0)
+
+        receive_task_name = 'pacifica.notifications.client.tests.tasks.receive_{0}'.format(uuid.uuid4().hex)
+
+        celery_app = self.ReceiveTaskModel.create_celery_app(self.router, 'pacifica.notifications.client.tests.app', receive_task_name, broker='memory://', task_cache=task_cache)
+        celery_app.conf.task_always_eager = True
+
+        self.application = self.ReceiveTaskModel.create_cherrypy_app(celery_app.tasks[receive_task_name], task_cache=task_cache)
+
+        status, headers, body = self._request('POST', '/receive', body=bytes(json.dumps(_to_event_data('1')), 'utf-8'), headers={'Content-Type': 'application/json'})
+
+        task_id = json.loads(body)
+
+        status, headers, body = self._request('GET', '/status/{0}'.format(task_id))
+
+        self.assertEqual(200, status)
+        self.assertEqual(b'"200 OK"', task_cache.get('status', task_id))
+
+        etag = dict((name.lower(), value) for name, value in headers.items())['etag']
+
+        with unittest.mock.patch.object(self.ReceiveTaskModel, 'select') as select:
+            status, headers, body = self._request('GET', '/status/{0}'.format(task_id), headers={'If-None-Match': etag})
+
+            self.assertEqual(304, status)
+            self.assertEqual(b'', body)
+
+            # NOTE Terminal statuses are served from the cache.
+            self.assertEqual(0, select.call_count)
+
+        status, headers, body = self._request('GET', '/get/{0}'.format(task_id))
+
+        self.assertEqual(200, status)
+        self.assertEqual(2, len(task_cache))
+
+        task_cache.invalidate(task_id)
+
+        self.assertEqual(0, len(task_cache))
+        self.assertEqual(None, TaskCache(ttl=-1.0).get('status', task_id))
+
+        return
+
+    def _insert_processing(self) -> str:
+        task_id = str(uuid.uuid4())
+
+        self.ReceiveTaskModel.insert_with_payload(_to_event_data('1'), task_id=task_id, task_application_name='app', task_name='task', task_status='102 Processing', exc_traceback='')
+
+        return task_id
+
+    def test_wait(self):
+        task_notifier = TaskNotifier()
+
+        self.application = self.ReceiveTaskModel.create_cherrypy_app(self.receive_task, task_notifier=task_notifier, wait_poll_interval=60.0)
+
+        task_id = self._insert_processing()
+
+        status, headers, body = self._request('GET', '/wait/{0}'.format(task_id), query_string='timeout=0.1')
+
+        self.assertEqual(202, status)
+        self.assertEqual('102 Processing', json.loads(body))
+
+        def finish():
+            time.sleep(0.2)
+
+            self.ReceiveTaskModel.update_task_status(task_id, '200 OK')
+
+            task_notifier.notify(task_id)
+
+        thread = threading.Thread(target=finish)
+        thread.start()
+
+        started = time.monotonic()
+
+        status, headers, body = self._request('GET', '/wait/{0}'.format(task_id), query_string='timeout=30')
+
+        thread.join()
+
+        self.assertEqual(200, status)
+        self.assertEqual('200 OK', json.loads(body))
+
+        # NOTE The request is woken up by the notification, not by the poll interval.
+        self.assertLess(time.monotonic() - started, 10.0)
+
+        status, headers, body = self._request('GET', '/wait/{0}'.format(uuid.uuid4()), query_string='timeout=0')
+
+        self.assertEqual(404, status)
+
+        return
+
+    def test_task_notifier(self):
+        task_notifier = TaskNotifier()
+
+        task_id = str(uuid.uuid4())
+
+        task_notifier.register(task_id)
+
+        version = task_notifier.version(task_id)
+
+        # NOTE A notification for another task does not wake up the waiter.
+        task_notifier.notify(str(uuid.uuid4()))
+
+        self.assertFalse(task_notifier.wait(task_id, version, timeout=0.05))
+
+        task_notifier.notify(task_id)
+
+        self.assertTrue(task_notifier.wait(task_id, version, timeout=0.05))
+
+        version = task_notifier.version(task_id)
+
+        # NOTE A notification for all tasks wakes up every waiter.
+        task_notifier.notify()
+
+        self.assertTrue(task_notifier.wait(task_id, version, timeout=0.05))
+
+        task_notifier.unregister(task_id)
+
+        self.assertEqual({}, task_notifier._waiters_by_task_id)
+
+        return
+
+    def test_wait_broker(self):
+        # NOTE The web tier and the worker have separate notifiers, e.g., in separate processes.
+        task_notifier = BrokerTaskNotifier('memory://', exchange_name='pacifica.notifications.tests.{0}'.format(uuid.uuid4().hex))
+        worker_task_notifier = BrokerTaskNotifier('memory://', exchange_name=task_notifier.exchange_name)
+
+        self.application = self.ReceiveTaskModel.create_cherrypy_app(self.receive_task, task_notifier=task_notifier, wait_poll_interval=60.0)
+
+        task_id = self._insert_processing()
+
+        task_notifier._start_consumer()
+
+        self.assertTrue(task_notifier._consumer_ready.wait(10.0))
+
+        def finish():
+            time.sleep(0.2)
+
+            self.ReceiveTaskModel.update_task_status(task_id, '200 OK')
+
+            worker_task_notifier.notify(task_id)
+
+        thread = threading.Thread(target=finish)
+        thread.start()
+
+        started = time.monotonic()
+
+        status, headers, body = self._request('GET', '/wait/{0}'.format(task_id), query_string='timeout=30')
+
+        thread.join()
+
+        self.assertEqual(200, status)
+        self.assertEqual('200 OK', json.loads(body))
+        self.assertLess(time.monotonic() - started, 10.0)
+
+        return
+
+    def test_wait_max_waiters(self):
+        task_notifier = TaskNotifier()
+
+        self.application = self.ReceiveTaskModel.create_cherrypy_app(self.receive_task, task_notifier=task_notifier, wait_poll_interval=60.0, wait_max_waiters=1)
+
+        task_id = self._insert_processing()
+
+        responses = []
+
+        thread = threading.Thread(target=lambda: responses.append(self._request('GET', '/wait/{0}'.format(task_id), query_string='timeout=30')))
+        thread.start()
+
+        # NOTE Retry until the first request holds the only slot.
+        for attempt in range(100):
+            status, headers, body = self._request('GET', '/events/{0}'.format(task_id), query_string='timeout=0')
+
+            if 503 == status:
+                break
+
+            time.sleep(0.05)
+
+        self.assertEqual(503, status)
+
+        self.ReceiveTaskModel.update_task_status(task_id, '200 OK')
+
+        task_notifier.notify(task_id)
+
+        thread.join()
+
+        self.assertEqual(200, responses[0][0])
+
+        # NOTE The slot is released.
+        status, headers, body = self._request('GET', '/wait/{0}'.format(task_id), query_string='timeout=0')
+
+        self.assertEqual(200, status)
+
+        return
+
+    def test_events(self):
+        self.application = self.ReceiveTaskModel.create_cherrypy_app(self.receive_task, wait_poll_interval=0.05)
+
+        task_id = self._insert_processing()
+
+        def finish():
+            time.sleep(0.2)
+
+            self.ReceiveTaskModel.update_task_status(task_id, '500 Internal Server Error')
+
+        thread = threading.Thread(target=finish)
+        thread.start()
+
+        status, headers, body = self._request('GET', '/events/{0}'.format(task_id), query_string='timeout=30')
+
+        thread.join()
+
+        self.assertEqual(200, status)
+        self.assertEqual(b'event: status\ndata: "102 Processing"\n\nevent: status\ndata: "500 Internal Server Error"\n\n', body)
+
+        return
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,7 +13,8 @@ import unittest
 from jsonpath2.path import Path
 
 from ..event_handlers import NoopEventHandler
-from ..router import RouteNotFoundRouterError, Router
+from ..globals import CLOUDEVENTS_DEFAULT_EVENT_TYPE_, CLOUDEVENTS_DEFAULT_SOURCE_
+from ..router import DuplicateRouteIdRouterError, RouteNotFoundRouterError, Router
 
 class RouterTestCase(unittest.TestCase):
     def test_blank_router_raises(self):
@@ -29,5 +30,80 @@ class RouterTestCase(unittest.TestCase):
 
         self.assertEqual(1, len(list(router.match(None))))
 
+    def test_router_route_ids(self):
+        router = Router()
+
+        router.add_route('$', NoopEventHandler())
+        router.add_route('$', NoopEventHandler(), route_id='proxymod')
+
+        self.assertEqual('0', router._routes[0].route_id)
+        self.assertIs(router._routes[1], router.get_route('proxymod'))
+        self.assertEqual(None, router.get_route('INVALID'))
+
+        with self.assertRaises(DuplicateRouteIdRouterError):
+            router.add_route('$', NoopEventHandler(), route_id='proxymod')
+
+    def test_router_queues(self):
+        router = Router()
+
+        router.add_route('$', NoopEventHandler())
+        router.add_route('$', NoopEventHandler(), queue='heavy', priority=3)
+        router.add_route('$', NoopEventHandler(), queue='heavy', priority=7)
+        router.add_route('$', NoopEventHandler(), queue='light')
+
+        self.assertEqual({'heavy': 7, 'light': None}, router.queues())
+
+        self.assertEqual(None, router._routes[1]({'eventType': CLOUDEVENTS_DEFAULT_EVENT_TYPE_, 'cloudEventsVersion': '0.1', 'source': CLOUDEVENTS_DEFAULT_SOURCE_, 'eventID': '1'}))
+
+    def test_router_candidates_event_type_source(self):
+        router = Router()
+
+        router.add_route(Path.parse_str('$'), NoopEventHandler(), event_type=CLOUDEVENTS_DEFAULT_EVENT_TYPE_, source=CLOUDEVENTS_DEFAULT_SOURCE_)
+        router.add_route(Path.parse_str('$'), NoopEventHandler(), event_type=CLOUDEVENTS_DEFAULT_EVENT_TYPE_)
+        router.add_route(Path.parse_str('$'), NoopEventHandler())
+
+        self.assertEqual(router._routes, list(router.match({
+            'eventType': CLOUDEVENTS_DEFAULT_EVENT_TYPE_,
+            'source': CLOUDEVENTS_DEFAULT_SOURCE_,
+        })))
+
+        self.assertEqual(router._routes[1:], list(router.match({
+            'eventType': CLOUDEVENTS_DEFAULT_EVENT_TYPE_,
+            'source': 'INVALID',
+        })))
+
+        self.assertEqual(router._routes[2:], list(router.match({
+            'eventType': 'INVALID',
+            'source': CLOUDEVENTS_DEFAULT_SOURCE_,
+        })))
+
+        self.assertEqual(router._routes[2:], list(router.match(None)))
+
+    def test_router_candidates_transaction_key_value_keys(self):
+        router = Router()
+
+        router.add_route('$', NoopEventHandler(), transaction_key_value_keys=['key'])
+
+        self.assertEqual(1, len(list(router.match({
+            'data': [
+                {
+                    'destinationTable': 'TransactionKeyValue',
+                    'key': 'key',
+                    'value': 'value',
+                },
+            ],
+        }))))
+
+        self.assertEqual(0, len(list(router.match({
+            'data': [
+                {
+                    'destinationTable': 'Files',
+                    'key': 'key',
+                },
+            ],
+        }))))
+
+        self.assertEqual(0, len(list(router.match(None))))
+
 if __name__ == '__main__':
     unittest.main()
@@ -8,12 +8,39 @@
 #
 # See LICENSE and WARRANTY for details.
 
+import hashlib
+import io
 import os
+import tarfile
 import tempfile
 import unittest
+import unittest.mock
 
 from ..models import Transaction, TransactionKeyValue
-from ..uploader_runners import LocalUploaderRunner
+from ..uploader_runners import LocalUploaderRunner, PollStrategy, RemoteUploaderRunner, TimeoutUploaderRunnerError, _hash_file, _to_bundler, _to_content_length, _walk
+
+class _Uploader(object):
+    def __init__(self, task_percents=[]):
+        super(_Uploader, self).__init__()
+
+        self.content_length = None
+        self.data = None
+
+        self.task_percents = list(task_percents)
+
+    def upload(self, read_fd, content_length=None):
+        self.content_length = content_length
+        self.data = read_fd.read()
+
+        return 1
+
+    def getstate(self, job_id):
+        return {
+            'job_id': job_id,
+            'state': 'OK',
+            'task': 'ingest metadata',
+            'task_percent': self.task_percents.pop(0) if len(self.task_percents) > 0 else '100.0',
+        }
 
 class LocalUploaderRunnerTestCase(unittest.TestCase):
     def test_local_uploader_runner(self):
@@ -44,9 +71,212 @@ class LocalUploaderRunnerTestCase(unittest.TestCase):
         return
 
 class RemoteUploaderRunnerTestCase(unittest.TestCase):
+    def _write(self, uploader_tempdir_name: str) -> None:
+        os.makedirs(os.path.join(uploader_tempdir_name, 'filepath'))
+
+        for file_name, f_data in [('filename.ext', 'Hello, world!'), ('{0}.ext'.format('x' * 128), 'x' * 1024)]:
+            with open(os.path.join(uploader_tempdir_name, 'filepath', file_name), mode='w') as f:
+                f.write(f_data)
+
+        return
+
+    def test_to_content_length(self):
+        with tempfile.TemporaryDirectory() as uploader_tempdir_name:
+            self._write(uploader_tempdir_name)
+
+            bundler = _to_bundler(uploader_tempdir_name, transaction=Transaction(submitter=1, instrument=1, proposal=1), transaction_key_values=[TransactionKeyValue(key='Transactions._id', value=1)])
+
+            content_length = _to_content_length(bundler)
+
+            file_descriptors = [file_data.get('fileobj') for file_data in bundler.file_data]
+
+            bundler_file = io.BytesIO()
+            bundler.stream(bundler_file)
+
+            for file_descriptor in file_descriptors:
+                file_descriptor.close()
+
+            self.assertEqual(len(bundler_file.getvalue()), content_length)
+
+        return
+
+    def test_to_content_length_unknown(self):
+        with tempfile.TemporaryDirectory() as uploader_tempdir_name:
+            self._write(uploader_tempdir_name)
+
+            bundler = _to_bundler(uploader_tempdir_name, transaction=Transaction(submitter=1, instrument=1, proposal=1), transaction_key_values=[TransactionKeyValue(key='Transactions._id', value=1)])
+
+            with unittest.mock.patch.object(tarfile.TarInfo, 'tobuf', side_effect=ValueError()):
+                self.assertEqual(None, _to_content_length(bundler))
+
+            # NOTE Other errors are bugs, which are not hidden.
+            with unittest.mock.patch.object(tarfile.TarInfo, 'tobuf', side_effect=AttributeError()):
+                with self.assertRaises(AttributeError):
+                    _to_content_length(bundler)
+
+            for file_data in bundler.file_data:
+                file_data['fileobj'].close()
+
+        return
+
+    def test_to_bundler_hash_max_workers(self):
+        bundles = []
+        hashsums = []
+
+        for hash_max_workers in [None, 2]:
+            with tempfile.TemporaryDirectory() as uploader_tempdir_name:
+                self._write(uploader_tempdir_name)
+
+                bundler = _to_bundler(uploader_tempdir_name, transaction=Transaction(submitter=1, instrument=1, proposal=1), transaction_key_values=[TransactionKeyValue(key='Transactions._id', value=1)], hash_max_workers=hash_max_workers)
+
+                # NOTE Count the bytes that are read by the bundler, i.e., each file is streamed once.
+                read_sizes = []
+
+                for file_data in bundler.file_data:
+                    fileobj = file_data['fileobj']
+
+                    def read(size=-1, fileobj=fileobj, orig_read=fileobj.read):
+                        buf = orig_read(size)
+
+                        read_sizes.append(len(buf))
+
+                        return buf
+
+                    fileobj.read = read
+
+                file_size = sum(file_data['size'] for file_data in bundler.file_data)
+
+                content_length = _to_content_length(bundler)
+
+                bundler_file = io.BytesIO()
+                bundler.stream(bundler_file)
+
+                self.assertEqual(len(bundler_file.getvalue()), content_length)
+                self.assertEqual(file_size, sum(read_sizes))
+
+                bundles.append(bundler_file.getvalue())
+                hashsums.append(sorted([md_obj.hashsum for md_obj in bundler.md_obj if 'Files' == md_obj.destinationTable]))
+
+        self.assertEqual(2, len(hashsums[0]))
+        self.assertEqual(hashsums[0], hashsums[1])
+        self.assertEqual(len(bundles[0]), len(bundles[1]))
+
+        return
+
+    def test_hash_file(self):
+        f_data = bytes(range(256)) * 4096
+
+        with tempfile.TemporaryDirectory() as tempdir_name:
+            path = os.path.join(tempdir_name, 'data.bin')
+
+            with open(path, mode='wb') as f:
+                f.write(f_data)
+
+            for use_mmap in [False, True]:
+                self.assertEqual(hashlib.sha1(f_data).hexdigest(), _hash_file(path, len(f_data), 'sha1', use_mmap=use_mmap, chunk_size=1000))
+
+        return
+
     def test_remote_uploader_runner(self):
-        # TODO Auto-generated method stub.
-        pass
+        for streaming in [True, False]:
+            with tempfile.TemporaryDirectory() as uploader_tempdir_name:
+                self._write(uploader_tempdir_name)
+
+                uploader = _Uploader()
+
+                uploader_runner = RemoteUploaderRunner(uploader, streaming=streaming)
+
+                (bundle, job_id, state) = uploader_runner.upload(uploader_tempdir_name, transaction=Transaction(submitter=1, instrument=1, proposal=1), transaction_key_values=[TransactionKeyValue(key='Transactions._id', value=1)])
+
+                self.assertEqual(2, len(bundle.file_data))
+
+                self.assertEqual(1, job_id)
+                self.assertEqual('OK', state.get('state', None))
+
+                self.assertEqual(len(uploader.data), uploader.content_length)
+
+        return
+
+    def test_remote_uploader_runner_wait_for_state(self):
+        uploader = _Uploader(task_percents=['0.0', '50.0'])
+
+        uploader_runner = RemoteUploaderRunner(uploader, poll_strategy=PollStrategy(delay=0.001, jitter=0.0))
+
+        self.assertEqual('100.0', uploader_runner.wait_for_state(1).get('task_percent', None))
+        self.assertEqual(0, len(uploader.task_percents))
+
+        return
+
+    def test_remote_uploader_runner_wait_for_state_timeout(self):
+        uploader = _Uploader(task_percents=['0.0'] * 16)
+
+        uploader_runner = RemoteUploaderRunner(uploader, poll_strategy=PollStrategy(delay=0.001, timeout=0.01))
+
+        with self.assertRaises(TimeoutUploaderRunnerError):
+            uploader_runner.wait_for_state(1)
+
+        return
+
+    def test_remote_uploader_runner_wait_for_state_async(self):
+        job_ids = []
+
+        with tempfile.TemporaryDirectory() as uploader_tempdir_name:
+            self._write(uploader_tempdir_name)
+
+            uploader_runner = RemoteUploaderRunner(_Uploader(task_percents=['0.0']), wait_for_state_async=job_ids.append)
+
+            (bundle, job_id, state) = uploader_runner.upload(uploader_tempdir_name, transaction=Transaction(submitter=1, instrument=1, proposal=1), transaction_key_values=[TransactionKeyValue(key='Transactions._id', value=1)])
+
+        self.assertEqual([1], job_ids)
+        self.assertEqual({}, state)
+
+        return
+
+class WalkTestCase(unittest.TestCase):
+    def test_walk_lazy_binary(self):
+        f_data = bytes(range(256)) * 64
+
+        for mmap_threshold in [None, 0]:
+            with tempfile.TemporaryDirectory() as uploader_tempdir_name:
+                os.makedirs(os.path.join(uploader_tempdir_name, 'filepath'))
+
+                with open(os.path.join(uploader_tempdir_name, 'filepath', 'filename.bin'), mode='wb') as f:
+                    f.write(f_data)
+
+                file_data = _walk(uploader_tempdir_name, mmap_threshold=mmap_threshold)
+
+                self.assertEqual(1, len(file_data))
+
+                fileobj = file_data[0].get('fileobj')
+
+                self.assertTrue(fileobj.closed)
+
+                buf = fileobj.read(1024)
+
+                self.assertFalse(fileobj.closed)
+
+                while len(buf) < len(f_data):
+                    buf += fileobj.read(1024)
+
+                self.assertTrue(fileobj.closed)
+
+                self.assertEqual(f_data, buf)
+                self.assertEqual(b'', fileobj.read(1024))
+
+        return
+
+class PollStrategyTestCase(unittest.TestCase):
+    def test_poll_strategy_delays(self):
+        delays = PollStrategy(delay=1.0, max_delay=4.0, backoff=2.0, jitter=0.0).delays()
+
+        self.assertEqual([1.0, 2.0, 4.0, 4.0], [next(delays) for _ in range(4)])
+
+        for delay in PollStrategy(delay=1.0, jitter=0.5).delays():
+            self.assertTrue(0.5 <= delay <= 1.5)
+
+            break
+
+        return
 
 if __name__ == '__main__':
     unittest.main()
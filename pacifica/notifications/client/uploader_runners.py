@@ -9,18 +9,184 @@
 # See LICENSE and WARRANTY for details.
 
 import abc
+import concurrent.futures
+import hashlib
+import io
+import mmap
 import os
+import random
+import tarfile
 import tempfile
+import threading
 import time
 import typing
 
 from pacifica.uploader import Uploader
 from pacifica.uploader.bundler import Bundler
-from pacifica.uploader.metadata import MetaData, MetaObj
+from pacifica.uploader.metadata import MetaData, MetaObj, metadata_encode
 
 from .exceptions import TransactionDuplicateAttributeError
 from .models import Transaction, TransactionKeyValue
 
+class _LazyFile(object):
+    def __init__(self, path: str, size: int, use_mmap: bool = False) -> None:
+        super(_LazyFile, self).__init__()
+
+        self.path = path
+        self.size = size
+        self.use_mmap = use_mmap
+
+        self._file = None # type: typing.BinaryIO
+        self._mmap = None # type: mmap.mmap
+        self._position = 0
+
+    @property
+    def closed(self) -> bool:
+        return self._file is None
+
+    @property
+    def name(self) -> str:
+        return self.path
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+
+            self._mmap = None
+
+        if self._file is not None:
+            self._file.close()
+
+            self._file = None
+
+        return
+
+    def read(self, size: int = -1) -> bytes:
+        if self._position >= self.size:
+            return b''
+
+        if self._file is None:
+            # NOTE Open the file when the bundler reaches it, not when the bundler is constructed.
+            self._file = open(self.path, mode='rb')
+
+            if self.use_mmap and (self.size > 0):
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap is None:
+            buf = self._file.read(size)
+        else:
+            buf = self._mmap.read(size)
+
+        self._position += len(buf)
+
+        if (len(buf) == 0) or (size < 0) or (self._position >= self.size):
+            # NOTE Release the file descriptor as soon as the file has been read, so that at most one is open at a time.
+            self._position = self.size
+
+            self.close()
+
+        return buf
+
+def _hash_file(path: str, size: int, hashtype: str, use_mmap: bool = False, chunk_size: int = 1048576) -> str:
+    hashval = hashlib.new(hashtype)
+
+    # NOTE Open the file again, so that the bundler reads it independently.
+    fileobj = _LazyFile(path, size, use_mmap=use_mmap)
+
+    try:
+        while True:
+            buf = fileobj.read(chunk_size)
+
+            if len(buf) == 0:
+                break
+
+            hashval.update(buf)
+    finally:
+        fileobj.close()
+
+    return hashval.hexdigest()
+
+class _HashingBundler(Bundler):
+    def __init__(self, md_obj: MetaData, file_data: typing.List[typing.Dict[str, typing.Any]], max_workers: int = None, **kwargs: typing.Dict[str, typing.Any]) -> None:
+        super(_HashingBundler, self).__init__(md_obj, file_data, **kwargs)
+
+        self.max_workers = max_workers
+
+        self.hashtype = str(kwargs.get('hashfunc', 'sha1'))
+
+    def stream(self, fileobj: typing.BinaryIO) -> None:
+        # NOTE The same bundle as `Bundler.stream`, but the files are hashed by a pool of threads (`hashlib` releases the GIL while hashing large chunks), i.e., different files are hashed in parallel while the tar stream is written.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            hashsum_futures = []
+
+            for file_data in self.file_data:
+                file_descriptor = file_data['fileobj']
+
+                hashsum_futures.append(executor.submit(_hash_file, file_descriptor.name, file_data['size'], self.hashtype, use_mmap=getattr(file_descriptor, 'use_mmap', False)))
+
+            try:
+                tar = tarfile.open(None, 'w|', fileobj)
+
+                for file_data, hashsum_future in zip(self.file_data, hashsum_futures):
+                    tarinfo = tarfile.TarInfo(file_data['name'])
+
+                    file_descriptor = file_data.pop('fileobj', None)
+
+                    for key, value in file_data.items():
+                        setattr(tarinfo, key, value)
+
+                    tar.addfile(tarinfo, file_descriptor)
+
+                    self.md_obj.append(self._build_file_info(file_data, hashsum_future.result()))
+
+                md_txt = bytes(metadata_encode(self.md_obj), 'utf8')
+
+                md_tarinfo = tarfile.TarInfo('metadata.txt')
+                md_tarinfo.size = len(md_txt)
+
+                tar.addfile(md_tarinfo, io.BytesIO(md_txt))
+
+                tar.close()
+            except BaseException:
+                # NOTE Do not hash the remaining files if the bundle is abandoned.
+                for hashsum_future in hashsum_futures:
+                    hashsum_future.cancel()
+
+                raise
+
+        return
+
+class _PipeReader(object):
+    def __init__(self, fileobj: typing.BinaryIO, content_length: int) -> None:
+        super(_PipeReader, self).__init__()
+
+        self.fileobj = fileobj
+        self.content_length = content_length
+
+        self._remaining = content_length
+
+    def __len__(self) -> int:
+        return self.content_length
+
+    def close(self) -> None:
+        self.fileobj.close()
+
+        return
+
+    def read(self, size: int = -1) -> bytes:
+        buf = self.fileobj.read(size)
+
+        if (len(buf) == 0) and (self._remaining > 0):
+            # NOTE Abort the upload, rather than send a truncated body.
+            raise IOError('bundle stream ended {0} byte(s) early'.format(self._remaining))
+
+        self._remaining -= len(buf)
+
+        return buf
+
+def _round_up(size: int, block_size: int) -> int:
+    return ((size + block_size - 1) // block_size) * block_size
+
 def _should_sleep(**kwargs: typing.Dict[str, typing.Any]) -> bool:
     for name in ['state', 'task', 'task_percent']:
         if name not in kwargs:
@@ -35,15 +201,54 @@ def _should_sleep(**kwargs: typing.Dict[str, typing.Any]) -> bool:
     else:
         return False
 
-def _to_bundler(basedir_name: str, transaction: Transaction = None, transaction_key_values: typing.List[TransactionKeyValue] = [], subdir_name: str = 'data') -> Bundler:
+def _to_bundler(basedir_name: str, transaction: Transaction = None, transaction_key_values: typing.List[TransactionKeyValue] = [], subdir_name: str = 'data', mmap_threshold: int = None, hash_max_workers: int = None) -> Bundler:
     meta_data = _to_meta_data(transaction=transaction, transaction_key_values=transaction_key_values)
 
-    file_data = _walk(basedir_name)
+    file_data = _walk(basedir_name, mmap_threshold=mmap_threshold)
 
-    bundler = Bundler(meta_data, file_data)
+    if hash_max_workers is None:
+        bundler = Bundler(meta_data, file_data)
+    else:
+        # NOTE Hash the files on a pool of threads, while the bundler streams them.
+        bundler = _HashingBundler(meta_data, file_data, max_workers=hash_max_workers)
 
     return bundler
 
+def _to_content_length(bundler: Bundler) -> typing.Optional[int]:
+    # NOTE Mirror `Bundler.stream`, i.e., a "w|" tar stream of the files followed by "metadata.txt" (see the version range of "pacifica-uploader" in "requirements.txt").
+    content_length = 0
+
+    md_objs = list(bundler.md_obj)
+
+    # NOTE Hash sums are fixed-length, so a placeholder encodes to the same length as the real hash sum.
+    hashsum = '0' * (2 * bundler._hashfunc().digest_size)
+
+    try:
+        for file_data in bundler.file_data:
+            tarinfo = tarfile.TarInfo(file_data['name'])
+
+            for key, value in file_data.items():
+                if 'fileobj' != key:
+                    setattr(tarinfo, key, value)
+
+            content_length += len(tarinfo.tobuf(tarfile.DEFAULT_FORMAT, tarfile.ENCODING, 'surrogateescape'))
+            content_length += _round_up(tarinfo.size, tarfile.BLOCKSIZE)
+
+            md_objs.append(bundler._build_file_info(file_data, hashsum))
+
+        md_tarinfo = tarfile.TarInfo('metadata.txt')
+        md_tarinfo.size = len(bytes(metadata_encode(MetaData(md_objs)), 'utf8'))
+
+        content_length += len(md_tarinfo.tobuf(tarfile.DEFAULT_FORMAT, tarfile.ENCODING, 'surrogateescape'))
+        content_length += _round_up(md_tarinfo.size, tarfile.BLOCKSIZE)
+    except ValueError:
+        # NOTE A tar header cannot be encoded (e.g., a number field overflows), i.e., the length of the bundle is not known in advance.
+        return None
+
+    content_length += 2 * tarfile.BLOCKSIZE
+
+    return _round_up(content_length, tarfile.RECORDSIZE)
+
 def _to_meta_data(transaction: Transaction = None, transaction_key_values: typing.List[TransactionKeyValue] = []) -> MetaData:
     meta_objs = []
 
@@ -71,7 +276,7 @@ def _to_meta_data(transaction: Transaction = None, transaction_key_values: typin
 
     return meta_data
 
-def _walk(basedir_name: str) -> typing.List[typing.Dict[str, typing.Any]]:
+def _walk(basedir_name: str, mmap_threshold: int = None) -> typing.List[typing.Dict[str, typing.Any]]:
     accum_value = []
 
     for orig_walk_root, walk_dirs, file_names in os.walk(basedir_name):
@@ -83,9 +288,9 @@ def _walk(basedir_name: str) -> typing.List[typing.Dict[str, typing.Any]]:
 
             st = os.stat(orig_path)
 
-            # NOTE Character encoding is undetermined.
+            # NOTE Files are read as bytes, so that character encoding does not matter.
             accum_value.append({
-                'fileobj': open(orig_path, mode='r'),
+                'fileobj': _LazyFile(orig_path, st.st_size, use_mmap=(mmap_threshold is not None) and (st.st_size >= mmap_threshold)),
                 'name': os.path.join('data', new_path),
                 'size': st.st_size,
                 # NOTE Should the next line be uncommented?
@@ -95,6 +300,85 @@ def _walk(basedir_name: str) -> typing.List[typing.Dict[str, typing.Any]]:
 
     return accum_value
 
+def _upload_stream(uploader: Uploader, bundler: Bundler, content_length: int) -> int:
+    read_fd, write_fd = os.pipe()
+
+    reader = _PipeReader(os.fdopen(read_fd, mode='rb'), content_length)
+
+    reasons = []
+
+    def stream() -> None:
+        try:
+            with os.fdopen(write_fd, mode='wb') as writer:
+                bundler.stream(writer)
+        except BaseException as reason:
+            reasons.append(reason)
+
+        return
+
+    thread = threading.Thread(target=stream, daemon=True)
+    thread.start()
+
+    try:
+        job_id = uploader.upload(reader, content_length=content_length)
+    finally:
+        # NOTE Unblock the writer if the upload stopped reading early.
+        reader.close()
+
+        thread.join()
+
+    if len(reasons) > 0:
+        raise reasons[0]
+
+    return job_id
+
+def _upload_temporary_file(uploader: Uploader, bundler: Bundler) -> int:
+    try:
+        bundler_file = tempfile.NamedTemporaryFile(delete=False)
+        bundler.stream(bundler_file)
+        bundler_file.close()
+
+        with open(bundler_file.name, mode='rb') as bundler_file_descriptor:
+            return uploader.upload(bundler_file_descriptor, content_length=os.stat(bundler_file.name).st_size)
+    finally:
+        os.unlink(bundler_file.name)
+
+def _wait_for_state(uploader: Uploader, job_id: int, poll_strategy: 'PollStrategy') -> typing.Dict[str, typing.Any]:
+    started = time.monotonic()
+
+    state = uploader.getstate(job_id)
+
+    for delay in poll_strategy.delays():
+        if not _should_sleep(**state):
+            break
+
+        if (poll_strategy.timeout is not None) and ((time.monotonic() - started + delay) > poll_strategy.timeout):
+            raise TimeoutUploaderRunnerError(job_id, state)
+
+        time.sleep(delay)
+
+        state = uploader.getstate(job_id)
+
+    return state
+
+class PollStrategy(object):
+    def __init__(self, delay: float = 1.0, max_delay: float = 30.0, backoff: float = 2.0, jitter: float = 0.1, timeout: float = None) -> None:
+        super(PollStrategy, self).__init__()
+
+        self.delay = delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.jitter = jitter
+        self.timeout = timeout
+
+    def delays(self) -> typing.Generator[float, None, None]:
+        delay = self.delay
+
+        while True:
+            yield min(delay, self.max_delay) * random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+
+            delay *= self.backoff
+
 class UploaderRunner(abc.ABC):
     def __init__(self):
         super(UploaderRunner, self).__init__()
@@ -120,31 +404,69 @@ class LocalUploaderRunner(UploaderRunner):
         return (bundler, None, {})
 
 class RemoteUploaderRunner(UploaderRunner):
-    def __init__(self, uploader: Uploader):
+    def __init__(self, uploader: Uploader, streaming: bool = True, poll_strategy: PollStrategy = None, wait_for_state_async: typing.Callable[[int], typing.Any] = None, mmap_threshold: int = None, hash_max_workers: int = None):
         super(RemoteUploaderRunner, self).__init__()
 
         self.uploader = uploader
 
+        self.streaming = streaming
+
+        # NOTE Files whose size is at least `mmap_threshold` bytes are memory-mapped.
+        self.mmap_threshold = mmap_threshold
+
+        # NOTE If defined, then files are hashed by a pool of `hash_max_workers` threads, in parallel with each other and with the bundler.
+        self.hash_max_workers = hash_max_workers
+
+        self.poll_strategy = PollStrategy() if poll_strategy is None else poll_strategy
+
+        # NOTE If defined, then completion tracking is handed off, e.g., to a Celery task, and `upload` returns once the upload is accepted.
+        self.wait_for_state_async = wait_for_state_async
+
     def upload(self, basedir_name: str, transaction: Transaction = None, transaction_key_values: typing.List[TransactionKeyValue] = []) -> typing.Tuple[Bundler, int, typing.Dict[str, typing.Any]]:
-        bundler = _to_bundler(basedir_name, transaction=transaction, transaction_key_values=transaction_key_values)
+        bundler = _to_bundler(basedir_name, transaction=transaction, transaction_key_values=transaction_key_values, mmap_threshold=self.mmap_threshold, hash_max_workers=self.hash_max_workers)
+
+        # NOTE `Bundler.stream` removes the file descriptors from `bundler.file_data`.
+        file_descriptors = [file_data.get('fileobj', None) for file_data in bundler.file_data]
 
         try:
-            bundler_file = tempfile.NamedTemporaryFile(delete=False)
-            bundler.stream(bundler_file)
-            bundler_file.close()
+            content_length = _to_content_length(bundler) if self.streaming else None
 
-            with open(bundler_file.name, mode='r') as bundler_file_descriptor:
-                job_id = self.uploader.upload(bundler_file_descriptor, content_length=os.stat(bundler_file.name).st_size)
+            if content_length is None:
+                # NOTE Fall back to a temporary file if the length of the bundle is unknown.
+                job_id = _upload_temporary_file(self.uploader, bundler)
+            else:
+                job_id = _upload_stream(self.uploader, bundler, content_length)
+        finally:
+            # NOTE Prevent "ResourceWarning: unclosed file" warnings.
+            for file_descriptor in file_descriptors:
+                if (file_descriptor is not None) and not file_descriptor.closed:
+                    file_descriptor.close()
 
-            state = self.uploader.getstate(job_id)
+        if self.wait_for_state_async is None:
+            state = self.wait_for_state(job_id)
+        else:
+            self.wait_for_state_async(job_id)
 
-            while _should_sleep(**state):
-                time.sleep(1)
+            state = {}
 
-                state = self.uploader.getstate(job_id)
+        return (bundler, job_id, state)
 
-            return (bundler, job_id, state)
-        finally:
-            os.unlink(bundler_file.name)
+    def wait_for_state(self, job_id: int) -> typing.Dict[str, typing.Any]:
+        return _wait_for_state(self.uploader, job_id, self.poll_strategy)
+
+class UploaderRunnerError(BaseException):
+    def __init__(self, job_id: int) -> None:
+        super(UploaderRunnerError, self).__init__()
+
+        self.job_id = job_id
+
+class TimeoutUploaderRunnerError(UploaderRunnerError):
+    def __init__(self, job_id: int, state: typing.Dict[str, typing.Any]) -> None:
+        super(TimeoutUploaderRunnerError, self).__init__(job_id)
+
+        self.state = state
+
+    def __str__(self) -> str: # pragma: no cover
+        return 'timed out waiting for upload job \'{0}\''.format(str(self.job_id).replace('\'', '\\\''))
 
-__all__ = ('UploaderRunner', 'LocalUploaderRunner', 'RemoteUploaderRunner')
+__all__ = ('PollStrategy', 'UploaderRunner', 'LocalUploaderRunner', 'RemoteUploaderRunner', 'UploaderRunnerError', 'TimeoutUploaderRunnerError')
@@ -9,22 +9,67 @@
 # See LICENSE and WARRANTY for details.
 
 import argparse
+import logging
 import os
 
 import cherrypy
 import playhouse.db_url
 
-from pacifica.notifications.client.receiver import create_peewee_model
+from pacifica.notifications.client.receiver import BrokerTaskNotifier, TaskCache, create_peewee_model
+from pacifica.notifications.client.uploader_runners import UploaderRunnerError
 
-from .router import router
+from .exceptions import WaitForUploadError
+from .router import router, uploader_runner
 
-ReceiveTaskModel = create_peewee_model(playhouse.db_url.connect(os.getenv('DATABASE_URL', 'sqlite:///:memory:')))
+DATABASE_URL_ = os.getenv('DATABASE_URL', 'sqlite:///:memory:')
 
-ReceiveTaskModel.create_table(safe=True)
+BROKER_URL_ = os.getenv('BROKER_URL', 'pyamqp://')
 
-celery_app = ReceiveTaskModel.create_celery_app(router, 'pacifica.proxymod.app', 'pacifica.proxymod.tasks.receive', backend='rpc://', broker='pyamqp://')
+if os.getenv('DATABASE_MAX_CONNECTIONS', None):
+    # NOTE Use the pooled backend for the scheme, e.g., "postgres+pool://" for "postgres://".
+    (database_scheme, database_rest) = DATABASE_URL_.split('://', 1)
 
-application = ReceiveTaskModel.create_cherrypy_app(celery_app.tasks['pacifica.proxymod.tasks.receive'])
+    db = playhouse.db_url.connect('{0}://{1}'.format(database_scheme if database_scheme.endswith('+pool') else '{0}+pool'.format(database_scheme), database_rest), max_connections=int(os.getenv('DATABASE_MAX_CONNECTIONS')), stale_timeout=int(os.getenv('DATABASE_STALE_TIMEOUT', '300')))
+else:
+    db = playhouse.db_url.connect(DATABASE_URL_)
+
+ReceiveTaskModel = create_peewee_model(db, payload_encoding=os.getenv('PAYLOAD_ENCODING', 'zlib'))
+
+# NOTE Create the tables, or upgrade the tables that were created by an earlier version.
+ReceiveTaskModel.migrate()
+
+# NOTE Do not share the connection with forked processes (i.e., uwsgi workers and Celery prefork children), which connect on demand.
+if ':memory:' != db.database:
+    db.close()
+
+# NOTE Terminal task statuses never change, so they are cached by the web tier.
+task_cache = TaskCache(max_size=int(os.getenv('TASK_CACHE_MAX_SIZE', '10000')), ttl=float(os.getenv('TASK_CACHE_TTL', '60')))
+
+# NOTE Wakes up the "/wait" and "/events" requests (in any process) when a task changes status, via the broker (requests also poll every `WAIT_POLL_INTERVAL` seconds).
+task_notifier = BrokerTaskNotifier(BROKER_URL_)
+
+# NOTE Buffer the status updates of up to `STATUS_BUFFER_SIZE` tasks, and write them in one transaction.
+celery_app = ReceiveTaskModel.create_celery_app(router, 'pacifica.proxymod.app', 'pacifica.proxymod.tasks.receive', backend='rpc://', broker=BROKER_URL_, status_buffer_size=int(os.getenv('STATUS_BUFFER_SIZE')) if os.getenv('STATUS_BUFFER_SIZE', None) else None, status_buffer_max_delay=float(os.getenv('STATUS_BUFFER_MAX_DELAY', '1.0')), task_cache=task_cache, task_notifier=task_notifier)
+
+# NOTE The result is ignored, but a failure is stored (and logged by the worker).
+@celery_app.task(ignore_result=True, store_errors_even_if_ignored=True, name='pacifica.proxymod.tasks.wait_for_upload')
+def wait_for_upload_task(job_id: int) -> None:
+    try:
+        uploader_runner.wait_for_state(job_id)
+    except (Exception, UploaderRunnerError) as reason:
+        # NOTE E.g., the upload job did not complete in time, or its status could not be read.
+        logging.getLogger(__name__).error('failed to wait for upload job %s', job_id, exc_info=True)
+
+        raise WaitForUploadError(job_id, str(reason)) from reason
+
+    return
+
+# NOTE Release the worker once the upload is accepted, and track its completion in a separate task.
+if os.getenv('UPLOAD_WAIT_ASYNC', None):
+    uploader_runner.wait_for_state_async = wait_for_upload_task.delay
+
+# NOTE Reject unroutable events in the web tier (before they are enqueued) if `RECEIVE_EDGE_ROUTING` is set.
+application = ReceiveTaskModel.create_cherrypy_app(celery_app.tasks['pacifica.proxymod.tasks.receive'], batch_chunk_size=int(os.getenv('BATCH_CHUNK_SIZE', '1000')), router=router if os.getenv('RECEIVE_EDGE_ROUTING', None) else None, page_size=int(os.getenv('PAGE_SIZE', '100')), max_page_size=int(os.getenv('MAX_PAGE_SIZE', '1000')), task_cache=task_cache, task_notifier=task_notifier, wait_timeout=float(os.getenv('WAIT_TIMEOUT', '30')), wait_max_timeout=float(os.getenv('WAIT_MAX_TIMEOUT', '300')), wait_poll_interval=float(os.getenv('WAIT_POLL_INTERVAL')) if os.getenv('WAIT_POLL_INTERVAL', None) else None, wait_max_waiters=int(os.getenv('WAIT_MAX_WAITERS')) if os.getenv('WAIT_MAX_WAITERS', None) else None, max_body_size=int(os.getenv('MAX_BODY_SIZE', '16777216')), batch_max_body_size=int(os.getenv('BATCH_MAX_BODY_SIZE', '268435456')))
 
 def main() -> None:
     parser = argparse.ArgumentParser(description='Start the CherryPy application and listen for connections.')
@@ -51,7 +96,7 @@ def main() -> None:
 
     return
 
-__all__ = ('ReceiveTaskModel', 'application', 'celery_app', 'main')
+__all__ = ('ReceiveTaskModel', 'application', 'celery_app', 'main', 'wait_for_upload_task')
 
 if __name__ == '__main__':
     main()
@@ -8,22 +8,25 @@
 #
 # See LICENSE and WARRANTY for details.
 
+import concurrent.futures
 import contextlib
 import copy
-import importlib
 import os
 import re
+import shutil
 import tempfile
 import typing
 
 from cloudevents.model import Event
 
-from pacifica.notifications.client.downloader_runners import DownloaderRunner
+from pacifica.notifications.client.downloader_runners import DownloaderRunner, redirect_thread_output
 from pacifica.notifications.client.event_handlers import EventHandler
-from pacifica.notifications.client.models import File, Transaction, TransactionKeyValue
+from pacifica.notifications.client.models import EventIndex, File, FileTable, Transaction, TransactionKeyValue
 from pacifica.notifications.client.uploader_runners import UploaderRunner
 
 from .exceptions import ConfigNotFoundProxEventHandlerError, InvalidConfigProxEventHandlerError, InvalidModelProxEventHandlerError
+from .model_caches import ModelCache, load_model_file_func
+from .model_runners import LocalModelRunner, ModelRunner
 
 RE_PATTERN_PROXYMOD_TRANSACTION_KEY_VALUE_QUAD_ = re.compile(r'^' + re.escape('.').join([
     re.escape('proxymod'),
@@ -106,17 +109,140 @@ def _to_proxymod_config_by_config_id(transaction_key_values: typing.List[Transac
 
     return config_by_config_id
 
+def _to_abspath_proxymod_config_by_config_id(config_by_config_id: typing.Dict[str, typing.Dict[str, typing.Dict[str, typing.Any]]], in_dir_name: str = None, out_basedir_name: str = None) -> typing.Dict[str, typing.Dict[str, typing.Dict[str, typing.Any]]]:
+    abspath_config_by_config_id = copy.deepcopy(config_by_config_id)
+
+    for config_id, config in abspath_config_by_config_id.items():
+        if 'INPUTS' in config:
+            if ('in_dir' in config['INPUTS']) and (in_dir_name is not None):
+                config['INPUTS']['in_dir'] = os.path.abspath(in_dir_name)
+
+        if 'OUTPUTS' in config:
+            if 'out_dir' in config['OUTPUTS']:
+                config['OUTPUTS']['out_dir'] = os.path.abspath(os.path.join(out_basedir_name, config['OUTPUTS']['out_dir']))
+
+    return abspath_config_by_config_id
+
+@contextlib.contextmanager
+def _proxymod_config_files(config_by_config_id: typing.Dict[str, typing.Dict[str, typing.Dict[str, typing.Any]]], config_ids: typing.List[str]) -> typing.Generator[typing.List[str], None, None]:
+    with contextlib.ExitStack() as stack:
+        config_file_names = []
+
+        for config_id in config_ids:
+            config_file = stack.enter_context(tempfile.NamedTemporaryFile(suffix='.ini'))
+            config_file.write(bytes(_format_proxymod_config(config_by_config_id[config_id]), 'utf-8'))
+            config_file.flush()
+            config_file.seek(0)
+
+            config_file_names.append(config_file.name)
+
+        yield config_file_names
+
+def _merge_dirs(orig_dir_name: str, new_dir_name: str) -> None:
+    # NOTE Later files replace earlier files, i.e., the same as running the models one after another.
+    for walk_root, walk_dirs, file_names in os.walk(orig_dir_name):
+        rel_dir_name = os.path.relpath(walk_root, orig_dir_name)
+
+        os.makedirs(os.path.join(new_dir_name, rel_dir_name), exist_ok=True)
+
+        for file_name in file_names:
+            os.replace(os.path.join(walk_root, file_name), os.path.join(new_dir_name, rel_dir_name, file_name))
+
+    return
+
+def _append_file(orig_file_name: str, new_file_name: str) -> None:
+    with open(orig_file_name, mode='rb') as orig_file:
+        with open(new_file_name, mode='ab') as new_file:
+            shutil.copyfileobj(orig_file, new_file)
+
+    return
+
+def _to_file_names(openers: typing.List[typing.Callable[[typing.Dict[str, typing.Any]], typing.IO]]) -> typing.List[str]:
+    file_names = []
+
+    for opener in openers:
+        with opener(mode='rb') as file:
+            file_names.append(file.name)
+
+    return file_names
+
+def _to_model_file_funcs(event: Event, model_file_insts: typing.List[File], model_file_openers: typing.List[typing.Callable[[typing.Dict[str, typing.Any]], typing.IO]], model_cache: ModelCache = None) -> typing.List[typing.Callable[[str, str, str], None]]:
+    model_file_funcs = []
+
+    for model_file_inst, model_file_opener in zip(model_file_insts, model_file_openers):
+        with model_file_opener(mode='rb') as file:
+            try:
+                if model_cache is None:
+                    func = load_model_file_func(model_file_inst, file.name)
+                else:
+                    func = model_cache.load(model_file_inst, file.name)
+
+                model_file_funcs.append(func)
+            except Exception as reason:
+                raise InvalidModelProxEventHandlerError(event, model_file_inst, reason)
+
+    return model_file_funcs
+
 class ProxEventHandler(EventHandler):
-    def __init__(self, downloader_runner: DownloaderRunner, uploader_runner: UploaderRunner) -> None:
+    def __init__(self, downloader_runner: DownloaderRunner, uploader_runner: UploaderRunner, model_cache: ModelCache = None, model_runner: ModelRunner = None, model_max_workers: int = None) -> None:
         super(ProxEventHandler, self).__init__()
 
         self.downloader_runner = downloader_runner
         self.uploader_runner = uploader_runner
 
+        self.model_cache = model_cache
+
+        self.model_runner = LocalModelRunner() if model_runner is None else model_runner
+        self.model_max_workers = model_max_workers
+
+    def _run_models_concurrently(self, event: Event, config_by_config_id: typing.Dict[str, typing.Dict[str, typing.Dict[str, typing.Any]]], in_dir_name: str, uploader_tempdir_name: str, model_file_insts: typing.List[File], model_file_names: typing.List[str], model_file_funcs: typing.List[typing.Callable[[str, str, str], None]], stdout_file_name: str, stderr_file_name: str) -> None:
+        with tempfile.TemporaryDirectory() as models_tempdir_name:
+            with contextlib.ExitStack() as stack:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=self.model_max_workers) as executor:
+                    futures = []
+
+                    for index, (model_file_inst, model_file_name, model_file_func) in enumerate(zip(model_file_insts, model_file_names, model_file_funcs)):
+                        # NOTE Each model has its own output subdirectory and log files, which are merged after all models have finished.
+                        model_tempdir_name = os.path.join(models_tempdir_name, str(index))
+
+                        os.makedirs(model_tempdir_name)
+
+                        abspath_config_by_config_id = _to_abspath_proxymod_config_by_config_id(config_by_config_id, in_dir_name=in_dir_name, out_basedir_name=os.path.join(model_tempdir_name, 'outputs'))
+
+                        config_file_names = stack.enter_context(_proxymod_config_files(abspath_config_by_config_id, ['config_1', 'config_2', 'config_3']))
+
+                        futures.append(executor.submit(self.model_runner.run, model_file_inst, model_file_name, model_file_func, config_file_names, os.path.join(model_tempdir_name, 'stdout.log'), os.path.join(model_tempdir_name, 'stderr.log')))
+
+                    concurrent.futures.wait(futures)
+
+            # NOTE Merge in the order of the models, so that the logs and outputs do not depend on the order of completion. The logs of every model are kept, including the models that completed after another model failed.
+            for index, model_file_inst in enumerate(model_file_insts):
+                model_tempdir_name = os.path.join(models_tempdir_name, str(index))
+
+                for orig_log_file_name, new_log_file_name in [('stdout.log', stdout_file_name), ('stderr.log', stderr_file_name)]:
+                    if os.path.exists(os.path.join(model_tempdir_name, orig_log_file_name)):
+                        _append_file(os.path.join(model_tempdir_name, orig_log_file_name), new_log_file_name)
+
+            for index, (model_file_inst, future) in enumerate(zip(model_file_insts, futures)):
+                reason = future.exception()
+
+                if reason is not None:
+                    if isinstance(reason, Exception):
+                        raise InvalidModelProxEventHandlerError(event, model_file_inst, reason)
+
+                    raise reason
+
+            for index, model_file_inst in enumerate(model_file_insts):
+                _merge_dirs(os.path.join(models_tempdir_name, str(index), 'outputs'), uploader_tempdir_name)
+
+        return
+
     def handle(self, event: Event) -> None:
-        transaction_inst = Transaction.from_cloudevents_model(event)
-        transaction_key_value_insts = TransactionKeyValue.from_cloudevents_model(event)
-        file_insts = File.from_cloudevents_model(event)
+        event_index = EventIndex.from_cloudevents_model(event)
+
+        transaction_inst = Transaction.from_event_index(event_index)
+        transaction_key_value_insts = TransactionKeyValue.from_event_index(event_index)
+        file_table = FileTable.from_event_index(event_index)
 
         config_by_config_id = _to_proxymod_config_by_config_id(transaction_key_values=transaction_key_value_insts)
 
@@ -129,116 +255,87 @@ class ProxEventHandler(EventHandler):
             if not _is_valid_proxymod_config(config):
                 raise InvalidConfigProxEventHandlerError(event, config_id, config)
 
-        input_file_insts = []
-        model_file_insts = []
-
         _in_dir = config_by_config_id.get('config_1', {}).get('INPUTS', {}).get('in_dir', None)
         _in_file_one = config_by_config_id.get('config_1', {}).get('INPUTS', {}).get('in_file_one', None)
         _in_file_two = config_by_config_id.get('config_1', {}).get('INPUTS', {}).get('in_file_two', None)
 
-        for file_inst in file_insts:
-            if ('text/csv' == file_inst.mimetype) and (file_inst.subdir is not None) and (_in_dir == file_inst.subdir) and (file_inst.name is not None) and ((_in_file_one == file_inst.name) or (_in_file_two == file_inst.name)):
-                input_file_insts.append(file_inst)
-            elif ('text/x-python' == file_inst.mimetype) and ('models/' == file_inst.subdir):
-                model_file_insts.append(file_inst)
-            else:
-                # NOTE Ignore other files.
-                pass
-
-        with tempfile.TemporaryDirectory() as downloader_tempdir_name:
-            with tempfile.TemporaryDirectory() as uploader_tempdir_name:
-                # model_file_openers = self.downloader_runner.download(downloader_tempdir_name, model_file_insts)
+        if _in_dir is None:
+            input_file_insts = []
+        else:
+            input_file_insts = list(file_table.filter(mimetype='text/csv', subdir=_in_dir, name=[_in_file_name for _in_file_name in [_in_file_one, _in_file_two] if _in_file_name is not None]))
 
-                with open(os.path.join(uploader_tempdir_name, 'download-stdout.log'), mode='w') as downloader_stdout_file:
-                    with open(os.path.join(uploader_tempdir_name, 'download-stderr.log'), mode='w') as downloader_stderr_file:
-                        with contextlib.redirect_stdout(downloader_stdout_file):
-                            with contextlib.redirect_stderr(downloader_stderr_file):
-                                model_file_openers = self.downloader_runner.download(downloader_tempdir_name, model_file_insts)
+        model_file_insts = list(file_table.filter(mimetype='text/x-python', subdir='models/'))
 
-                model_file_funcs = []
+        # NOTE Ignore other files.
 
-                for model_file_inst, model_file_opener in zip(model_file_insts, model_file_openers):
-                    with model_file_opener() as file:
-                        try:
-                            name = os.path.splitext(model_file_inst.name)[0]
+        with tempfile.TemporaryDirectory() as downloader_tempdir_name:
+            with tempfile.TemporaryDirectory() as uploader_tempdir_name:
+                downloader_stdout_file_name = os.path.join(uploader_tempdir_name, 'download-stdout.log')
+                downloader_stderr_file_name = os.path.join(uploader_tempdir_name, 'download-stderr.log')
 
-                            spec = importlib.util.spec_from_file_location(name, file.name)
-                            module = importlib.util.module_from_spec(spec)
-                            spec.loader.exec_module(module)
+                # NOTE Create (or truncate) the log files, to which each download appends.
+                for log_file_name in [downloader_stdout_file_name, downloader_stderr_file_name]:
+                    with open(log_file_name, mode='w'):
+                        pass
 
-                            # NOTE Deliberately raise `AttributeError` if `name` does not exist.
-                            func = getattr(module, name)
+                # NOTE Download the input files in the background, while the model files are downloaded and imported.
+                input_file_openers_future = self.downloader_runner.download_async(downloader_tempdir_name, input_file_insts, stdout_file_name=downloader_stdout_file_name, stderr_file_name=downloader_stderr_file_name)
 
-                            if callable(func):
-                                model_file_funcs.append(func)
-                            else:
-                                # NOTE Deliberately raise `TypeError` by calling an uncallable.
-                                func()
-                        except Exception as reason:
-                            raise InvalidModelProxEventHandlerError(event, model_file_inst, reason)
+                try:
+                    model_file_openers = self.downloader_runner.download_logged(downloader_tempdir_name, model_file_insts, stdout_file_name=downloader_stdout_file_name, stderr_file_name=downloader_stderr_file_name)
 
-                # input_file_openers = self.downloader_runner.download(downloader_tempdir_name, input_file_insts)
+                    model_file_names = _to_file_names(model_file_openers)
 
-                with open(os.path.join(uploader_tempdir_name, 'download-stdout.log'), mode='a') as downloader_stdout_file:
-                    with open(os.path.join(uploader_tempdir_name, 'download-stderr.log'), mode='a') as downloader_stderr_file:
-                        with contextlib.redirect_stdout(downloader_stdout_file):
-                            with contextlib.redirect_stderr(downloader_stderr_file):
-                                input_file_openers = self.downloader_runner.download(downloader_tempdir_name, input_file_insts)
+                    if self.model_runner.isolated:
+                        # NOTE Model modules are only imported by the worker processes, i.e., their module-level code is isolated too.
+                        model_file_funcs = [None] * len(model_file_insts)
+                    else:
+                        model_file_funcs = _to_model_file_funcs(event, model_file_insts, model_file_openers, model_cache=self.model_cache)
+                finally:
+                    # NOTE Do not leave the temporary directory while the input files are still being downloaded.
+                    concurrent.futures.wait([input_file_openers_future])
 
-                abspath_config_by_config_id = copy.deepcopy(config_by_config_id)
+                input_file_openers = input_file_openers_future.result()
 
-                for config_id, config in abspath_config_by_config_id.items():
-                    if 'INPUTS' in config:
-                        if 'in_dir' in config['INPUTS']:
-                            for input_file_inst, opener in zip(input_file_insts, input_file_openers):
-                                with opener() as file:
-                                    config['INPUTS']['in_dir'] = os.path.abspath(os.path.dirname(file.name))
+                in_dir_name = None
 
-                                    break
+                for input_file_inst, opener in zip(input_file_insts, input_file_openers):
+                    with opener(mode='rb') as file:
+                        in_dir_name = os.path.dirname(file.name)
 
-                    if 'OUTPUTS' in config:
-                        if 'out_dir' in config['OUTPUTS']:
-                            config['OUTPUTS']['out_dir'] = os.path.abspath(os.path.join(uploader_tempdir_name, config['OUTPUTS']['out_dir']))
+                        break
 
                 for config_id, config in config_by_config_id.items():
                     with open(os.path.join(uploader_tempdir_name, '{0}.ini'.format(config_id)), mode='w') as config_file:
                         config_file.write(_format_proxymod_config(config))
 
-                with tempfile.NamedTemporaryFile(suffix='.ini') as config_1_file:
-                    config_1_file.write(bytes(_format_proxymod_config(abspath_config_by_config_id['config_1']), 'utf-8'))
-                    config_1_file.seek(0)
-
-                    with tempfile.NamedTemporaryFile(suffix='.ini') as config_2_file:
-                        config_2_file.write(bytes(_format_proxymod_config(abspath_config_by_config_id['config_2']), 'utf-8'))
-                        config_2_file.seek(0)
-
-                        with tempfile.NamedTemporaryFile(suffix='.ini') as config_3_file:
-                            config_3_file.write(bytes(_format_proxymod_config(abspath_config_by_config_id['config_3']), 'utf-8'))
-                            config_3_file.seek(0)
-
-                            # for model_file_inst, model_file_func in zip(model_file_insts, model_file_funcs):
-                            #     try:
-                            #         model_file_func(config_1_file.name, config_2_file.name, config_3_file.name)
-                            #     except Exception as reason:
-                            #         raise InvalidModelProxEventHandlerError(event, model_file_inst, reason)
-
-                            with open(os.path.join(uploader_tempdir_name, 'stdout.log'), mode='w') as stdout_file:
-                                with open(os.path.join(uploader_tempdir_name, 'stderr.log'), mode='w') as stderr_file:
-                                    with contextlib.redirect_stdout(stdout_file):
-                                        with contextlib.redirect_stderr(stderr_file):
-                                            for model_file_inst, model_file_func in zip(model_file_insts, model_file_funcs):
-                                                try:
-                                                    model_file_func(config_1_file.name, config_2_file.name, config_3_file.name)
-                                                except Exception as reason:
-                                                    raise InvalidModelProxEventHandlerError(event, model_file_inst, reason)
+                stdout_file_name = os.path.join(uploader_tempdir_name, 'stdout.log')
+                stderr_file_name = os.path.join(uploader_tempdir_name, 'stderr.log')
+
+                # NOTE Create (or truncate) the log files, to which each model run appends.
+                for log_file_name in [stdout_file_name, stderr_file_name]:
+                    with open(log_file_name, mode='w'):
+                        pass
+
+                if (self.model_max_workers is not None) and (self.model_max_workers > 1) and (len(model_file_insts) > 1) and self.model_runner.thread_safe:
+                    self._run_models_concurrently(event, config_by_config_id, in_dir_name, uploader_tempdir_name, model_file_insts, model_file_names, model_file_funcs, stdout_file_name, stderr_file_name)
+                else:
+                    abspath_config_by_config_id = _to_abspath_proxymod_config_by_config_id(config_by_config_id, in_dir_name=in_dir_name, out_basedir_name=uploader_tempdir_name)
+
+                    with _proxymod_config_files(abspath_config_by_config_id, ['config_1', 'config_2', 'config_3']) as config_file_names:
+                        for model_file_inst, model_file_name, model_file_func in zip(model_file_insts, model_file_names, model_file_funcs):
+                            try:
+                                self.model_runner.run(model_file_inst, model_file_name, model_file_func, config_file_names, stdout_file_name, stderr_file_name)
+                            except Exception as reason:
+                                raise InvalidModelProxEventHandlerError(event, model_file_inst, reason)
 
                 # (bundle, job_id, state) = self.uploader_runner.upload(uploader_tempdir_name, transaction=Transaction(submitter=transaction_inst.submitter, instrument=transaction_inst.instrument, proposal=transaction_inst.proposal), transaction_key_values=[TransactionKeyValue(key='Transactions._id', value=transaction_inst._id)])
 
                 with open(os.path.join(uploader_tempdir_name, 'upload-stdout.log'), mode='w') as uploader_stdout_file:
                     with open(os.path.join(uploader_tempdir_name, 'upload-stderr.log'), mode='w') as uploader_stderr_file:
-                        with contextlib.redirect_stdout(uploader_stdout_file):
-                            with contextlib.redirect_stderr(uploader_stderr_file):
-                                (bundle, job_id, state) = self.uploader_runner.upload(uploader_tempdir_name, transaction=Transaction(submitter=transaction_inst.submitter, instrument=transaction_inst.instrument, proposal=transaction_inst.proposal), transaction_key_values=[TransactionKeyValue(key='Transactions._id', value=transaction_inst._id)])
+                        # NOTE Unlike `contextlib.redirect_stdout`, the streams of the other threads of the worker are left alone.
+                        with redirect_thread_output(uploader_stdout_file, uploader_stderr_file):
+                            (bundle, job_id, state) = self.uploader_runner.upload(uploader_tempdir_name, transaction=Transaction(submitter=transaction_inst.submitter, instrument=transaction_inst.instrument, proposal=transaction_inst.proposal), transaction_key_values=[TransactionKeyValue(key='Transactions._id', value=transaction_inst._id)])
 
                 pass
 
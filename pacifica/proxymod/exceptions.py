@@ -49,4 +49,16 @@ class InvalidModelProxEventHandlerError(ProxEventHandlerError):
     def __str__(self) -> str:
         return 'proxymod model for file \'{0}\' is invalid: {1}'.format(self.file.path.replace('\'', '\\\''), str(self.reason))
 
-__all__ = ('ProxEventHandlerError', 'ConfigNotFoundProxEventHandlerError', 'InvalidConfigProxEventHandlerError', 'InvalidModelProxEventHandlerError')
+class WaitForUploadError(Exception):
+    # NOTE An `Exception` (unlike the errors of the uploader runner), so that Celery records the failure of the task. Only strings are kept, so that the error can be serialized.
+
+    def __init__(self, job_id: int, reason: str) -> None:
+        super(WaitForUploadError, self).__init__(job_id, reason)
+
+        self.job_id = job_id
+        self.reason = reason
+
+    def __str__(self) -> str:
+        return 'failed to wait for upload job \'{0}\': {1}'.format(str(self.job_id).replace('\'', '\\\''), self.reason)
+
+__all__ = ('ProxEventHandlerError', 'ConfigNotFoundProxEventHandlerError', 'InvalidConfigProxEventHandlerError', 'InvalidModelProxEventHandlerError', 'WaitForUploadError')
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-notifications-client: pacifica/proxymod/model_caches.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+
+import collections
+import hashlib
+import importlib
+import importlib.util
+import marshal
+import os
+import sys
+import tempfile
+import threading
+import types
+import typing
+
+from pacifica.notifications.client.file_caches import to_hash_key
+from pacifica.notifications.client.models import File
+
+def load_model_file_func(file: File, file_name: str, code: types.CodeType = None) -> typing.Callable[[str, str, str], None]:
+    name = os.path.splitext(file.name)[0]
+
+    spec = importlib.util.spec_from_file_location(name, file_name)
+    module = importlib.util.module_from_spec(spec)
+
+    if code is None:
+        spec.loader.exec_module(module)
+    else:
+        exec(code, module.__dict__)
+
+    # NOTE Deliberately raise `AttributeError` if `name` does not exist.
+    func = getattr(module, name)
+
+    if not callable(func):
+        # NOTE Deliberately raise `TypeError` by calling an uncallable.
+        func()
+
+    return func
+
+class ModelCache(object):
+    def __init__(self, max_size: int = 64, bytecode_dir_name: str = None) -> None:
+        super(ModelCache, self).__init__()
+
+        self.max_size = max_size
+        self.bytecode_dir_name = bytecode_dir_name
+
+        self._funcs_by_key = collections.OrderedDict() # type: typing.Dict[str, typing.Callable[[str, str, str], None]]
+        self._lock = threading.Lock()
+
+        if self.bytecode_dir_name is not None:
+            os.makedirs(self.bytecode_dir_name, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._funcs_by_key)
+
+    def key(self, file: File) -> typing.Optional[str]:
+        hash_key = to_hash_key(file)
+
+        if (hash_key is None) or not isinstance(file.name, str):
+            return None
+
+        hashtype, hashsum = hash_key
+
+        return '{0}-{1}-{2}'.format(hashtype, hashsum, file.name)
+
+    def get(self, file: File) -> typing.Optional[typing.Callable[[str, str, str], None]]:
+        key = self.key(file)
+
+        if key is None:
+            return None
+
+        with self._lock:
+            func = self._funcs_by_key.get(key, None)
+
+            if func is not None:
+                self._funcs_by_key.move_to_end(key)
+
+            return func
+
+    def put(self, file: File, func: typing.Callable[[str, str, str], None]) -> None:
+        key = self.key(file)
+
+        if key is None:
+            return
+
+        with self._lock:
+            self._funcs_by_key[key] = func
+            self._funcs_by_key.move_to_end(key)
+
+            while len(self._funcs_by_key) > self.max_size:
+                self._funcs_by_key.popitem(last=False)
+
+        return
+
+    def invalidate(self, file: File = None) -> None:
+        with self._lock:
+            if file is None:
+                self._funcs_by_key.clear()
+            else:
+                self._funcs_by_key.pop(self.key(file), None)
+
+        return
+
+    def load(self, file: File, file_name: str) -> typing.Callable[[str, str, str], None]:
+        func = self.get(file)
+
+        if func is not None:
+            return func
+
+        with open(file_name, mode='rb') as f:
+            source = f.read()
+
+        if (self.key(file) is None) or (hashlib.new(file.hashtype.lower(), source).hexdigest() != file.hashsum.lower()):
+            # NOTE Never cache models whose contents do not match their hash sum.
+            return load_model_file_func(file, file_name)
+
+        func = load_model_file_func(file, file_name, code=self._to_code(file, file_name, source))
+
+        self.put(file, func)
+
+        return func
+
+    def _to_bytecode_file_name(self, file: File) -> typing.Optional[str]:
+        if self.bytecode_dir_name is None:
+            return None
+
+        return os.path.join(self.bytecode_dir_name, '{0}-{1}.{2}.pyc'.format(file.hashtype.lower(), file.hashsum.lower(), sys.implementation.cache_tag))
+
+    def _to_code(self, file: File, file_name: str, source: bytes) -> types.CodeType:
+        bytecode_file_name = self._to_bytecode_file_name(file)
+
+        if bytecode_file_name is not None:
+            try:
+                with open(bytecode_file_name, mode='rb') as f:
+                    return marshal.load(f)
+            except (EOFError, OSError, TypeError, ValueError):
+                pass
+
+        code = compile(source, file_name, 'exec', dont_inherit=True)
+
+        if bytecode_file_name is not None:
+            # NOTE Write the bytecode atomically, i.e., move a temporary file into place.
+            fd, temp_file_name = tempfile.mkstemp(dir=self.bytecode_dir_name, prefix='.', suffix='.tmp')
+
+            try:
+                with os.fdopen(fd, mode='wb') as f:
+                    marshal.dump(code, f)
+
+                os.replace(temp_file_name, bytecode_file_name)
+            except OSError:
+                os.unlink(temp_file_name)
+
+        return code
+
+__all__ = ('ModelCache', 'load_model_file_func')
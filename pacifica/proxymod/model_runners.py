@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-notifications-client: pacifica/proxymod/model_runners.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+
+import abc
+import concurrent.futures
+import concurrent.futures.process
+import contextlib
+import math
+import multiprocessing
+import multiprocessing.connection
+import os
+import pickle
+import signal
+import sys
+import threading
+import typing
+
+try:
+    import resource
+except ImportError: # pragma: no cover
+    resource = None
+
+from pacifica.notifications.client.models import File
+
+from .model_caches import ModelCache
+
+# NOTE Each worker process has its own cache, so that a reused worker does not reload the same model.
+_model_cache = ModelCache()
+
+class CPUTimeLimitExceededError(Exception):
+    def __str__(self) -> str: # pragma: no cover
+        return 'CPU time limit exceeded'
+
+def _raise_cpu_time_limit_exceeded(signum: int, frame: typing.Any) -> None:
+    raise CPUTimeLimitExceededError()
+
+@contextlib.contextmanager
+def _cpu_time_limit(seconds: float = None) -> typing.Generator[None, None, None]:
+    if (seconds is None) or (resource is None) or not hasattr(signal, 'SIGXCPU'):
+        yield
+
+        return
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+
+    # NOTE The limit is on the total CPU time of the (reused) process, so it is relative to the current usage.
+    limit = int(math.ceil(usage.ru_utime + usage.ru_stime + seconds))
+
+    if resource.RLIM_INFINITY != hard:
+        limit = min(limit, hard)
+
+    orig_handler = signal.signal(signal.SIGXCPU, _raise_cpu_time_limit_exceeded)
+
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+        signal.signal(signal.SIGXCPU, orig_handler)
+
+@contextlib.contextmanager
+def _redirect_fds(stdout_file: typing.IO, stderr_file: typing.IO) -> typing.Generator[None, None, None]:
+    # NOTE Redirect the file descriptors (not only `sys.stdout` and `sys.stderr`), so that the output of extension modules and subprocesses is captured too.
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    orig_stdout_fd = os.dup(1)
+    orig_stderr_fd = os.dup(2)
+
+    os.dup2(stdout_file.fileno(), 1)
+    os.dup2(stderr_file.fileno(), 2)
+
+    try:
+        with contextlib.redirect_stdout(stdout_file):
+            with contextlib.redirect_stderr(stderr_file):
+                yield
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        os.dup2(orig_stdout_fd, 1)
+        os.dup2(orig_stderr_fd, 2)
+
+        os.close(orig_stdout_fd)
+        os.close(orig_stderr_fd)
+
+def _run_in_subprocess(file: File, file_name: str, args: typing.List[str], stdout_file_name: str, stderr_file_name: str, cpu_time_limit: float = None) -> None:
+    func = _model_cache.load(file, file_name)
+
+    with open(stdout_file_name, mode='a') as stdout_file:
+        with open(stderr_file_name, mode='a') as stderr_file:
+            with _redirect_fds(stdout_file, stderr_file):
+                with _cpu_time_limit(cpu_time_limit):
+                    func(*args)
+
+    return
+
+class ModelRunner(abc.ABC):
+    # NOTE Whether models are loaded and run by another process, i.e., whether `func` is ignored by `run`.
+    isolated = False # type: bool
+
+    # NOTE Whether `run` may be called concurrently from multiple threads.
+    thread_safe = False # type: bool
+
+    def __init__(self) -> None:
+        super(ModelRunner, self).__init__()
+
+    @abc.abstractmethod
+    def run(self, file: File, file_name: str, func: typing.Callable[..., None], args: typing.List[str], stdout_file_name: str, stderr_file_name: str) -> None: # pragma: no cover
+        raise NotImplementedError()
+
+class LocalModelRunner(ModelRunner):
+    def __init__(self) -> None:
+        super(LocalModelRunner, self).__init__()
+
+    def run(self, file: File, file_name: str, func: typing.Callable[..., None], args: typing.List[str], stdout_file_name: str, stderr_file_name: str) -> None:
+        # NOTE `contextlib.redirect_stdout` and `contextlib.redirect_stderr` are global, i.e., not safe for concurrent runs.
+        with open(stdout_file_name, mode='a') as stdout_file:
+            with open(stderr_file_name, mode='a') as stderr_file:
+                with contextlib.redirect_stdout(stdout_file):
+                    with contextlib.redirect_stderr(stderr_file):
+                        func(*args)
+
+        return
+
+def _serve_model_runs(conn: multiprocessing.connection.Connection) -> None:
+    # NOTE The main loop of a worker process, i.e., run models until the connection is closed.
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+
+        if request is None:
+            break
+
+        args, kwargs = request
+
+        try:
+            _run_in_subprocess(*args, **kwargs)
+        except BaseException as reason:
+            try:
+                # NOTE The reason is re-raised by the parent process, so it must survive a round-trip through `pickle`.
+                pickle.loads(pickle.dumps(reason))
+            except Exception:
+                reason = RuntimeError(repr(reason))
+
+            conn.send(reason)
+        else:
+            conn.send(None)
+
+    conn.close()
+
+    return
+
+class _ModelWorker(object):
+    def __init__(self, mp_context: multiprocessing.context.BaseContext) -> None:
+        super(_ModelWorker, self).__init__()
+
+        # NOTE Set if the worker process must not be reused, e.g., it exceeded the wall time limit.
+        self.broken = False
+
+        self._conn, child_conn = mp_context.Pipe()
+
+        self.process = mp_context.Process(target=_serve_model_runs, args=(child_conn, ), daemon=True)
+        self.process.start()
+
+        child_conn.close()
+
+    def run(self, args: typing.Tuple[typing.Any, ...], kwargs: typing.Dict[str, typing.Any], timeout: float = None) -> None:
+        try:
+            self._conn.send((args, kwargs))
+
+            ready = self._conn.poll(timeout)
+        except OSError:
+            self.broken = True
+
+            raise concurrent.futures.process.BrokenProcessPool('model worker process terminated abruptly')
+
+        if not ready:
+            self.broken = True
+
+            raise concurrent.futures.TimeoutError()
+
+        try:
+            reason = self._conn.recv()
+        except (EOFError, OSError):
+            self.broken = True
+
+            raise concurrent.futures.process.BrokenProcessPool('model worker process terminated abruptly')
+
+        if reason is not None:
+            raise reason
+
+        return
+
+    def close(self, timeout: float = None) -> None:
+        if not self.broken:
+            try:
+                self._conn.send(None)
+            except OSError:
+                pass
+
+            self.process.join(timeout)
+
+        if self.process.is_alive():
+            self.process.terminate()
+
+            self.process.join()
+
+        self._conn.close()
+
+        return
+
+class ProcessModelRunner(ModelRunner):
+    isolated = True # type: bool
+    thread_safe = True # type: bool
+
+    def __init__(self, max_workers: int = None, timeout: float = None, cpu_time_limit: float = None, mp_context: str = None) -> None:
+        super(ProcessModelRunner, self).__init__()
+
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cpu_time_limit = cpu_time_limit
+        self.mp_context = mp_context
+
+        # NOTE Each run checks out a worker process of its own, so that a worker process that is terminated (e.g., by the wall time limit) does not affect other runs.
+        self._idle_workers = [] # type: typing.List[_ModelWorker]
+        self._lock = threading.Lock()
+        self._semaphore = threading.BoundedSemaphore(max_workers or os.cpu_count() or 1)
+        self._shutdown = False
+
+    def _checkout_worker(self) -> _ModelWorker:
+        with self._lock:
+            while len(self._idle_workers) > 0:
+                worker = self._idle_workers.pop()
+
+                if worker.process.is_alive():
+                    return worker
+
+                worker.close()
+
+        # NOTE Worker processes are started on demand, and are reused by later runs.
+        return _ModelWorker(multiprocessing.get_context(self.mp_context))
+
+    def _checkin_worker(self, worker: _ModelWorker) -> None:
+        with self._lock:
+            if not worker.broken and not self._shutdown:
+                self._idle_workers.append(worker)
+
+                return
+
+        # NOTE Only this worker process is terminated.
+        worker.close()
+
+        return
+
+    def run(self, file: File, file_name: str, func: typing.Callable[..., None], args: typing.List[str], stdout_file_name: str, stderr_file_name: str) -> None:
+        with self._semaphore:
+            worker = self._checkout_worker()
+
+            try:
+                # NOTE The worker process loads the model from `file_name`, i.e., `func` is not used, since model modules are not imported by the parent process.
+                worker.run((file, file_name, args, stdout_file_name, stderr_file_name), {'cpu_time_limit': self.cpu_time_limit}, timeout=self.timeout)
+            finally:
+                self._checkin_worker(worker)
+
+        return
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._shutdown = True
+
+            workers = self._idle_workers
+
+            self._idle_workers = []
+
+        for worker in workers:
+            worker.close()
+
+        return
+
+__all__ = ('CPUTimeLimitExceededError', 'ModelRunner', 'LocalModelRunner', 'ProcessModelRunner')
@@ -10,27 +10,63 @@
 
 import os
 
-from jsonpath2.path import Path
-
 from pacifica.cli.methods import generate_global_config, generate_requests_auth
 from pacifica.downloader import Downloader
 from pacifica.notifications.client.downloader_runners import RemoteDownloaderRunner
+from pacifica.notifications.client.file_caches import FileCache
+from pacifica.notifications.client.globals import CLOUDEVENTS_DEFAULT_EVENT_TYPE_, CLOUDEVENTS_DEFAULT_SOURCE_
+from pacifica.notifications.client.paths import parse_file
 from pacifica.notifications.client.router import Router
-from pacifica.notifications.client.uploader_runners import RemoteUploaderRunner
+from pacifica.notifications.client.uploader_runners import PollStrategy, RemoteUploaderRunner
 from pacifica.uploader import Uploader
 
 from .event_handlers import ProxEventHandler
+from .model_caches import ModelCache
+from .model_runners import LocalModelRunner, ProcessModelRunner
+
+# NOTE Keep in sync with the `TransactionKeyValue` keys that are required by "jsonpath2/proxymod.txt".
+PROXYMOD_TRANSACTION_KEY_VALUE_KEYS_ = [
+    'proxymod.task',
+    'proxymod.version',
+    'proxymod.config_1.PROJECT.runtime',
+    'proxymod.config_1.PROJECT.failure',
+    'proxymod.config_1.INPUTS.in_dir',
+    'proxymod.config_1.INPUTS.in_file_one',
+    'proxymod.config_1.INPUTS.in_file_two',
+    'proxymod.config_1.OUTPUTS.out_dir',
+    'proxymod.config_2.PROJECT.runtime',
+    'proxymod.config_2.PROJECT.failure',
+    'proxymod.config_2.OUTPUTS.out_dir',
+    'proxymod.config_3.PROJECT.runtime',
+    'proxymod.config_3.PROJECT.failure',
+    'proxymod.config_3.OUTPUTS.out_dir',
+]
 
 config = generate_global_config()
 
 auth = generate_requests_auth(config)
 
-downloader_runner = RemoteDownloaderRunner(Downloader(cart_api_url=config.get('endpoints', 'download_url'), auth=auth))
+file_cache = FileCache(os.getenv('FILE_CACHE_DIR'), max_size=int(os.getenv('FILE_CACHE_MAX_SIZE', '1073741824'))) if os.getenv('FILE_CACHE_DIR', None) else None
+
+downloader_runner = RemoteDownloaderRunner(Downloader(cart_api_url=config.get('endpoints', 'download_url'), auth=auth), file_cache=file_cache)
+
+poll_strategy = PollStrategy(max_delay=float(os.getenv('UPLOAD_POLL_MAX_DELAY', '30')), timeout=float(os.getenv('UPLOAD_POLL_TIMEOUT')) if os.getenv('UPLOAD_POLL_TIMEOUT', None) else None)
+
+# NOTE Memory-map the files of at least `UPLOAD_MMAP_THRESHOLD` bytes while they are bundled (if set).
+uploader_runner = RemoteUploaderRunner(Uploader(upload_url=config.get('endpoints', 'upload_url'), status_url=config.get('endpoints', 'upload_status_url'), auth=auth), poll_strategy=poll_strategy, mmap_threshold=int(os.getenv('UPLOAD_MMAP_THRESHOLD')) if os.getenv('UPLOAD_MMAP_THRESHOLD', None) else None, hash_max_workers=int(os.getenv('UPLOAD_HASH_MAX_WORKERS')) if os.getenv('UPLOAD_HASH_MAX_WORKERS', None) else None)
+
+model_cache = ModelCache(max_size=int(os.getenv('MODEL_CACHE_MAX_SIZE', '64')), bytecode_dir_name=os.getenv('MODEL_CACHE_DIR', None))
 
-uploader_runner = RemoteUploaderRunner(Uploader(upload_url=config.get('endpoints', 'upload_url'), status_url=config.get('endpoints', 'upload_status_url'), auth=auth))
+# NOTE Run models in a pool of worker processes if `MODEL_RUNNER_MAX_WORKERS` is set (the Celery worker must be allowed to fork, e.g., "-P threads").
+if os.getenv('MODEL_RUNNER_MAX_WORKERS', None):
+    model_runner = ProcessModelRunner(max_workers=int(os.getenv('MODEL_RUNNER_MAX_WORKERS')), timeout=float(os.getenv('MODEL_RUNNER_TIMEOUT')) if os.getenv('MODEL_RUNNER_TIMEOUT', None) else None, cpu_time_limit=float(os.getenv('MODEL_RUNNER_CPU_TIME_LIMIT')) if os.getenv('MODEL_RUNNER_CPU_TIME_LIMIT', None) else None)
+else:
+    model_runner = LocalModelRunner()
 
+# NOTE Proxymod events are published to `PROXYMOD_QUEUE` if they are routed by the web tier (see `RECEIVE_EDGE_ROUTING`), so that heavy workers can be scaled independently, e.g., "celery worker -Q proxymod".
+# NOTE Independent model files are run concurrently if `MODEL_MAX_WORKERS` is greater than 1 and the model runner is thread-safe.
 router = Router()
 
-router.add_route(Path.parse_file(os.path.join(os.path.dirname(__file__), 'jsonpath2', 'proxymod.txt')), ProxEventHandler(downloader_runner, uploader_runner))
+router.add_route(parse_file(os.path.join(os.path.dirname(__file__), 'jsonpath2', 'proxymod.txt')), ProxEventHandler(downloader_runner, uploader_runner, model_cache=model_cache, model_runner=model_runner, model_max_workers=int(os.getenv('MODEL_MAX_WORKERS')) if os.getenv('MODEL_MAX_WORKERS', None) else None), event_type=CLOUDEVENTS_DEFAULT_EVENT_TYPE_, source=CLOUDEVENTS_DEFAULT_SOURCE_, transaction_key_value_keys=PROXYMOD_TRANSACTION_KEY_VALUE_KEYS_, route_id='proxymod', queue=os.getenv('PROXYMOD_QUEUE', None), priority=int(os.getenv('PROXYMOD_PRIORITY')) if os.getenv('PROXYMOD_PRIORITY', None) else None)
 
-__all__ = ('router')
+__all__ = ('router', 'uploader_runner')
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-notifications-client: pacifica/proxymod/tests/test_model_caches.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+
+import hashlib
+import os
+import tempfile
+import unittest
+
+from pacifica.notifications.client.models import File
+
+from ..model_caches import ModelCache, load_model_file_func
+
+class ModelCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self._f_data = 'def model(config_1, config_2, config_3):\n    return (config_1, config_2, config_3)\n'
+
+        self._file = File(name='model.py', subdir='models/', hashtype='sha1', hashsum=hashlib.sha1(bytes(self._f_data, 'utf-8')).hexdigest())
+
+        return
+
+    def _write(self, basedir_name: str, f_data: str) -> str:
+        file_name = os.path.join(basedir_name, self._file.name)
+
+        with open(file_name, mode='w') as f:
+            f.write(f_data)
+
+        return file_name
+
+    def test_load_model_file_func(self):
+        with tempfile.TemporaryDirectory() as basedir_name:
+            func = load_model_file_func(self._file, self._write(basedir_name, self._f_data))
+
+            self.assertEqual(('1', '2', '3'), func('1', '2', '3'))
+
+            with self.assertRaises(AttributeError):
+                load_model_file_func(self._file, self._write(basedir_name, 'pass\n'))
+
+            with self.assertRaises(TypeError):
+                load_model_file_func(self._file, self._write(basedir_name, 'model = None\n'))
+
+        return
+
+    def test_model_cache_load(self):
+        model_cache = ModelCache()
+
+        with tempfile.TemporaryDirectory() as basedir_name:
+            func = model_cache.load(self._file, self._write(basedir_name, self._f_data))
+
+        self.assertEqual(1, len(model_cache))
+
+        self.assertIs(func, model_cache.get(self._file))
+
+        with tempfile.TemporaryDirectory() as basedir_name:
+            self.assertIs(func, model_cache.load(self._file, self._write(basedir_name, self._f_data)))
+
+        model_cache.invalidate(self._file)
+
+        self.assertEqual(None, model_cache.get(self._file))
+
+        return
+
+    def test_model_cache_load_hashsum_mismatch(self):
+        model_cache = ModelCache()
+
+        with tempfile.TemporaryDirectory() as basedir_name:
+            func = model_cache.load(self._file, self._write(basedir_name, self._f_data.replace('config_3)\n', 'None)\n')))
+
+        self.assertEqual(('1', '2', None), func('1', '2', '3'))
+
+        self.assertEqual(0, len(model_cache))
+
+        return
+
+    def test_model_cache_bytecode(self):
+        with tempfile.TemporaryDirectory() as bytecode_dir_name:
+            with tempfile.TemporaryDirectory() as basedir_name:
+                ModelCache(bytecode_dir_name=bytecode_dir_name).load(self._file, self._write(basedir_name, self._f_data))
+
+            self.assertEqual(1, len(list(filter(lambda file_name: file_name.endswith('.pyc'), os.listdir(bytecode_dir_name)))))
+
+            with tempfile.TemporaryDirectory() as basedir_name:
+                func = ModelCache(bytecode_dir_name=bytecode_dir_name).load(self._file, self._write(basedir_name, self._f_data))
+
+            self.assertEqual(('1', '2', '3'), func('1', '2', '3'))
+
+        return
+
+    def test_model_cache_max_size(self):
+        model_cache = ModelCache(max_size=1)
+
+        other_file = File(name='other.py', hashtype='sha1', hashsum='0')
+
+        model_cache.put(self._file, len)
+        model_cache.put(other_file, len)
+
+        self.assertEqual(1, len(model_cache))
+        self.assertEqual(None, model_cache.get(self._file))
+        self.assertIs(len, model_cache.get(other_file))
+
+        model_cache.invalidate()
+
+        self.assertEqual(0, len(model_cache))
+
+        return
+
+if __name__ == '__main__':
+    unittest.main()
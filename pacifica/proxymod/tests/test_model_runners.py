@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# pacifica-notifications-client: pacifica/proxymod/tests/test_model_runners.py
+#
+# Copyright (c) 2019, Battelle Memorial Institute
+# All rights reserved.
+#
+# See LICENSE and WARRANTY for details.
+
+import concurrent.futures
+import os
+import tempfile
+import time
+import unittest
+
+from pacifica.notifications.client.models import File
+
+from ..model_caches import load_model_file_func
+from ..model_runners import CPUTimeLimitExceededError, LocalModelRunner, ProcessModelRunner
+
+class ModelRunnerTestCase(unittest.TestCase):
+    def _run(self, model_runner, f_data):
+        with tempfile.TemporaryDirectory() as basedir_name:
+            file = File(name='model.py', subdir='models/')
+
+            file_name = os.path.join(basedir_name, file.name)
+
+            with open(file_name, mode='w') as f:
+                f.write(f_data)
+
+            stdout_file_name = os.path.join(basedir_name, 'stdout.log')
+            stderr_file_name = os.path.join(basedir_name, 'stderr.log')
+
+            model_runner.run(file, file_name, load_model_file_func(file, file_name), ['1', '2', '3'], stdout_file_name, stderr_file_name)
+
+            with open(stdout_file_name, mode='r') as stdout_file:
+                with open(stderr_file_name, mode='r') as stderr_file:
+                    return (stdout_file.read(), stderr_file.read())
+
+    def test_local_model_runner(self):
+        (stdout, stderr) = self._run(LocalModelRunner(), 'import sys\ndef model(*args):\n    print(*args)\n    print("error", file=sys.stderr)\n')
+
+        self.assertEqual('1 2 3\n', stdout)
+        self.assertEqual('error\n', stderr)
+
+        return
+
+    def test_process_model_runner(self):
+        model_runner = ProcessModelRunner(max_workers=1)
+
+        try:
+            (stdout, stderr) = self._run(model_runner, 'import os\nimport sys\ndef model(*args):\n    print(*args)\n    os.write(2, b"error\\n")\n')
+
+            self.assertEqual('1 2 3\n', stdout)
+            self.assertEqual('error\n', stderr)
+
+            with self.assertRaises(ValueError):
+                self._run(model_runner, 'def model(*args):\n    raise ValueError()\n')
+
+            with self.assertRaises(concurrent.futures.process.BrokenProcessPool):
+                self._run(model_runner, 'import os\ndef model(*args):\n    os._exit(1)\n')
+
+            (stdout, stderr) = self._run(model_runner, 'def model(*args):\n    print(*args)\n')
+
+            self.assertEqual('1 2 3\n', stdout)
+        finally:
+            model_runner.shutdown()
+
+        return
+
+    def test_process_model_runner_timeout(self):
+        model_runner = ProcessModelRunner(max_workers=1, timeout=0.5)
+
+        try:
+            with self.assertRaises(concurrent.futures.TimeoutError):
+                self._run(model_runner, 'import time\ndef model(*args):\n    time.sleep(30)\n')
+
+            (stdout, stderr) = self._run(model_runner, 'def model(*args):\n    print(*args)\n')
+
+            self.assertEqual('1 2 3\n', stdout)
+        finally:
+            model_runner.shutdown()
+
+        return
+
+    def test_process_model_runner_timeout_isolated(self):
+        model_runner = ProcessModelRunner(max_workers=2, timeout=2.0)
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+                timeout_future = executor.submit(self._run, model_runner, 'import time\ndef model(*args):\n    time.sleep(30)\n')
+
+                time.sleep(1.0)
+
+                # NOTE This model is still running when the other model is terminated.
+                future = executor.submit(self._run, model_runner, 'import time\ndef model(*args):\n    time.sleep(1.5)\n    print(*args)\n')
+
+                with self.assertRaises(concurrent.futures.TimeoutError):
+                    timeout_future.result()
+
+                (stdout, stderr) = future.result()
+
+            self.assertEqual('1 2 3\n', stdout)
+        finally:
+            model_runner.shutdown()
+
+        return
+
+    def test_process_model_runner_not_imported(self):
+        model_runner = ProcessModelRunner(max_workers=1)
+
+        try:
+            with tempfile.TemporaryDirectory() as basedir_name:
+                file = File(name='model.py', subdir='models/')
+
+                file_name = os.path.join(basedir_name, file.name)
+
+                # NOTE Module-level code is run by the worker process, not by this process.
+                with open(file_name, mode='w') as f:
+                    f.write('import os\nPID = os.getpid()\ndef model(*args):\n    print(PID)\n')
+
+                stdout_file_name = os.path.join(basedir_name, 'stdout.log')
+                stderr_file_name = os.path.join(basedir_name, 'stderr.log')
+
+                model_runner.run(file, file_name, None, ['1', '2', '3'], stdout_file_name, stderr_file_name)
+
+                with open(stdout_file_name, mode='r') as stdout_file:
+                    self.assertNotEqual(str(os.getpid()), stdout_file.read().strip())
+        finally:
+            model_runner.shutdown()
+
+        return
+
+    def test_process_model_runner_cpu_time_limit(self):
+        model_runner = ProcessModelRunner(max_workers=1, cpu_time_limit=1)
+
+        try:
+            with self.assertRaises(CPUTimeLimitExceededError):
+                self._run(model_runner, 'def model(*args):\n    while True:\n        pass\n')
+        finally:
+            model_runner.shutdown()
+
+        return
+
+if __name__ == '__main__':
+    unittest.main()
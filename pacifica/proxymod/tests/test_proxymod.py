@@ -10,15 +10,19 @@
 
 import json
 import os
+import tempfile
 import unittest
 
 from cloudevents.model import Event
 from jsonpath2.path import Path
 
 from pacifica.notifications.client.downloader_runners import LocalDownloaderRunner
+from pacifica.notifications.client.models import File
 from pacifica.notifications.client.uploader_runners import LocalUploaderRunner
 
-from ..event_handlers import ProxEventHandler
+from ..event_handlers import ProxEventHandler, _merge_dirs
+from ..exceptions import InvalidModelProxEventHandlerError
+from ..model_runners import ProcessModelRunner
 from ..router import router
 
 class ProxTestCase(unittest.TestCase):
@@ -43,6 +47,77 @@ class ProxTestCase(unittest.TestCase):
 
         return
 
+    def test_event_handler_concurrent(self):
+        event = Event(self.event_data)
+
+        downloader_runner = LocalDownloaderRunner(os.path.join(self.basedir_name, 'data'))
+
+        uploader_runner = LocalUploaderRunner()
+
+        model_runner = ProcessModelRunner(max_workers=3)
+
+        try:
+            event_handler = ProxEventHandler(downloader_runner, uploader_runner, model_runner=model_runner, model_max_workers=3)
+
+            self.assertEqual(None, event_handler.handle(event))
+        finally:
+            model_runner.shutdown()
+
+        return
+
+    def test_run_models_concurrently_timeout(self):
+        event = Event(self.event_data)
+
+        model_runner = ProcessModelRunner(max_workers=2, timeout=2.0)
+
+        try:
+            event_handler = ProxEventHandler(LocalDownloaderRunner(os.path.join(self.basedir_name, 'data')), LocalUploaderRunner(), model_runner=model_runner, model_max_workers=2)
+
+            with tempfile.TemporaryDirectory() as tempdir_name:
+                model_file_insts = [File(name='times_out.py', subdir='models/'), File(name='completes.py', subdir='models/')]
+                model_file_names = [os.path.join(tempdir_name, model_file_inst.name) for model_file_inst in model_file_insts]
+
+                for model_file_name, f_data in zip(model_file_names, ['import time\ndef times_out(*args):\n    time.sleep(30)\n', 'import time\ndef completes(*args):\n    time.sleep(1)\n    print(\'completed\')\n']):
+                    with open(model_file_name, mode='w') as f:
+                        f.write(f_data)
+
+                stdout_file_name = os.path.join(tempdir_name, 'stdout.log')
+                stderr_file_name = os.path.join(tempdir_name, 'stderr.log')
+
+                config_by_config_id = dict((config_id, {'OUTPUTS': {'out_dir': 'outputs'}}) for config_id in ['config_1', 'config_2', 'config_3'])
+
+                with self.assertRaises(InvalidModelProxEventHandlerError) as context:
+                    event_handler._run_models_concurrently(event, config_by_config_id, None, tempdir_name, model_file_insts, model_file_names, [None, None], stdout_file_name, stderr_file_name)
+
+                # NOTE The model that timed out is reported, and the other model was not terminated.
+                self.assertEqual('times_out.py', context.exception.file.name)
+
+                with open(stdout_file_name, mode='r') as f:
+                    self.assertEqual('completed\n', f.read())
+        finally:
+            model_runner.shutdown()
+
+        return
+
+    def test_merge_dirs(self):
+        with tempfile.TemporaryDirectory() as orig_dir_name:
+            with tempfile.TemporaryDirectory() as new_dir_name:
+                os.makedirs(os.path.join(orig_dir_name, 'outputs'))
+
+                for dir_name, value in [(orig_dir_name, 'new'), (new_dir_name, 'old')]:
+                    with open(os.path.join(dir_name, 'outputs' if dir_name == orig_dir_name else '', 'out.csv'), mode='w') as f:
+                        f.write(value)
+
+                _merge_dirs(orig_dir_name, new_dir_name)
+
+                with open(os.path.join(new_dir_name, 'outputs', 'out.csv'), mode='r') as f:
+                    self.assertEqual('new', f.read())
+
+                with open(os.path.join(new_dir_name, 'out.csv'), mode='r') as f:
+                    self.assertEqual('old', f.read())
+
+        return
+
     def test_proxymod_path(self):
         proxymod_path = Path.parse_file(os.path.join(os.path.dirname(__file__), '..', 'jsonpath2', 'proxymod.txt'))
 